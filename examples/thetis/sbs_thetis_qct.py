@@ -1,5 +1,6 @@
 from datetime import datetime,timezone
 from martech.sbs.thetis import THETIS
+from martech.sbs.thetis_profile import ThetisProfile
 import os
 import time
 
@@ -35,32 +36,15 @@ else:
 log.write("---SETTINGS---\n")
 dt,dt_msg = cspp.set_datetime()
 log.write(dt_msg + '\n')
-pkd,pkd_msg = cspp.set_parking_depth(65)
-log.write(pkd_msg + '\n')
-rd,rd_msg = cspp.set_radio_depth(1.0)
-log.write(rd_msg + '\n')
-gpsp,gpsp_msg = cspp.set_gps_power("OFF")
-log.write(gpsp_msg + '\n')
-ggf,ggf_msg = cspp.set_gps_acquistion_after_profile("OFF")
-log.write(ggf_msg + '\n')
-do,do_msg = cspp.set_depth_offset(0.6)
-log.write(do_msg + '\n')
-blv,blv_msg = cspp.set_battery_thresholds(28.5,28.5)
-log.write(blv_msg + '\n')
-slsf,slsf_msg = cspp.set_slsf(1.45)
-log.write(slsf_msg + '\n')
-scs,scs_msg = cspp.set_scooch()
-log.write(scs_msg + '\n')
-sta,sta_msg = cspp.set_sta(0.7)
-log.write(sta_msg+'\n')
-num,num_msg = cspp.set_profile_number(0)
-log.write(num_msg + '\n')
-hld,hld_msg = cspp.set_hld(1)
-log.write(hld_msg + '\n')
-whe,whe_msg = cspp.turn_off_wave_height_estimator()
-log.write(whe_msg + '\n')
-bd,bd_msg = cspp.set_breakaway_depth()
-log.write(bd_msg + '\n')
+profile = ThetisProfile(parking_depth=65,radio_depth=1.0,gps_power="OFF",
+                        gps_acquisition="OFF",depth_offset=0.6,
+                        battery_thresholds=(28.5,28.5),slsf=1.45,
+                        scooch=(250,5000,150000,2500),sta=0.7,
+                        profile_number=0,hld=1,wave_height_estimator="OFF",
+                        breakaway_depth=0.7)
+report = profile.apply(cspp)
+for line in report.lines():
+    log.write(line + '\n')
 
 
 cspp.logging("ON")
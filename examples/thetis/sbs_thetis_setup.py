@@ -9,10 +9,19 @@
 
 from datetime import datetime,timezone
 from martech.sbs.thetis import THETIS
+from martech.sbs.thetis_profile import ThetisProfile
 
 port = 'COM3'
 SS = '02' #Options: 01,02,06,07 
 deployment = '20'
+depth = 65 #Parking depth in meters.
+
+profile = ThetisProfile(buf=512,parking_depth=depth,breakaway_depth=0.70,
+                        wave_height_estimator='OFF',hld=1,profile_number=0,
+                        scooch=(250,5000,150000,2500),
+                        battery_thresholds=(28.5,28.5),gps_power='OFF',
+                        gps_acquisition='OFF',sta=0.7,slsf=1.45,
+                        depth_offset=0.6)
 
 def main():
     opr8r = input('Operator: ')
@@ -20,36 +29,21 @@ def main():
     if thetis.open_connection(115200) is True:
         version_info = thetis.get_version()
         dt_set = thetis.set_datetime()      
-        profiler_id = "WLP-{}".format(version_info[0].rjust(3,"0"))
-  
-        buf_set = thetis.set_buf()
-        pkd_set = thetis.set_parking_depth(depth)
-        bd_set = thetis.set_breakaway_depth(0.70)
-        whs_set = thetis.turn_off_wave_height_estimator()
-        hld_set = thetis.set_hld(1) 
-        num_set = thetis.set_profile_number(0)
-        scs_set = thetis.set_scooch()
-        blv_set = thetis.set_battery_thresholds(primary=28.5,secondary=28.5)
-        gpsp_set = thetis.set_gps_power("OFF")
-        ggf_set = thetis.set_gps_acquistion_after_profile("OFF")
+        profiler_id = "WLP-{}".format(version_info['profiler_id'].split('-')[-1].rjust(3,"0"))
         today = datetime.now(timezone.utc).strftime('%y%m%d')
         dir_name = 'QT{}'.format(today)        
         if thetis.change_to_root_directory('PC') is True: 
             pmkd = thetis.make_directory(dir_name,'PC')
             pcd = thetis.change_directory(dir_name,'PC')
             
-        battery1 = thetis.get_battery_status(1)
-        battery2 = thetis.get_battery_status(2)
+        batteries = thetis.get_battery_statuses((1,2))
 
-        #Adjust winch settings.
-        thetis.set_winch_power("ON")
-        sta_set = thetis.set_sta(0.7)
-        slsf_set = thetis.set_slsf(1.45)
-        do_set = thetis.set_depth_offset(0.6)
-        if thetis.change_to_root_directory(device='WC') is True:
-            wmkd = thetis.make_directory(dir_name,'WC')
-            wcd = thetis.change_directory(dir_name,'WC')
-        thetis.set_winch_power("OFF")
+        #One winch power cycle for the WC settings and directory.
+        with thetis.winch_session():
+            report = profile.apply(thetis)
+            if thetis.change_to_root_directory('WC') is True:
+                wmkd = thetis.make_directory(dir_name,'WC')
+                wcd = thetis.change_directory(dir_name,'WC')
         
         thetis.close_connection()
 #-----------------------------------------------------------------------------#        
@@ -63,26 +57,15 @@ def main():
             if pcd is not False and wcd is not False:
                 file.write('Controller QCT Directory: {}\n'.format(pcd))
                 file.write('Winch QCT Directory: {}\n'.format(wcd))
-            if battery1 is not False:
-                file.write('Battery 1 Voltage: {}\n'.format(battery1['voltage']))
-                file.write('Battery 1 Min Cell: {}\n'.format(battery1['min_cell']))
-                file.write('Battery 1 Max Cell: {}\n'.format(battery1['max_cell']))
-                file.write('Battery 1 Leak Detect: {}\n'.format(battery1['leak_detect']))
-            else:
-                file.write('Battery 1: Not Found\n')
-            if battery2 is not False:
-                file.write('Battery 2 Voltage: {}\n'.format(battery2['voltage']))
-                file.write('Battery 2 Min Cell: {}\n'.format(battery2['min_cell']))
-                file.write('Battery 2 Max Cell: {}\n'.format(battery2['max_cell']))
-                file.write('Battery 2 Leak Detect: {}\n'.format(battery2['leak_detect']))
-            else:
-                file.write('Battery 2: Not Found\n')
-            if pkd_set is True:
-                file.write('Parking Depth Set: {}\n'.format(thetis.pkd))
-            else:
-                file.write('Unable to set PKD.')
-            if bd_set is True:
-                file.write('Breakaway Depth Set: {}\n'.format(thetis.bd))
-            else:
-                file.write('Unable to set BD.')
+            for address,battery in batteries.items():
+                if battery is None:
+                    file.write('Battery {}: Not Found\n'.format(address))
+                    continue
+                file.write('Battery {} Voltage: {}\n'.format(address,battery.voltage))
+                file.write('Battery {} Min Cell: {}\n'.format(address,battery.min_cell))
+                file.write('Battery {} Max Cell: {}\n'.format(address,battery.max_cell))
+                file.write('Battery {} Leak Detect: {}\n'.format(address,
+                    'WATER_DETECTED' if battery.leak else 'NO_LEAK'))
+            for line in report.lines():
+                file.write(line + '\n')
             
\ No newline at end of file
@@ -42,26 +42,18 @@ if thetis.open_connection(115200) is True:
         
         yn = input("Do you want to delete the files you just created?")
         if 'Y' in yn.upper():
-            ppds = [f for f in filenames if 'PPD' in f]
-            acds = [f for f in filenames if 'ACD' in f]
-            snds = [f for f in filenames if 'SND' in f]
-    
-            #Delete the decimated files.
-            thetis.delete_file(ppds,"PC")  
-            thetis.delete_file(acds,"PC")
-            thetis.delete_file(snds,"PC")
-            thetis.delete_file(filenames,"PC") #Delete the rest.
+            deleted,failed = thetis.delete_files(filenames,"PC")
+            print('Deleted {} files.'.format(len(deleted)))
+            for filename,reason in failed:
+                print('Could not delete {}: {}'.format(filename,reason))
         
         yn2 = input("Do you want to delete the directory you just created?")
         if 'Y' in yn2.upper():
-            files = thetis.list_files("PC")
-            if files == []: #If the directory is empty.
-                thetis.change_directory('..') #Move back one directory.
-                if thetis.remove_directory(today) is True:
-                    print('Directory removed.')
-                    subs = thetis.list_subdirectories()
-                    print(subs)
-                    if today not in subs:
-                        print('Success!')
-                
-                
\ No newline at end of file
+            thetis.fs.cd('..') #Move back one directory.
+            deleted,failed = thetis.remove_tree(today,"PC")
+            if not failed:
+                print('Directory removed.')
+                subs = thetis.fs.dirs()
+                print(subs)
+                if today not in subs:
+                    print('Success!')
@@ -15,33 +15,14 @@ if thetis.open_connection(115200) is True:
     info = thetis.get_version()
     print('Connected to {}.'.format(info['profiler_id']))
 
-    files = thetis.list_files('PC')
-    filenames = []
-    sizes = []
-    for file in files:
-        filenames.append(file[0])
-        sizes.append(file[1])
-    
-    ppds = [f for f in filenames if 'PPD' in f]
-    snds = [f for f in filenames if 'SND' in f]
-    acds = [f for f in filenames if 'ACD' in f]
-    ppbs = [f for f in filenames if 'PPB' in f]
-    snas = [f for f in filenames if 'SNA' in f]
-    acss = [f for f in filenames if 'ACS' in f]
-    dbgs = [f for f in filenames if 'DBG' in f]
-    
-    #Must offload decimated files before full files.
-    thetis.offload_files(snds,py_dir)
-    thetis.offload_files(snas,py_dir)
-    thetis.offload_files(ppds,py_dir)
-    thetis.offload_files(ppbs,py_dir)
-    thetis.offload_files(acds,py_dir)
-    thetis.offload_files(acss,py_dir)
-    thetis.offload_files(dbgs,py_dir)
+    #Only new or grown files are offloaded, decimated files before full files.
+    results = thetis.sync(py_dir)
+    for result in results:
+        print(result)
     
     thetis.close_connection()
     
-py_files = os.listdir(py_dir)
+py_files = [f for f in os.listdir(py_dir) if f != 'sync_index.json']
 jpro_files = os.listdir(jpro_dir)
 
 #Check if there are the same number and types of files.
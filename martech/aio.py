@@ -0,0 +1,204 @@
+'''asyncio support for driving many instruments from a single event loop.
+
+AsyncSERCOM is a non-blocking counterpart to SERCOM with awaitable
+write_command, read_until, read_frame and read_response. On Linux it watches
+the port's file descriptor with the event loop, so waiting for a reply costs
+nothing. On platforms without a selectable port it falls back to short reads
+in a worker thread. New async code can talk to a port through it directly.
+
+AsyncInstrument wraps any of the existing drivers (THETIS, SBM, PAR, TRIPLETW,
+SUNA, SBE49, OPTODE4831) and exposes every command method as a coroutine.
+The drivers themselves stay synchronous, so each instrument gets its own
+worker thread: commands to one port stay in order while other ports run
+concurrently, and existing scripts keep working. Helper objects the driver
+owns (thetis.fs, thetis.rs232, ...) are wrapped the same way and share the
+instrument's worker, so p.rs232.read_frame() is awaited too. Plain values
+such as flags, dicts and lists are returned as they are.
+
+    async def main():
+        profilers = [AsyncInstrument(THETIS(port)) for port in ports]
+        await asyncio.gather(*[p.open_connection() for p in profilers])
+        versions = await asyncio.gather(*[p.get_version() for p in profilers])
+
+Requires Python 3.7 or later.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+from martech.sercom import CRLF,as_pattern,as_terminators,frame_end
+import serial
+import time
+
+class AsyncSERCOM():
+    def __init__(self):
+        '''Set up a blank canvas at instantiation.'''
+        self.sercom = serial.Serial()
+        self.timeout = 1
+        self.timed_out = False
+        self._buffer = bytearray()
+        self._data_ready = None
+        self._fd = None
+
+    async def connect(self,port,baudrate,
+                      bytesize,parity,stopbits,
+                      flowcontrol,timeout=1):
+        self.sercom.port = port
+        self.sercom.baudrate = baudrate
+        self.sercom.timeout = 0 #Reads never block the event loop.
+        self.sercom.bytesize = bytesize
+        self.sercom.stopbits = stopbits
+        self.sercom.parity = parity
+        self.sercom.xonxoff = flowcontrol
+        self.timeout = timeout
+        try:
+            self.sercom.open()
+        except:
+            return False
+        self._data_ready = asyncio.Event()
+        try:
+            fd = self.sercom.fileno()
+            asyncio.get_running_loop().add_reader(fd,self._on_readable)
+            self._fd = fd
+        except (AttributeError,NotImplementedError,ValueError):
+            self._fd = None #No selectable handle, poll from a thread instead.
+        return True
+
+    async def disconnect(self):
+        try:
+            if self._fd is not None:
+                asyncio.get_running_loop().remove_reader(self._fd)
+                self._fd = None
+            self.sercom.close()
+            return True
+        except:
+            return False
+
+    def clear_buffers(self):
+        self.sercom.reset_input_buffer()
+        self.sercom.reset_output_buffer()
+        self._buffer = bytearray()
+
+    async def write_command(self,command,EOL='\r\n'):
+        cmd = str.encode(command + EOL)
+        self.sercom.write(cmd)
+        await asyncio.sleep(0)
+
+    async def read_until(self,terminator=CRLF,timeout=None,pattern=None):
+        '''Read until a terminator, prompt or regex match arrives.
+        Same arguments and return value as SERCOM.read_until.
+        '''
+        terminators = as_terminators(terminator)
+        pattern = as_pattern(pattern)
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        self.timed_out = False
+        scanned = 0
+        while True:
+            end = frame_end(self._buffer,scanned,terminators,pattern)
+            if end is not None:
+                frame = bytes(self._buffer[:end])
+                del self._buffer[:end]
+                return frame
+            scanned = len(self._buffer)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timed_out = True
+                frame = bytes(self._buffer)
+                self._buffer = bytearray()
+                return frame
+            await self._wait_for_data(remaining)
+
+    async def read_frame(self,terminator=CRLF,timeout=None,pattern=None):
+        '''Same as read_until, but decodes the frame to a string.'''
+        frame = await self.read_until(terminator,timeout,pattern)
+        return frame.decode()
+
+    async def read_bytes(self,check=0.1):
+        '''Read until the line has been quiet for check seconds.'''
+        start = time.monotonic()
+        while True:
+            received = len(self._buffer)
+            await self._wait_for_data(check)
+            if len(self._buffer) == received:
+                break
+            if time.monotonic() - start > 30:
+                print('Forced serial read timeout.')
+                break
+        data = bytes(self._buffer)
+        self._buffer = bytearray()
+        return data
+
+    async def read_response(self,check=0.1,until=None,pattern=None,timeout=None):
+        if until is None and pattern is None:
+            data = await self.read_bytes(check)
+        else:
+            data = await self.read_until(until,timeout,pattern)
+        return data.decode()
+
+    def _on_readable(self):
+        '''Event loop callback for when the port has bytes waiting.'''
+        try:
+            data = self.sercom.read(self.sercom.in_waiting or 1)
+        except serial.SerialException:
+            data = b''
+        if data:
+            self._buffer += data
+            self._data_ready.set()
+
+    async def _wait_for_data(self,remaining):
+        '''Wait up to remaining seconds for more bytes to arrive.'''
+        if self._fd is None:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(None,self._blocking_read,
+                                              min(remaining,0.05))
+            self._buffer += data
+            return
+        self._data_ready.clear()
+        try:
+            await asyncio.wait_for(self._data_ready.wait(),remaining)
+        except asyncio.TimeoutError:
+            pass
+
+    def _blocking_read(self,wait):
+        data = self.sercom.read(self.sercom.in_waiting)
+        if not data:
+            time.sleep(wait)
+            data = self.sercom.read(self.sercom.in_waiting)
+        return data
+
+class AsyncInstrument():
+    def __init__(self,instrument,executor=None):
+        '''Wrap a synchronous driver so its commands can be awaited.
+        @param instrument -- an instance of any martech driver.
+        @param executor -- the worker to run commands on. Helper objects
+            share their instrument's, so one port never sees two commands
+            at once.
+        '''
+        self.instrument = instrument
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1)
+        self._executor = executor
+
+    def __getattr__(self,name):
+        attr = getattr(self.instrument,name)
+        if name.startswith('_'):
+            return attr
+        if not callable(attr):
+            if type(attr).__module__.startswith('martech.'):
+                return AsyncInstrument(attr,self._executor)
+            return attr
+        async def command(*args,**kwargs):
+            loop = asyncio.get_running_loop()
+            call = functools.partial(attr,*args,**kwargs)
+            return await loop.run_in_executor(self._executor,call)
+        command.__name__ = name
+        command.__doc__ = attr.__doc__
+        return command
+
+    def shutdown(self):
+        '''Stop the worker thread once queued commands have finished.'''
+        self._executor.shutdown(wait=True)
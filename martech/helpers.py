@@ -1,10 +1,33 @@
+import json
 import os
-import pwd
 
 def get_uid():
     '''Get the username of the active user.'''
+    import pwd #Unix only.
     uid = pwd.getpwuid(os.getuid()).pw_name
     return uid
+
+def load_json(path,default=None):
+    '''Read a JSON file, e.g. one written by save_json.
+    @return -- the data, or default if the file is missing or unreadable.
+    '''
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return default
+
+def save_json(path,data,**kwargs):
+    '''Write data to path as JSON without ever leaving a partial file. It is
+    written to path.tmp, fsynced and renamed over path.
+    @param kwargs -- passed to json.dump, e.g. indent.
+    '''
+    temp = path + '.tmp'
+    with open(temp,'w') as f:
+        json.dump(data,f,**kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp,path)
     
     
     
@@ -0,0 +1,208 @@
+'''Low overhead counters and latency histograms for serial traffic.
+
+Every SERCOM keeps a SerialMetrics. Latency runs from write_command to the
+end of the read that takes its reply. Commands waiting for a reply are kept
+in order, so when commands are pipelined each reply is matched to the oldest
+command still waiting. Latency is grouped by command verb, so all of the
+$PWETC,PC,,,,FREE* round trips land under "PWETC PC FREE" whatever their
+arguments. Histograms use HDR style log-linear buckets (3 bits of precision,
+about 12% relative error) over microseconds, so recording is a couple of
+integer operations and a dict update.
+
+    snapshot = thetis.rs232.metrics.snapshot()
+    print(thetis.rs232.metrics.prometheus())
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import collections
+import time
+
+_VERB_CACHE_SIZE = 1024
+_MAX_PENDING = 256 #Commands waiting for a reply, the oldest are dropped.
+_TWO_WORD_VERBS = ('get','set','list','send','$info')
+
+def command_verb(command):
+    '''Reduce a command to the verb used to group its metrics.
+    '$PWETC,PC,,,,FREE*' -> 'PWETC PC FREE'
+    '#00q0' -> '#00q0'
+    'get --diskfree' -> 'get --diskfree'
+    '$clk 120000' -> '$clk'
+    '''
+    if command.startswith('$PWET'):
+        fields = command[1:].split('*')[0].split(',')
+        if len(fields) > 5:
+            return '{} {} {}'.format(fields[0],fields[1],fields[5])
+        return fields[0]
+    tokens = command.split()
+    if not tokens:
+        return '<EOL>'
+    if tokens[0].lower() in _TWO_WORD_VERBS and len(tokens) > 1:
+        return tokens[0] + ' ' + tokens[1]
+    return tokens[0]
+
+def _bucket(us):
+    if us < 16:
+        return us
+    shift = us.bit_length() - 4
+    return shift*8 + (us >> shift)
+
+def _bucket_floor(index):
+    '''The smallest value in microseconds that falls in a bucket.'''
+    if index < 16:
+        return index
+    shift = index//8 - 1
+    return (index - shift*8) << shift
+
+class LatencyHistogram():
+    __slots__ = ('counts','count','total','max')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self,seconds):
+        index = _bucket(int(seconds*1e6))
+        self.counts[index] = self.counts.get(index,0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self,p):
+        '''@param p -- a percentile between 0 and 100.
+        @return -- the latency in seconds, or None if nothing was recorded.
+        '''
+        if not self.count:
+            return None
+        target = max(1,int(round(self.count*p/100)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                #Report the middle of the bucket, capped at the real maximum.
+                low = _bucket_floor(index)
+                high = _bucket_floor(index + 1)
+                return min(self.max,(low + high)/2e6)
+        return self.max
+
+class _CommandStats():
+    __slots__ = ('latency','timeouts','bytes_out','bytes_in')
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.timeouts = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+class SerialMetrics():
+    def __init__(self,port=None):
+        self.port = port
+        self.commands = {}
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.timeouts = 0
+        self.sleep_seconds = 0.0
+        self._verbs = {}
+        self._pending = collections.deque(maxlen=_MAX_PENDING) #(stats,sent)
+
+    def command_sent(self,command,nbytes):
+        verb = self._verbs.get(command)
+        if verb is None:
+            verb = command_verb(command)
+            if len(self._verbs) < _VERB_CACHE_SIZE:
+                self._verbs[command] = verb
+        stats = self.commands.get(verb)
+        if stats is None:
+            stats = self.commands[verb] = _CommandStats()
+        stats.bytes_out += nbytes
+        self.bytes_out += nbytes
+        self._pending.append((stats,time.monotonic()))
+
+    def bytes_received(self,nbytes):
+        self.bytes_in += nbytes
+        if self._pending:
+            self._pending[0][0].bytes_in += nbytes
+
+    def reply_received(self,timed_out=False):
+        '''Close out the round trip for the oldest command waiting, if any.'''
+        if not self._pending:
+            if timed_out:
+                self.timeouts += 1
+            return
+        stats,sent = self._pending.popleft()
+        stats.latency.record(time.monotonic() - sent)
+        if timed_out:
+            stats.timeouts += 1
+            self.timeouts += 1
+
+    def discard(self):
+        '''Forget the commands still waiting, e.g. when the input buffer is
+        cleared and their replies with it.'''
+        self._pending.clear()
+
+    def slept(self,seconds):
+        self.sleep_seconds += seconds
+
+    def reset(self):
+        self.__init__(self.port)
+
+    def snapshot(self):
+        '''@return -- a dict of totals and per command verb statistics, with
+            latencies in seconds.'''
+        commands = {}
+        for verb,stats in self.commands.items():
+            h = stats.latency
+            commands[verb] = {
+                'count': h.count,
+                'timeouts': stats.timeouts,
+                'bytes_out': stats.bytes_out,
+                'bytes_in': stats.bytes_in,
+                'mean': h.total/h.count if h.count else None,
+                'p50': h.percentile(50),
+                'p90': h.percentile(90),
+                'p99': h.percentile(99),
+                'max': h.max if h.count else None,
+                }
+        return {'port': self.port,
+                'bytes_out': self.bytes_out,
+                'bytes_in': self.bytes_in,
+                'timeouts': self.timeouts,
+                'sleep_seconds': self.sleep_seconds,
+                'commands': commands}
+
+    def prometheus(self,prefix='martech_serial'):
+        '''@return -- the metrics in the Prometheus text exposition format.'''
+        port = _label(self.port)
+        lines = [
+            '# TYPE {}_bytes_out_total counter'.format(prefix),
+            '{}_bytes_out_total{{port="{}"}} {}'.format(prefix,port,self.bytes_out),
+            '# TYPE {}_bytes_in_total counter'.format(prefix),
+            '{}_bytes_in_total{{port="{}"}} {}'.format(prefix,port,self.bytes_in),
+            '# TYPE {}_timeouts_total counter'.format(prefix),
+            '{}_timeouts_total{{port="{}"}} {}'.format(prefix,port,self.timeouts),
+            '# TYPE {}_sleep_seconds_total counter'.format(prefix),
+            '{}_sleep_seconds_total{{port="{}"}} {}'.format(prefix,port,self.sleep_seconds),
+            '# TYPE {}_command_seconds summary'.format(prefix),
+            ]
+        for verb,stats in sorted(self.commands.items()):
+            labels = 'port="{}",command="{}"'.format(port,_label(verb))
+            h = stats.latency
+            for q in (50,90,99):
+                value = h.percentile(q)
+                if value is not None:
+                    lines.append('{}_command_seconds{{{},quantile="{}"}} {}'.format(
+                        prefix,labels,q/100,value))
+            lines.append('{}_command_seconds_sum{{{}}} {}'.format(prefix,labels,h.total))
+            lines.append('{}_command_seconds_count{{{}}} {}'.format(prefix,labels,h.count))
+        #Each metric family must be one group of lines.
+        lines.append('# TYPE {}_command_timeouts_total counter'.format(prefix))
+        for verb,stats in sorted(self.commands.items()):
+            labels = 'port="{}",command="{}"'.format(port,_label(verb))
+            lines.append('{}_command_timeouts_total{{{}}} {}'.format(prefix,labels,stats.timeouts))
+        return '\n'.join(lines) + '\n'
+
+def _label(value):
+    return str(value).replace('\\','\\\\').replace('"','\\"').replace('\n','\\n')
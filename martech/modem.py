@@ -0,0 +1,253 @@
+'''XMODEM, XMODEM-1K and YMODEM receiver for SERCOM ports.
+
+The receiver asks for CRC-16 with C and falls back to the arithmetic
+checksum if the sender never answers. It takes 128 byte (SOH) and 1024 byte
+(STX) blocks as they come, so a sender that supports 1K blocks uses them.
+A YMODEM header block (block 0) supplies the file size, and the padding
+after it is trimmed. Blocks stream straight to a .part file, which is
+fsynced and renamed over the destination once the sender ends the
+transfer.
+
+    result = sercom.receive_xmodem('D2021001.CSV',size=40000)
+    print(result.rate,result.retries)
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import binascii
+import os
+import time
+
+SOH = b'\x01'
+STX = b'\x02'
+EOT = b'\x04'
+ACK = b'\x06'
+NAK = b'\x15'
+CAN = b'\x18'
+CRC = b'C'
+SUB = 0x1A #Padding in the last block.
+
+def crc16(data):
+    '''CRC-16/XMODEM (polynomial 0x1021, initial value 0).'''
+    return binascii.crc_hqx(data,0)
+
+class TransferResult():
+    __slots__ = ('path','bytes','blocks','retries','duplicates','crc',
+                 'block_size','seconds','complete','cancelled','error',
+                 'filename','size')
+
+    def __init__(self,path):
+        self.path = path
+        self.bytes = 0
+        self.blocks = 0
+        self.retries = 0 #Blocks NAKed for a bad checksum, sequence or timeout.
+        self.duplicates = 0 #Blocks sent again after a lost ACK.
+        self.crc = False #CRC-16 rather than the arithmetic checksum.
+        self.block_size = 0 #The largest block the sender used.
+        self.seconds = 0.0
+        self.complete = False
+        self.cancelled = False
+        self.error = None
+        self.filename = None #From a YMODEM header.
+        self.size = None #From a YMODEM header or the caller.
+
+    @property
+    def ok(self):
+        return self.complete and not self.cancelled
+
+    @property
+    def rate(self):
+        '''Bytes written per second.'''
+        if not self.seconds:
+            return 0.0
+        return self.bytes/self.seconds
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return 'TransferResult({!r},bytes={},blocks={},retries={},rate={:.0f})'.format(
+            self.path,self.bytes,self.blocks,self.retries,self.rate)
+
+class Receiver():
+    def __init__(self,rs232,timeout=10.0,retries=10,start_tries=3):
+        '''@param rs232 -- a connected SERCOM.
+        @param timeout -- seconds to wait for each block.
+        @param retries -- consecutive failures before giving up.
+        @param start_tries -- how many times to ask for CRC mode before
+            falling back to the checksum.
+        '''
+        self.rs232 = rs232
+        self.timeout = timeout
+        self.retries = retries
+        self.start_tries = start_tries
+
+    def receive(self,path,size=None,cancel=None,progress=None):
+        '''Receive one file.
+        @param path -- where to write it. Data goes to path + '.part' until
+            the transfer completes.
+        @param size -- the file size if known, used to trim the padding.
+            Otherwise trailing padding bytes in the last block are dropped.
+        @param cancel -- an optional threading.Event (or anything with
+            is_set). Setting it cancels the transfer from the sender's side.
+        @param progress -- an optional callable given the bytes so far.
+        @return -- a TransferResult.
+        '''
+        result = TransferResult(path)
+        result.size = size
+        part = path + '.part'
+        start = time.monotonic()
+        try:
+            with open(part,'wb') as stream:
+                self._receive(stream,result,cancel,progress)
+                if result.complete:
+                    stream.flush()
+                    os.fsync(stream.fileno())
+        except KeyboardInterrupt:
+            self._cancel()
+            raise
+        finally:
+            result.seconds = time.monotonic() - start
+        if result.ok:
+            os.replace(part,path)
+        return result
+
+    def _receive(self,stream,result,cancel,progress):
+        expected = 1
+        failures = 0
+        pending = b'' #The last block, held back until its padding is known.
+        request,head = self._start(result)
+        if head is None:
+            result.error = 'no response from sender'
+            return
+        while True:
+            if cancel is not None and cancel.is_set():
+                self._cancel()
+                result.cancelled = True
+                result.error = 'cancelled'
+                return
+            if failures >= self.retries:
+                self._cancel()
+                result.error = 'too many retries'
+                return
+            if head is None:
+                head = self.rs232.read_exact(1,self.timeout)
+            if not head:
+                head = None
+                failures += 1
+                result.retries += 1
+                self._write(request if not result.blocks else NAK)
+                continue
+            if head == EOT:
+                self._write(ACK)
+                pending = self._trim(pending,result)
+                stream.write(pending)
+                result.bytes += len(pending)
+                if result.filename is not None:
+                    self._end_batch()
+                result.complete = True
+                return
+            if head == CAN:
+                head = None
+                if self.rs232.read_exact(1,1.0) == CAN:
+                    result.cancelled = True
+                    result.error = 'cancelled by sender'
+                    return
+                continue
+            if head not in (SOH,STX):
+                head = None
+                continue #Line noise.
+            n = 1024 if head == STX else 128
+            head = None
+            block = self.rs232.read_exact(n + (4 if result.crc else 3),self.timeout)
+            if len(block) < n + (4 if result.crc else 3) or \
+                    block[0] != 0xFF - block[1] or not self._valid(block,n,result.crc):
+                self._purge()
+                failures += 1
+                result.retries += 1
+                self._write(NAK)
+                continue
+            sequence = block[0]
+            data = block[2:2 + n]
+            if sequence == 0 and expected == 1 and not result.blocks:
+                #A YMODEM header: filename, NUL, size in decimal, ...
+                self._header(data,result)
+                self._write(ACK + CRC)
+                continue
+            if sequence == (expected - 1) & 0xFF:
+                result.duplicates += 1
+                self._write(ACK)
+                continue
+            if sequence != expected & 0xFF:
+                self._cancel()
+                result.error = 'lost block sequence'
+                return
+            self._write(ACK)
+            failures = 0
+            stream.write(pending)
+            result.bytes += len(pending)
+            pending = data
+            result.blocks += 1
+            result.block_size = max(result.block_size,n)
+            expected += 1
+            if progress is not None:
+                progress(result.bytes)
+
+    def _start(self,result):
+        '''Ask for CRC mode, then checksum mode.
+        @return -- (the request that worked,the first block header byte),
+            or (None,None).
+        '''
+        wait = self.timeout/self.start_tries
+        for request,crc in ((CRC,True),(NAK,False)):
+            for i in range(self.start_tries):
+                self._write(request)
+                deadline = time.monotonic() + wait
+                while time.monotonic() < deadline:
+                    head = self.rs232.read_exact(1,deadline - time.monotonic())
+                    if head in (SOH,STX,EOT,CAN):
+                        result.crc = crc
+                        return request,head
+                    #Anything else is the tail of the command reply.
+        return None,None
+
+    def _valid(self,block,n,crc):
+        data = block[2:2 + n]
+        if crc:
+            return crc16(data) == int.from_bytes(block[2 + n:4 + n],'big')
+        return sum(data) & 0xFF == block[2 + n]
+
+    def _header(self,data,result):
+        name,_,rest = bytes(data).partition(b'\x00')
+        result.filename = name.decode('latin-1')
+        fields = rest.split(b'\x00',1)[0].split()
+        if fields and fields[0].isdigit() and result.size is None:
+            result.size = int(fields[0])
+
+    def _trim(self,pending,result):
+        '''Drop the padding from the last block.'''
+        if result.size is not None:
+            keep = result.size - result.bytes
+            return pending[:max(0,keep)]
+        return pending.rstrip(bytes([SUB]))
+
+    def _end_batch(self):
+        '''YMODEM senders follow the file with an empty block 0.'''
+        self._write(CRC)
+        head = self.rs232.read_exact(1,self.timeout)
+        if head in (SOH,STX):
+            self.rs232.read_exact((1024 if head == STX else 128) + 4,self.timeout)
+            self._write(ACK)
+
+    def _purge(self,quiet=0.1):
+        '''Drop everything until the line has been quiet, so the next read
+        starts at a block boundary.'''
+        while self.rs232.read_exact(4096,quiet):
+            pass
+
+    def _cancel(self):
+        self._write(CAN*3)
+        self._purge()
+
+    def _write(self,data):
+        self.rs232.sercom.write(data)
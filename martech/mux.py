@@ -0,0 +1,189 @@
+'''Service many serial ports from one thread without busy polling.
+
+PortMultiplexer takes ownership of the receive side of any number of SERCOM
+ports and waits on all of their file descriptors at once (epoll on Linux).
+Incoming bytes go straight to a per-port parser, and commands can still be
+sent with each port's write_command.
+
+    mux = PortMultiplexer()
+    mux.register(ctd.rs232,LineParser(on_line),name='ctd')
+    mux.register(par.rs232,LineParser(on_line),name='par')
+    while True:
+        mux.poll(1)
+        print(mux.backlog())
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import os
+import selectors
+import serial
+import time
+from martech.sercom import CRLF,RingBuffer,as_pattern,as_terminators
+
+class LineParser():
+    def __init__(self,callback,terminator=CRLF,pattern=None):
+        '''Split a byte stream into frames and hand each one to callback.
+        @param callback -- called as callback(name,frame) for every frame.
+            The frame is a memoryview into the parser's receive buffer and is
+            only valid until the next data arrives; copy it with bytes() to
+            keep it.
+        @param terminator -- a byte string or list of them ending a frame.
+        @param pattern -- an optional regex, bytes or str, that ends a frame
+            when matched.
+        '''
+        self.callback = callback
+        self.terminators = as_terminators(terminator)
+        self.pattern = as_pattern(pattern)
+        self.rx = RingBuffer()
+        self.scanned = 0
+
+    def __call__(self,name,data):
+        self.rx.write(data)
+        self.parse(name)
+
+    def parse(self,name):
+        '''Deliver every complete frame now in the receive buffer.'''
+        while True:
+            end = self.rx.find(self.terminators,self.pattern,self.scanned)
+            if end is None:
+                self.scanned = len(self.rx)
+                break
+            self.scanned = 0
+            self.callback(name,self.rx.take(end))
+
+    def pending(self):
+        '''Number of bytes held while waiting for the rest of a frame.'''
+        return len(self.rx)
+
+class _PortState():
+    __slots__ = ('name','sercom','fd','parser','bytes_in','reads',
+                 'last_rx','max_backlog')
+
+    def __init__(self,name,sercom,fd,parser):
+        self.name = name
+        self.sercom = sercom
+        self.fd = fd
+        self.parser = parser
+        self.bytes_in = 0
+        self.reads = 0
+        self.last_rx = None
+        self.max_backlog = 0
+
+class PortMultiplexer():
+    def __init__(self,chunk=4096,on_drop=None):
+        '''@param chunk -- the most bytes taken from one port per wakeup.
+        @param on_drop -- an optional callable, called as on_drop(name,error)
+            when a port is unplugged or fails and is unregistered.
+        '''
+        self.selector = selectors.DefaultSelector()
+        self.chunk = chunk
+        self.on_drop = on_drop
+        self.ports = {}
+        self.dropped = {} #Port name: the reason it was unregistered.
+
+    def register(self,sercom,parser,name=None):
+        '''Start servicing an open SERCOM port.
+        @param sercom -- a connected SERCOM instance.
+        @param parser -- a callable taking (name,data), e.g. a LineParser.
+        @param name -- a label for the port. Defaults to the device name.
+        '''
+        if name is None:
+            name = sercom.sercom.port
+        fd = sercom.sercom.fileno()
+        state = _PortState(name,sercom,fd,parser)
+        self.selector.register(fd,selectors.EVENT_READ,state)
+        self.ports[name] = state
+        if len(sercom.rx): #Hand over anything a framed read left behind.
+            self._dispatch(state,bytes(sercom.rx.take(len(sercom.rx))))
+        return name
+
+    def unregister(self,name):
+        state = self.ports.pop(name)
+        self.selector.unregister(state.fd)
+
+    def poll(self,timeout=None):
+        '''Wait for data on any port and dispatch it.
+        @param timeout -- seconds to wait. None waits forever.
+        @return -- the number of ports that had data.
+        '''
+        events = self.selector.select(timeout)
+        for key,mask in events:
+            state = key.data
+            rx = getattr(state.parser,'rx',None)
+            try:
+                if rx is not None: #Read straight into the parser's buffer.
+                    received = state.sercom.readinto(rx.writable(self.chunk))
+                else:
+                    data = os.read(state.fd,self.chunk)
+                    received = len(data)
+                if not received:
+                    #None is a wakeup with nothing to read. Ask the port
+                    #whether it is still there: a gone device raises here.
+                    if not state.sercom.sercom.is_open:
+                        raise serial.SerialException('port closed')
+                    state.sercom.sercom.in_waiting
+                    continue
+            except (BlockingIOError,InterruptedError):
+                continue
+            except (serial.SerialException,OSError) as e:
+                self._drop(state,e)
+                continue
+            if rx is not None:
+                rx.commit(received)
+                self._count(state,received)
+                state.parser.parse(state.name)
+            else:
+                self._dispatch(state,data)
+        return len(events)
+
+    def run(self,stop,timeout=0.5):
+        '''Service all ports until stop() returns True.
+        @param stop -- a callable, e.g. threading.Event().is_set.
+        '''
+        while not stop():
+            self.poll(timeout)
+
+    def backlog(self):
+        '''Report how far behind each port is.
+        @return -- a dict keyed by port name with the bytes still queued in
+            the OS, bytes held by the parser for an incomplete frame, the
+            largest OS backlog seen, totals, and seconds since data arrived.
+        '''
+        report = {}
+        now = time.monotonic()
+        for name,state in self.ports.items():
+            queued = state.sercom.sercom.in_waiting
+            state.max_backlog = max(state.max_backlog,queued)
+            pending = getattr(state.parser,'pending',None)
+            report[name] = {
+                'os_queued': queued,
+                'parser_pending': pending() if pending else 0,
+                'max_os_queued': state.max_backlog,
+                'bytes_in': state.bytes_in,
+                'reads': state.reads,
+                'idle': None if state.last_rx is None else now - state.last_rx,
+                }
+        return report
+
+    def close(self):
+        for name in list(self.ports):
+            self.unregister(name)
+        self.selector.close()
+
+    def _drop(self,state,error):
+        self.unregister(state.name)
+        self.dropped[state.name] = str(error)
+        if self.on_drop is not None:
+            self.on_drop(state.name,error)
+        else:
+            print('Port {} dropped: {}'.format(state.name,error))
+
+    def _dispatch(self,state,data):
+        self._count(state,len(data))
+        state.parser(state.name,data)
+
+    def _count(self,state,received):
+        state.bytes_in += received
+        state.reads += 1
+        state.last_rx = time.monotonic()
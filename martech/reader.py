@@ -0,0 +1,192 @@
+'''A background reader thread for instruments that stream data continuously.
+
+The reader takes over the receive side of a SERCOM port, splits the stream
+into lines (or any terminator/regex framing), stamps each frame with the
+time it arrived, and hands it to every subscriber queue. Each subscriber has
+its own bound and overflow policy, so a slow consumer never holds up the
+port or the other consumers.
+
+    reader = par.rs232.start_reader()
+    samples = reader.subscribe(maxsize=1000)
+    par.start_sampling()
+    for frame in samples:
+        print(frame.timestamp,frame.data)
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import collections
+import queue
+import serial
+import threading
+import time
+from martech.sercom import CRLF,as_pattern,as_terminators
+
+#A received frame, stamped with the wall clock time and monotonic time.
+Frame = collections.namedtuple('Frame',['timestamp','monotonic','data'])
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+BLOCK = 'block'
+
+_CLOSED = object()
+
+class Subscription():
+    def __init__(self,reader,maxsize=1000,policy=DROP_OLDEST):
+        '''A bounded queue of frames from a SerialReader.
+        @param maxsize -- the most frames held before the policy applies.
+        @param policy -- what to do when the queue is full.
+            DROP_OLDEST discards the oldest frame to make room.
+            DROP_NEWEST discards the incoming frame.
+            BLOCK makes the reader wait, leaving data in the OS buffer.
+        '''
+        if policy not in (DROP_OLDEST,DROP_NEWEST,BLOCK):
+            raise ValueError('Unknown overflow policy: {}'.format(policy))
+        self.reader = reader
+        self.policy = policy
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self.delivered = 0
+        self.closed = False #Set once the reader has stopped and the queue is empty.
+
+    def get(self,timeout=None):
+        '''Get the next frame.
+        @return -- a Frame, or None on timeout or once the reader stops.
+        '''
+        try:
+            frame = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if frame is _CLOSED:
+            self.closed = True
+            self.queue.put(_CLOSED) #Keep later calls from blocking.
+            return None
+        return frame
+
+    def __iter__(self):
+        while True:
+            frame = self.get()
+            if frame is None:
+                return
+            yield frame
+
+    def close(self):
+        self.reader.unsubscribe(self)
+
+    def _put(self,frame,running):
+        if self.policy == BLOCK:
+            while running():
+                try:
+                    self.queue.put(frame,timeout=0.1)
+                    self.delivered += 1
+                    return
+                except queue.Full:
+                    continue
+            return
+        try:
+            self.queue.put_nowait(frame)
+            self.delivered += 1
+            return
+        except queue.Full:
+            pass
+        if self.policy == DROP_NEWEST:
+            self.dropped += 1
+            return
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.dropped += 1
+        try:
+            self.queue.put_nowait(frame)
+            self.delivered += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _close(self):
+        try:
+            self.queue.put_nowait(_CLOSED)
+        except queue.Full:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(_CLOSED)
+
+class SerialReader():
+    def __init__(self,rs232,terminator=CRLF,pattern=None,poll=0.05):
+        '''@param rs232 -- a connected SERCOM instance.
+        @param terminator -- a byte string or list of them ending a frame.
+        @param pattern -- an optional regex that ends a frame when matched.
+        @param poll -- the longest the thread waits before checking whether
+            it has been asked to stop.
+        '''
+        self.rs232 = rs232
+        self.terminators = as_terminators(terminator)
+        pattern = as_pattern(pattern)
+        self.pattern = pattern
+        self.poll = poll
+        self.frames = 0
+        self.subscribers = []
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._thread = None
+
+    def subscribe(self,maxsize=1000,policy=DROP_OLDEST):
+        '''Start receiving frames. See Subscription for the arguments.'''
+        subscription = Subscription(self,maxsize,policy)
+        with self._lock:
+            self.subscribers = self.subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self,subscription):
+        with self._lock:
+            self.subscribers = [s for s in self.subscribers if s is not subscription]
+        subscription._close()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._running.set()
+        self._thread = threading.Thread(target=self._run,daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        '''Stop the thread and hand the receive side back to the port.'''
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for subscription in self.subscribers:
+            subscription._close()
+
+    def is_running(self):
+        return self._running.is_set()
+
+    def _run(self):
+        rx = self.rs232.rx
+        scanned = 0
+        while self._running.is_set():
+            try:
+                if not self.rs232._fill(self.poll):
+                    continue
+            except (serial.SerialException,OSError):
+                print('Serial reader stopped: port closed.')
+                self._running.clear()
+                for subscription in self.subscribers:
+                    subscription._close() #Wake anyone waiting on a frame.
+                break
+            now = time.time()
+            mono = time.monotonic()
+            while True:
+                end = rx.find(self.terminators,self.pattern,scanned)
+                if end is None:
+                    scanned = len(rx)
+                    break
+                scanned = 0
+                self._publish(Frame(now,mono,bytes(rx.take(end))))
+
+    def _publish(self,frame):
+        self.frames += 1
+        for subscription in self.subscribers:
+            subscription._put(frame,self._running.is_set)
@@ -202,20 +202,41 @@ class PAR():
         self.store_settings()
         return set_val
   
-    def collect_data(self,seconds=30):
-
+    def stream_data(self,seconds=None,maxsize=1000):
+        '''Start sampling and yield each sample as soon as it arrives.
+        @param seconds -- how long to sample. None samples until the caller
+            stops iterating.
+        @param maxsize -- the most samples buffered for a slow consumer. The
+            oldest samples are dropped past this.
+        @return -- a generator of (timestamp,fields) tuples, where fields is
+            the tab delimited sample as a list of strings.
+        '''
+        samples = self.rs232.start_reader().subscribe(maxsize)
         self.start_sampling()
-        time.sleep(1 + seconds) #Add 1 second for wiper operation.
-        response = self.rs232.read_response()
-        self.stop_sampling()
-        response = response.replace('\r','')
-        lines = response.split('\n')
-        lines = [line for line in lines if 'mvs' not in line] #Drop mvs lines.
-        lines = list(filter(None,lines)) #Drop empty lines.
-        data_array = []
-        for line in lines:
-            data = line.split('\t')
-            data_array.append(data)
+        if seconds is not None:
+            end = time.monotonic() + 1 + seconds #Add 1 second for wiper operation.
+        try:
+            while True:
+                if seconds is None:
+                    frame = samples.get()
+                else:
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    frame = samples.get(timeout=remaining)
+                if frame is None:
+                    if samples.closed: #The reader stopped, e.g. the port dropped.
+                        break
+                    continue
+                line = frame.data.decode(errors='replace').strip()
+                if line and 'mvs' not in line: #Drop mvs and empty lines.
+                    yield frame.timestamp,line.split('\t')
+        finally:
+            self.rs232.stop_reader()
+            self.stop_sampling()
+
+    def collect_data(self,seconds=30):
+        data_array = [fields for timestamp,fields in self.stream_data(seconds)]
         self.rs232.clear_buffers()
         return data_array
     
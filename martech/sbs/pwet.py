@@ -0,0 +1,160 @@
+'''Encode and decode the PWET sentences spoken by the SBS Thetis profiler.
+
+Sentences look like NMEA: $TALKER,LISTENER,,,IDENT,COMMAND,ARGC,ARG...*CS
+where CS is two hex digits. Unlike NMEA, the Thetis firmware includes the $
+in the XOR (VER*0F, WHS,1,0*03 and HLD,1,1*0E all check out that way), so
+that is the default. Pass dollar=False for the plain NMEA checksum.
+$PWETC sentences are commands, $PWETA sentences are replies (including NAKs)
+and $PWETB sentences carry file data as COMMAND,INDEX,PAYLOAD.
+
+Decoding is a single split on commas, with no regex. Every call returns a
+new Sentence.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import functools
+import operator
+
+DOLLAR = 0x24
+
+class Sentence():
+    __slots__ = ('talker','listener','ident','command','argc','args','checksum_ok')
+
+    def __init__(self,talker='',listener='',ident='',command='',argc=None,
+                 args=(),checksum_ok=None):
+        '''One decoded PWET sentence.
+        @param argc -- the argument count, or None when the field is not a
+            number (e.g. DIR,DONE). For PWETB it is the chunk index.
+        @param args -- a tuple of strings. For PWETB it holds the payload
+            as bytes.
+        @param checksum_ok -- None if the sentence had no checksum.
+        '''
+        self.talker = talker
+        self.listener = listener
+        self.ident = ident
+        self.command = command
+        self.argc = argc
+        self.args = args
+        self.checksum_ok = checksum_ok
+
+    @property
+    def nak(self):
+        return self.command == 'NAK'
+
+    @property
+    def done(self):
+        return 'DONE' in self.args
+
+    def __bool__(self):
+        return bool(self.talker)
+
+    def __repr__(self):
+        return 'Sentence({!r},{!r},{!r},{!r},{!r},{!r},{!r})'.format(
+            self.talker,self.listener,self.ident,self.command,self.argc,
+            self.args,self.checksum_ok)
+
+def checksum(body):
+    '''XOR of every byte in body. Long bodies (PWETB payloads) are folded as
+    one big integer so the loop runs over halvings rather than bytes.'''
+    n = len(body)
+    if n <= 64:
+        return functools.reduce(operator.xor,body,0)
+    value = int.from_bytes(body,'little')
+    width = 1 << (n - 1).bit_length()
+    while width > 1:
+        width >>= 1
+        shift = width << 3
+        value = (value >> shift) ^ (value & ((1 << shift) - 1))
+    return value
+
+def sentence_checksum(body,dollar=True):
+    '''The checksum of the bytes between $ and *.
+    @param dollar -- include the $, as the Thetis firmware does.
+    '''
+    return checksum(body) ^ DOLLAR if dollar else checksum(body)
+
+def encode(command,args=(),listener='PC',talker='PWETC',ident='',dollar=True):
+    '''Build a sentence with its checksum.
+    @param args -- the arguments. The argument count is added when there
+        are any.
+    @param dollar -- see sentence_checksum.
+    @return -- the sentence as a string, without a line ending.
+    '''
+    body = '{},{},,,{},{}'.format(talker,listener,ident,command)
+    if args:
+        body += ',{},{}'.format(len(args),','.join(str(a) for a in args))
+    return '${}*{:02X}'.format(body,sentence_checksum(body.encode(),dollar))
+
+def decode(data,dollar=True):
+    '''Decode one sentence.
+    @param data -- bytes or str ending with a sentence. Only the last
+        sentence is decoded: an echoed command or a partial sentence before
+        it, and anything after the checksum, is ignored.
+    @param dollar -- see sentence_checksum.
+    @return -- a Sentence, empty (false) if data holds no PWET sentence.
+    '''
+    if isinstance(data,str):
+        data = data.encode('latin-1')
+    star = data.rfind(b'*')
+    start = data.rfind(b'$PWET',0,star if star != -1 else len(data))
+    if start == -1:
+        start = data.rfind(b'$PWET')
+        if start == -1:
+            return Sentence()
+    if star < start:
+        star = len(data.rstrip(b'\r\n'))
+        checksum_ok = None
+    else:
+        digits = data[star + 1:star + 3]
+        try:
+            checksum_ok = int(digits,16) == sentence_checksum(data[start + 1:star],dollar)
+        except ValueError:
+            checksum_ok = None
+    binary = data[start + 5:start + 6] == b'B'
+    if binary:
+        fields = data[start + 1:star].split(b',',7)
+        head = [f.decode('latin-1') for f in fields[:7]]
+        args = (fields[7],) if len(fields) > 7 else ()
+    else:
+        head = data[start + 1:star].decode('latin-1').split(',')
+        args = tuple(head[7:])
+    head += [''] * (7 - len(head))
+    argc = head[6]
+    if argc.isdigit():
+        argc = int(argc)
+    else:
+        if argc:
+            args = (argc,) + args
+        argc = None
+    return Sentence(head[0],head[1],head[4],head[5],argc,args,checksum_ok)
+
+def decode_all(data):
+    '''Decode every PWETA sentence in a block of lines, e.g. a DIR listing.
+    @return -- a list of Sentences.
+    '''
+    if isinstance(data,str):
+        data = data.encode('latin-1')
+    sentences = []
+    for line in data.split(b'\n'):
+        if b'$PWET' in line:
+            sentences.append(decode(line))
+    return sentences
+
+def matches(expected,returned,tolerance=1e-6):
+    '''Check reply arguments against expected values. Strings must match
+    exactly, numbers within tolerance. Extra returned arguments are ignored.
+    '''
+    if len(returned) < len(expected):
+        return False
+    for e,r in zip(expected,returned):
+        if isinstance(e,str):
+            if e != r:
+                return False
+            continue
+        try:
+            if abs(float(r) - float(e)) > tolerance:
+                return False
+        except ValueError:
+            return False
+    return True
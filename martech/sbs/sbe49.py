@@ -1,4 +1,4 @@
-from martech.sercom import SERCOM
+from martech.sercom import SERCOM,SBE_PROMPT
 import time
 
 class SBE49():
@@ -26,8 +26,7 @@ class SBE49():
     def stop_sampling(self):
         self.rs232.write_command("STOP")
         self._force_new_command_prompt()
-        time.sleep(1)
-        response = self.rs232.read_response()
+        response = self.rs232.read_response(until=SBE_PROMPT)
         self.rs232.clear_buffers()
         if "S>" in response:
             return True
@@ -36,12 +35,12 @@ class SBE49():
 
     def get_status(self):
         self.rs232.write_command("DS")
-        response = self.rs232.read_response()
+        response = self.rs232.read_response(until=SBE_PROMPT)
         return response
     
     def get_calibration_coeffs(self):
         self.rs232.write_command("DCAL")
-        response = self.rs232.read_response()
+        response = self.rs232.read_response(until=SBE_PROMPT)
         return response
 
     def exit_passthru(self): 
@@ -1,9 +1,19 @@
 import datetime
+from martech.modem import TransferResult
+from martech.sbs import suna_sync
 from martech.sercom import SERCOM
+import os
 import re
 import time
+import zipfile
 from xml.etree import ElementTree as ET
-from xmodem import XMODEM
+
+#Replies to get/set commands end with the prompt after Ok or Error, so no
+#stale prompt is left to end the next listing early.
+SUNA_REPLY = re.compile(rb'(?:Ok|Error)[^\r]*\r\nSUNA> ?')
+#send answers Ok without a prompt when the XMODEM transfer follows.
+SUNA_SEND = re.compile(rb'(?:Ok|Error)[^\r]*\r\n')
+SUNA_PROMPT = b'SUNA>'
 
 class SUNA():
     def __init__(self,port):
@@ -47,19 +57,19 @@ class SUNA():
         
     def get_disk_free(self):
         self.rs232.write_command('get --diskfree')
-        response = self.rs232.read_response()
+        response = self.rs232.read_response(pattern=SUNA_REPLY)
         disk_free = int(re.findall(r"Ok (.*?)\r",response).pop())/1000000
         return disk_free 
     
     def get_disk_total(self):
         self.rs232.write_command('get --disktotal')
-        response = self.rs232.read_response()
+        response = self.rs232.read_response(pattern=SUNA_REPLY)
         disk_total = int(re.findall(r"Ok (.*?)\r",response).pop())/1000000
         return disk_total
     
     def get_clock(self):
         self.rs232.write_command('get clock')
-        response = self.rs232.read_response()
+        response = self.rs232.read_response(pattern=SUNA_REPLY)
         dt = str(re.findall(r"Ok (.*?)\r",response).pop())
         return dt    
 
@@ -67,7 +77,7 @@ class SUNA():
         fmt = '%Y/%m/%d %H:%M:%S'
         now = datetime.datetime.now(datetime.timezone.utc).strftime(fmt)
         self.rs232.write_command('set clock {}'.format(now))
-        response = self.rs232.read_response()
+        response = self.rs232.read_response(pattern=SUNA_REPLY)
         if 'Ok' in response:
             return True
         else:
@@ -75,31 +85,61 @@ class SUNA():
     
     def get_active_calfile_name(self):
         self.rs232.write_command('get activecalfile')
-        response = self.rs232.read_response()
+        response = self.rs232.read_response(pattern=SUNA_REPLY)
         filename = re.findall(r"Ok (.*?)\r",response).pop()
         return filename    
 
-    def _getc(self,size,timeout=1):
-        '''XMODEM output'''
-        return self.rs232.read(size)
-
-    def _putc(self,data,timeout=1):
-        '''XMODEM input'''
-        return self.rs232.write(data)
-    
-    def transfer_calfile(self,filename):
-        filename = filename.upper() 
-        self.rs232.write_command('send cal {}'.format(filename))
-        self.rs232.read_bytes() #Read send command response to clear buffers.
-        modem = XMODEM(self._getc,self._putc)
-        stream = open(filename,'wb')
-        modem.recv(stream)
-        if os.path.getsize(filename) > 1000:
-            print('Downloaded {}.'.format(filename)
-            return True
+    def _transfer(self,kind,filename,path=None,size=None,cancel=None,
+                  progress=None):
+        '''Have the SUNA send a file with XMODEM, see martech.modem. 1K
+        blocks and CRC-16 are used when the SUNA offers them.
+        @param kind -- DATA, CAL, LOG or Pkg.
+        @param path -- where to save the file. Defaults to filename.
+        @param size -- the file size, if known, to trim the padding exactly.
+        @param cancel -- an optional threading.Event to stop the transfer.
+        @param progress -- an optional callable given the bytes so far.
+        @return -- a martech.modem.TransferResult, true if the file arrived.
+        '''
+        filename = filename.upper()
+        if path is None:
+            path = filename
+        self.rs232.clear_buffers()
+        self.rs232.write_command('send {} {}'.format(kind,filename))
+        reply = self.rs232.read_until(None,self.timeout,SUNA_SEND)
+        if b'Ok' not in reply:
+            self.rs232.read_until(SUNA_PROMPT,1) #The prompt after the error.
+            result = TransferResult(path)
+            result.error = reply.decode(errors='replace').strip() or 'no reply'
+            print('There was an issue downloading {}: {}'.format(filename,result.error))
+            return result
+        result = self.rs232.receive_xmodem(path,size,cancel,progress)
+        if not result:
+            self.rs232.write_command('') #Flush any half line after a cancel.
+        self.rs232.read_until(SUNA_PROMPT,1) #The prompt after the transfer.
+        if result:
+            print('Downloaded {} ({:.0f} B/s, {} retries).'.format(filename,
+                  result.rate,result.retries))
         else:
-            print('There was an issue downloading {}.'.format(filename)
-            return False      
+            print('There was an issue downloading {}: {}'.format(filename,result.error))
+        return result
+
+    def transfer_calfile(self,filename,path=None):
+        return self._transfer('CAL',filename,path)
+
+    def load_calibration(self,filename=None,path=None):
+        '''Download a calibration file and load it for reprocessing, see
+        martech.sbs.suna_cal.
+        @param filename -- defaults to the active calibration file.
+        @return -- a Calibration, or None if the transfer failed.
+        '''
+        from martech.sbs.suna_cal import Calibration
+        if filename is None:
+            filename = self.get_active_calfile_name()
+        if path is None:
+            path = filename.upper()
+        if not self.transfer_calfile(filename,path):
+            return None
+        return Calibration.load(path)
 
     def transfer_xml_zip(self):
         '''Downloads a zip file which contains a XML file that has everything 
@@ -108,21 +148,10 @@ class SUNA():
                 False if the file doesn't contain anything.
         '''
         sn = self.get_sn()
-        if len(sn)) == 3:
-            self.sn = str('0') + str(sn)
-        self.write_command('send Pkg SNA{}.ZIP'.format(str(sn)))
-        self.read_bytes() #Read send command response to clear buffers.
-        print('XMODEM transfer of SNA{}.ZIP initiated.'.format(sn))
-        modem = XMODEM(self._getc,self._putc)
-        filename = 'SNA' + str(sn) + '.ZIP'
-        stream = open(filename,'wb')
-        modem.recv(stream)
-        if os.path.getsize(filename) > 1:
-            print('Downloaded {}.'.format(filename)
-            return True
-        else:
-            print('There was an issue downloading {}.'.format(filename)
-            return False  
+        if len(sn) == 3:
+            sn = '0' + sn
+        result = self._transfer('Pkg','SNA{}.ZIP'.format(sn))
+        return bool(result) and result.bytes > 1
 
         
     def extract_xml(self):
@@ -132,48 +161,25 @@ class SUNA():
         for root, dirs, files in os.walk('./'):
             for file in files:  #Search for a zip folder and extract it.
                 if 'ZIP' in file:
-                    print('Extracting {}.'.format(file)
+                    print('Extracting {}.'.format(file))
                     zipfile.ZipFile(file,'r').extractall()
-                    print('{} extracted.'.format(file)
+                    print('{} extracted.'.format(file))
                     break
 
         for root, dirs, files in os.walk('./'):
             for file in files:  #Search for an xml file.
                 if '.xml' in file:
-                    print('{} extracted from zip.'.format(file)
+                    print('{} extracted from zip.'.format(file))
                     return file
         
         
-    def transfer_syslog(self):
+    def transfer_syslog(self,path='SYSLOG.LOG'):
         '''Downloads the syslog file from the SUNA.'''
-        self.write_command('send LOG SYSLOG.LOG')
-        self.read_bytes() #Read send command response to clear buffers.
-        print('XMODEM transfer of SYSLOG initiated.')
-        modem = XMODEM(self._getc,self._putc)
-        stream = open('SYSLOG.LOG','wb')
-        modem.recv(stream)
-        print('XMODEM transfer of SYSLOG complete.)
-        if os.path.getsize('SYSLOG.LOG') > 1:
-            print('Downloaded SYSLOG.LOG.')
-            return True
-        else:
-            print('There was an issue downloading SYSLOG.LOG.')
-            return False  
+        return self._transfer('LOG','SYSLOG.LOG',path)
 
-    def transfer_lamplog(self):
-        '''Downloads the LAMPUSE file from the SUNA. WILL TAKE FOREVER.'''
-        self.write_command('send LOG LAMPUSE.LOG')
-        time.sleep(self.wait)
-        self.read_bytes() #Read send command response to clear buffers.
-        modem = XMODEM(self._getc,self._putc)
-        stream = open('LAMPUSE.LOG','wb')
-        modem.recv(stream) 
-        if os.path.getsize(filename) > 1:
-            print('Downloaded LAMPUSE.LOG.')
-            return True
-        else:
-            print('There was an issue downloading LAMPUSE.LOG.')
-            return False   
+    def transfer_lamplog(self,path='LAMPUSE.LOG'):
+        '''Downloads the LAMPUSE file from the SUNA.'''
+        return self._transfer('LOG','LAMPUSE.LOG',path)
     
     def perform_selftest(self):
         self.rs232.write_command("selftest",EOL='\r\n')
@@ -184,10 +190,10 @@ class SUNA():
 
 
     def get_sn(self):
-        self.write_command('get serialno')
-        response = self.read_response()
+        self.rs232.write_command('get serialno')
+        response = self.rs232.read_response(pattern=SUNA_REPLY)
         sn = re.findall(r"Ok (.*?)\r",response)[0]
-        print('Connected to SNA{}.'.format(sn)
+        print('Connected to SNA{}.'.format(sn))
         return sn
 
 
@@ -251,8 +257,8 @@ class SUNA():
         '''Returns a list of calibration files, dates, and filesizes on
         the SUNA as an array of arrays. 
         '''
-        self.write_command('List Cal')
-        response = self.read_response() 
+        self.rs232.write_command('List Cal')
+        response = self.rs232.read_response(until=SUNA_PROMPT,timeout=30) 
         files = response.split('\n')
         calfiles = [file for file in files if '.CAL' in file]
         cal_files_info = []
@@ -270,8 +276,8 @@ class SUNA():
     def list_datafiles(self):
         '''Returns a list of data files, dates, and filesizes on the SUNA
         as an array of arrays.'''
-        self.write_command('List Data')
-        response = self.read_response()
+        self.rs232.write_command('List Data')
+        response = self.rs232.read_response(until=SUNA_PROMPT,timeout=30)
         files = response.split('\n')
         dfiles = [file for file in files if '.CSV' in file or '.BIN' in file]
         data_files_info = []
@@ -286,15 +292,46 @@ class SUNA():
         return data_files_info
     
     
-    def transfer_datafile(self,filename):
-        '''Downloads a specified data file. May take several minutes
-        to offload.'''
-        filename = filename.upper()
-        self.write_command('send DATA {}'.format(filename))
-        self.read_bytes() #Read send command response to clear buffers.
-        modem = XMODEM(self._getc,self._putc)
-        stream = open(filename,'wb')
-        modem.recv(stream)     
+    def transfer_datafile(self,filename,path=None,size=None,cancel=None,
+                          progress=None):
+        '''Downloads a specified data file. Pass the size from
+        list_datafiles to trim the XMODEM padding exactly.
+        @return -- a martech.modem.TransferResult with the rate and retries.
+        '''
+        return self._transfer('DATA',filename,path,size,cancel,progress)
+
+    def sync_datafiles(self,directory,cancel=None):
+        '''Bring a local copy of the SUNA data files up to date. Only files
+        that are new, have grown or whose local copy is missing or the wrong
+        size are transferred, oldest first, so the file being written comes
+        last. The manifest is kept in directory/suna_manifest.json.
+        @param cancel -- an optional threading.Event that stops the sync
+            after cancelling the transfer in progress.
+        @return -- a list of (filename,reason,TransferResult) for the files
+            transferred.
+        '''
+        os.makedirs(directory,exist_ok=True)
+        manifest = suna_sync.DataManifest(directory)
+        files = self.list_datafiles()
+        results = []
+        try:
+            for filename,date,size in sorted(files,key=lambda f: (f[1],f[0])):
+                reason = manifest.needs_transfer(filename,date,size)
+                if reason is None:
+                    continue
+                if cancel is not None and cancel.is_set():
+                    break
+                path = manifest.local_path(filename)
+                result = self.transfer_datafile(filename,path,size,cancel)
+                results.append((filename,reason,result))
+                if result and os.path.getsize(path) == size:
+                    manifest.update(filename,date,size,suna_sync.COMPLETE)
+                else:
+                    manifest.update(filename,date,size,suna_sync.FAILED)
+                manifest.save()
+        finally:
+            manifest.save()
+        return results
         
         
     def selftest(self):
@@ -315,28 +352,67 @@ class SUNA():
         return cfg
 
     def autosample(self,seconds=60):
-        '''Tells the SUNA to autosample for X number of seconds
-        (with a 20 second buffer for wiper operation). Numbers are converted
-        to floats and strings are left as strings.'''       
-        self.stop()
-        self.start()
-        time.sleep(20 + seconds)
-        response = self.read_response()
-        self.stop()
-        lines = response.split('\n')
-        data_lines = [line for line in lines if 'SAT' in line] #ID header.
-        data = []
-        for data_line in data_lines:
-            drop = data_line.replace('\r','')
-            delim = drop.split(',')
-            data.append(delim)
-        for sample in data: #Convert data to appropriate datatypes.
-            for i in range(len(sample)):
-                try:
-                    sample[i] = float(sample[i])
-                except:
-                    sample[i] = str(sample[i])
-        return data
+        '''Tells the SUNA to autosample for X number of seconds, counted
+        from the first frame (the wiper runs before sampling starts).
+        @return -- the frames as a NumPy structured array, see
+            martech.sbs.suna_frames.
+        '''
+        from martech.sbs.suna_frames import FrameArray
+        frames = FrameArray(max(64,int(seconds*2)))
+        for batch in self.stream(seconds,batch=64):
+            frames.append(batch)
+        return frames.data
+
+    def stream(self,seconds=None,batch=16,cancel=None,wait=30.0):
+        '''Start sampling and yield SATSLF/SATSDF frames as they arrive,
+        decoded into NumPy structured arrays (see martech.sbs.suna_frames).
+        Sampling stops when the generator finishes or is closed.
+        @param seconds -- how long to sample, counted from the first frame.
+            None samples until cancel is set or the generator is closed.
+        @param batch -- frames per array. 1 yields every frame on arrival. A
+            partial batch is yielded once no frame has arrived for 1 s.
+            Lines that are not frames are skipped.
+        @param cancel -- an optional threading.Event that ends the stream.
+        @param wait -- seconds to wait for the first frame.
+        '''
+        from martech.reader import BLOCK
+        from martech.sbs import suna_frames
+        self.rs232.clear_buffers()
+        frames = self.rs232.start_reader().subscribe(maxsize=10000,policy=BLOCK)
+        self.start_sampling()
+        lines = []
+        received = []
+        end = time.monotonic() + wait #Until the first frame arrives.
+        started = False
+        last = None #When the newest frame in the batch arrived.
+        try:
+            while cancel is None or not cancel.is_set():
+                if end is not None and time.monotonic() >= end:
+                    break
+                timeout = 1.0
+                if lines:
+                    timeout = max(0.0,last + 1.0 - time.monotonic())
+                frame = frames.get(timeout)
+                if frame is None and frames.closed: #The port dropped.
+                    break
+                if frame is not None and suna_frames.is_frame(frame.data):
+                    if not started:
+                        started = True
+                        end = None if seconds is None else frame.monotonic + seconds
+                    lines.append(frame.data)
+                    received.append(frame.timestamp)
+                    last = frame.monotonic
+                #Quiet only once nothing is queued, not just since the last frame.
+                if lines and (len(lines) >= batch or (frame is None and
+                              time.monotonic() - last >= 1.0)):
+                    yield suna_frames.decode(lines,received)
+                    lines = []
+                    received = []
+            if lines:
+                yield suna_frames.decode(lines,received)
+        finally:
+            self.rs232.stop_reader()
+            self.stop_sampling()
  
 
     def reboot(self):
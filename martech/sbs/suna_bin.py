@@ -0,0 +1,168 @@
+'''A memory-mapped reader for SUNA V2 binary (.BIN) data files.
+
+Full binary frames are a fixed BIN_FRAME_SIZE bytes, big endian, starting
+with SATSLB (light) or SATSDB (dark) and the serial number, and ending with
+a checksum byte chosen so every byte of the frame sums to zero (mod 256).
+The file is scanned a window at a time: headers are found with vectorized
+byte comparisons, every candidate's checksum is checked at once, and each
+run of back to back frames is returned as a BIN_DTYPE array viewing the
+mapped file. Spectra come out as a (frames,256) view with no copy, so files
+larger than RAM can be read block by block.
+
+    with BinFile('D2021001.BIN') as data:
+        for frames in data.blocks():
+            spectra = frames['spectrum']
+            times = sensor_time(frames['date'],frames['hours'])
+
+Views are only valid while the file is open. Copy anything kept longer.
+Requires NumPy.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import mmap
+import numpy as np
+import os
+from martech.sbs.suna_frames import CHANNELS,sensor_time
+
+BIN_DTYPE = np.dtype(
+    [('header','S10'),
+     ('date','>i4'), #YYYYDDD
+     ('hours','>f8'),
+     ('nitrate','>f4'),
+     ('nitrogen','>f4'),
+     ('abs254','>f4'),
+     ('abs350','>f4'),
+     ('bromide','>f4'),
+     ('spectrum_average','>u2'),
+     ('dark_value','>u2'),
+     ('integration_factor','u1'),
+     ('spectrum','>u2',(CHANNELS,)),
+     ('temp_internal','>f4'),
+     ('temp_spectrometer','>f4'),
+     ('temp_lamp','>f4'),
+     ('lamp_time','>u4'),
+     ('humidity','>f4'),
+     ('voltage_main','>f4'),
+     ('voltage_lamp','>f4'),
+     ('voltage_internal','>f4'),
+     ('current_main','>f4'),
+     ('fit_aux1','>f4'),
+     ('fit_aux2','>f4'),
+     ('fit_base1','>f4'),
+     ('fit_base2','>f4'),
+     ('fit_rmse','>f4'),
+     ('ctd_time','>u4'),
+     ('ctd_salinity','>f4'),
+     ('ctd_temperature','>f4'),
+     ('ctd_pressure','>f4'),
+     ('checksum','u1')])
+BIN_FRAME_SIZE = BIN_DTYPE.itemsize
+
+HEADER = b'SATS'
+
+def is_dark(frames):
+    '''@return -- a boolean array, True for SATSDB frames.'''
+    return np.char.startswith(frames['header'],b'SATSD')
+
+class BinFile():
+    def __init__(self,path):
+        self.path = path
+        self.frames = 0 #Valid frames returned so far.
+        self.bad_frames = 0 #Headers whose frame failed its checksum.
+        self.skipped = 0 #Bytes between frames.
+        self._file = open(path,'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._map = None #Zero length files cannot be mapped.
+        if self.size:
+            self._map = mmap.mmap(self._file.fileno(),0,access=mmap.ACCESS_READ)
+
+    def blocks(self,frames=4096):
+        '''Iterate over the valid frames a window at a time.
+        @param frames -- the most frames scanned per window.
+        @return -- an iterator of BIN_DTYPE arrays, each a run of back to
+            back frames viewing the mapped file.
+        '''
+        if self._map is None:
+            return
+        window = frames*BIN_FRAME_SIZE
+        pos = 0
+        while pos + BIN_FRAME_SIZE <= self.size:
+            stop = min(self.size,pos + window + BIN_FRAME_SIZE)
+            data = np.frombuffer(self._map,np.uint8,stop - pos,pos)
+            starts,bad = self._frames(data,min(window,stop - pos))
+            if len(starts) == 0:
+                self.bad_frames += len(bad)
+                self.skipped += min(window,self.size - pos)
+                pos += window
+                continue
+            end = int(starts[-1]) + BIN_FRAME_SIZE
+            #Bytes after the last frame are scanned again with the next window.
+            self.bad_frames += int(np.count_nonzero(bad < end))
+            self.skipped += int(starts[0]) + int(np.sum(np.diff(starts) - BIN_FRAME_SIZE))
+            #Split into runs of back to back frames.
+            breaks = np.flatnonzero(np.diff(starts) != BIN_FRAME_SIZE) + 1
+            for run in np.split(starts,breaks):
+                self.frames += len(run)
+                yield np.ndarray(len(run),BIN_DTYPE,self._map,pos + int(run[0]))
+            pos += end
+
+    def _frames(self,data,limit):
+        '''Find the frames starting in data[:limit].
+        @return -- (starts,bad), the offsets in data of the frames, sorted
+            and not overlapping, and of the headers that failed their
+            checksum.
+        '''
+        n = len(data) - BIN_FRAME_SIZE + 1 #Candidates must fit a whole frame.
+        n = min(n,limit)
+        if n <= 0:
+            return np.empty(0,np.int64),np.empty(0,np.int64)
+        match = (data[:n] == HEADER[0]) & (data[1:n + 1] == HEADER[1]) & \
+                (data[2:n + 2] == HEADER[2]) & (data[3:n + 3] == HEADER[3]) & \
+                ((data[4:n + 4] == ord('L')) | (data[4:n + 4] == ord('D'))) & \
+                (data[5:n + 5] == ord('B'))
+        candidates = np.flatnonzero(match)
+        if len(candidates) == 0:
+            return candidates,candidates
+        #Every byte of a frame, checksum included, sums to zero. Frame sums
+        #come from one running sum, which only needs to be right mod 256.
+        total = np.zeros(len(data) + 1,np.uint32)
+        np.cumsum(data,dtype=np.uint32,out=total[1:])
+        ok = (total[candidates + BIN_FRAME_SIZE] - total[candidates]) & 0xFF == 0
+        bad = candidates[~ok]
+        starts = candidates[ok]
+        if len(starts) > 1 and np.any(np.diff(starts) < BIN_FRAME_SIZE):
+            #A header pattern inside a frame that happened to check out.
+            keep = [starts[0]]
+            for start in starts[1:]:
+                if start - keep[-1] >= BIN_FRAME_SIZE:
+                    keep.append(start)
+            starts = np.array(keep)
+        return starts,bad
+
+    def read(self):
+        '''Read every frame into memory.
+        @return -- one BIN_DTYPE array, a copy.
+        '''
+        blocks = list(self.blocks())
+        if not blocks:
+            return np.empty(0,BIN_DTYPE)
+        return np.concatenate(blocks)
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass #Views are still alive, the map closes with them.
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def __iter__(self):
+        return self.blocks()
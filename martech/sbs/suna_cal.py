@@ -0,0 +1,202 @@
+'''Nitrate from raw SUNA V2 spectra, using the instrument's calibration file.
+
+A .CAL file (see SUNA.transfer_calfile) holds H, header lines, including the
+calibration temperature and the fit window, and one E, line per pixel:
+wavelength, nitrate extinction (E_no3), seawater extinction (E_swa), any
+further coefficients and the reference (DI water) spectrum. Calibration
+loads it once into arrays over the fit window.
+
+Nitrate is found the way the SUNA does (the TCSS method, Sakamoto et al.
+2009): absorbance is taken against the reference, the seawater extinction is
+corrected from the calibration temperature to the in situ temperature and
+scaled by salinity, and what is left is fitted as E_no3*nitrate plus a
+linear baseline. The design matrix is the same for every frame, so its
+pseudo-inverse is computed once and a whole block of frames is solved with
+one matrix product.
+
+    cal = Calibration.load('SNA1234A.CAL')
+    with BinFile('D2026290.BIN') as data:
+        for frames in data:
+            fit = cal.nitrate(frames)
+    print(cal.compare(frames))
+
+Requires NumPy.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import collections
+import numpy as np
+import re
+
+#Temperature dependence of the seawater extinction, Sakamoto et al. 2009.
+SWA_A = 1.1500276
+SWA_B = 0.02840
+SWA_C = -0.3101349
+SWA_D = 0.001222
+
+FIT_WINDOW = (217.0,240.0) #nm, when the file does not give one.
+
+#Per frame results, arrays in micromoles per litre and absorbance.
+Fit = collections.namedtuple('Fit',['nitrate','baseline','slope','rmse'])
+
+RESULT_DTYPE = np.dtype([('timestamp','f8'),('nitrate','f4'),
+                         ('instrument','f4'),('rmse','f4')])
+
+def swa_factor(temperature,wavelengths):
+    '''@return -- the relative seawater extinction at each temperature
+        (rows) and wavelength (columns).'''
+    t = np.asarray(temperature,dtype=np.float64).reshape(-1,1)
+    return (SWA_A + SWA_B*t)*np.exp((SWA_C + SWA_D*t)*(wavelengths - 210.0))
+
+def light_frames(frames):
+    '''@return -- a boolean array, True for light frames, for both ASCII
+        (suna_frames) and binary (suna_bin) frames.'''
+    if 'dark' in frames.dtype.names:
+        return ~frames['dark']
+    from martech.sbs.suna_bin import is_dark
+    return ~is_dark(frames)
+
+class Calibration():
+    def __init__(self,wavelengths,e_no3,e_swa,reference,t_cal=None,
+                 window=FIT_WINDOW):
+        '''@param wavelengths,e_no3,e_swa,reference -- one value per pixel.
+        @param t_cal -- the temperature E_swa was measured at. Without it
+            no temperature correction is made.
+        @param window -- the (lower,upper) wavelengths fitted, in nm.
+        '''
+        self.wavelengths = np.asarray(wavelengths,dtype=np.float64)
+        self.e_no3 = np.asarray(e_no3,dtype=np.float64)
+        self.e_swa = np.asarray(e_swa,dtype=np.float64)
+        self.reference = np.asarray(reference,dtype=np.float64)
+        self.t_cal = t_cal
+        self.window = window
+        #Only the fit window is ever used.
+        self.pixels = np.flatnonzero((self.wavelengths >= window[0]) &
+                                     (self.wavelengths <= window[1]))
+        if len(self.pixels) < 4:
+            raise ValueError('Fewer than 4 pixels between {} and {} nm.'.format(*window))
+        self._wl = self.wavelengths[self.pixels]
+        self._no3 = self.e_no3[self.pixels]
+        self._swa = self.e_swa[self.pixels]
+        self._log_reference = np.log10(self.reference[self.pixels])
+        self._swa_cal = None
+        if t_cal is not None:
+            self._swa_cal = swa_factor(t_cal,self._wl)[0]
+        design = np.column_stack((self._no3,np.ones_like(self._wl),self._wl))
+        self._design = design
+        self._solve = np.linalg.pinv(design) #(3,pixels)
+
+    @classmethod
+    def load(cls,path):
+        '''Read a SUNA .CAL file.'''
+        with open(path,'rb') as f:
+            return cls.parse(f.read())
+
+    @classmethod
+    def parse(cls,text):
+        '''@param text -- the contents of a .CAL file, as bytes.'''
+        if isinstance(text,bytes):
+            text = text.decode('latin-1')
+        headers = []
+        rows = []
+        for line in text.splitlines():
+            if line.startswith('H,'):
+                headers.append(line[2:])
+            elif line.startswith('E,'):
+                rows.append([float(v) for v in line[2:].split(',')])
+        if not rows:
+            raise ValueError('No E, lines in the calibration file.')
+        header = '\n'.join(headers)
+        t_cal = cls._header(r'T_CAL_SWA\s+([-\d.]+)',header)
+        if t_cal is None:
+            t_cal = cls._header(r'T_CAL\s+([-\d.]+)',header)
+        lower = cls._header(r'Lower wavelength limit for spectra fit\s+([\d.]+)',header)
+        upper = cls._header(r'Upper wavelength limit for spectra fit\s+([\d.]+)',header)
+        window = (lower or FIT_WINDOW[0],upper or FIT_WINDOW[1])
+        table = np.array(rows)
+        return cls(table[:,0],table[:,1],table[:,2],table[:,-1],t_cal,window)
+
+    @staticmethod
+    def _header(pattern,header):
+        match = re.search(pattern,header)
+        return float(match.group(1)) if match else None
+
+    def solve(self,spectra,dark,temperature=None,salinity=0.0):
+        '''Fit nitrate to a block of raw spectra.
+        @param spectra -- (frames,pixels) counts, not dark corrected.
+        @param dark -- the dark counts, per frame or one value.
+        @param temperature -- in situ temperature, per frame or one value.
+        @param salinity -- per frame or one value.
+        @return -- a Fit. Frames with a pixel at or below dark in the fit
+            window get NaN.
+        '''
+        counts = np.asarray(spectra)[:,self.pixels].astype(np.float64)
+        counts -= np.asarray(dark,dtype=np.float64).reshape(-1,1)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            absorbance = self._log_reference - np.log10(counts)
+        absorbance[~(counts > 0)] = np.nan
+        salinity = np.asarray(salinity,dtype=np.float64).reshape(-1,1)
+        if self._swa_cal is not None and temperature is not None:
+            swa = self._swa*swa_factor(temperature,self._wl)/self._swa_cal
+        else:
+            swa = self._swa
+        absorbance -= swa*salinity
+        coefficients = absorbance @ self._solve.T #NaN rows stay NaN.
+        residual = absorbance - coefficients @ self._design.T
+        rmse = np.sqrt(np.mean(residual**2,axis=1))
+        return Fit(coefficients[:,0],coefficients[:,1],coefficients[:,2],rmse)
+
+    def nitrate(self,frames,temperature=None,salinity=None):
+        '''Fit nitrate to decoded frames, ASCII or binary.
+        @param temperature,salinity -- per frame or one value. Default to
+            the frames' CTD fields, which are zero without a CTD attached.
+        @return -- a Fit, NaN for dark frames.
+        '''
+        if temperature is None:
+            temperature = frames['ctd_temperature']
+        if salinity is None:
+            salinity = frames['ctd_salinity']
+        fit = self.solve(frames['spectrum'],frames['dark_value'],temperature,salinity)
+        dark = ~light_frames(frames)
+        for values in fit:
+            values[dark] = np.nan
+        return fit
+
+    def compare(self,frames,temperature=None,salinity=None):
+        '''Check the fit against the instrument's own nitrate column.
+        @return -- a dict of the light frames compared and the bias, RMS
+            and largest difference, in micromoles per litre.
+        '''
+        fit = self.nitrate(frames,temperature,salinity)
+        difference = fit.nitrate - frames['nitrate']
+        difference = difference[np.isfinite(difference)]
+        if len(difference) == 0:
+            return {'frames':0,'bias':np.nan,'rms':np.nan,'max':np.nan}
+        return {'frames':len(difference),
+                'bias':float(np.mean(difference)),
+                'rms':float(np.sqrt(np.mean(difference**2))),
+                'max':float(np.max(np.abs(difference)))}
+
+    def reprocess(self,path,temperature=None,salinity=None):
+        '''Recompute nitrate for every light frame of a .BIN data file,
+        block by block so the file never has to fit in memory.
+        @return -- a RESULT_DTYPE array, with the instrument's nitrate
+            alongside.
+        '''
+        from martech.sbs.suna_bin import BinFile
+        from martech.sbs.suna_frames import sensor_time
+        results = []
+        with BinFile(path) as data:
+            for frames in data:
+                frames = frames[light_frames(frames)]
+                fit = self.nitrate(frames,temperature,salinity)
+                result = np.empty(len(frames),RESULT_DTYPE)
+                result['timestamp'] = sensor_time(frames['date'],frames['hours'])
+                result['nitrate'] = fit.nitrate
+                result['instrument'] = frames['nitrate']
+                result['rmse'] = fit.rmse
+                results.append(result)
+        if not results:
+            return np.empty(0,RESULT_DTYPE)
+        return np.concatenate(results)
@@ -0,0 +1,165 @@
+'''Vectorized decoding of SUNA V2 full ASCII frames into NumPy arrays.
+
+A full frame is SATSLF (light) or SATSDF (dark) plus the serial number,
+then the date (YYYYDDD), decimal hours, nitrate and nitrogen, the two
+absorbances, bromide trace, spectrum average, dark value and integration
+factor, the 256 spectrometer channels, 18 housekeeping fields and a
+checksum. A batch of frames is parsed with a single numpy.fromstring call
+into a structured array, with the spectrum as a (frames,256) uint16 block.
+
+    frames = FrameArray()
+    for batch in suna.stream(seconds=600):
+        frames.append(batch)
+    print(frames.data['nitrate'].mean())
+
+Requires NumPy.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import numpy as np
+import warnings
+
+CHANNELS = 256
+
+#The fields after the header, date and time, in frame order.
+MEASUREMENTS = ('nitrate','nitrogen','abs254','abs350','bromide',
+                'spectrum_average','dark_value','integration_factor')
+HOUSEKEEPING = ('temp_internal','temp_spectrometer','temp_lamp','lamp_time',
+                'humidity','voltage_main','voltage_lamp','voltage_internal',
+                'current_main','fit_aux1','fit_aux2','fit_base1','fit_base2',
+                'fit_rmse','ctd_time','ctd_salinity','ctd_temperature',
+                'ctd_pressure')
+
+#Header, date, time, measurements, channels, housekeeping and checksum.
+FIELDS = 3 + len(MEASUREMENTS) + CHANNELS + len(HOUSEKEEPING) + 1
+
+FRAME_DTYPE = np.dtype(
+    [('timestamp','f8'), #Sensor time, seconds since the epoch.
+     ('received','f8'), #Host time the frame arrived, or NaN.
+     ('dark','?'),
+     ('checksum_ok','?')] +
+    [(name,'f4') for name in MEASUREMENTS] +
+    [('spectrum','u2',(CHANNELS,))] +
+    [(name,'f4') for name in HOUSEKEEPING])
+
+def is_frame(line):
+    return line[:5] == b'SATSL' or line[:5] == b'SATSD'
+
+def sensor_time(date,hours):
+    '''Convert the frame date (YYYYDDD) and decimal hours to seconds since
+    the epoch.
+    @param date -- an integer array.
+    @param hours -- a float array.
+    '''
+    date = np.asarray(date,dtype=np.int64)
+    days = (date//1000 - 1970).astype('datetime64[Y]').astype('datetime64[D]') + \
+           (date % 1000 - 1).astype('timedelta64[D]')
+    return days.astype(np.int64)*86400.0 + np.asarray(hours,dtype=np.float64)*3600.0
+
+def _numbers(text,count):
+    '''Parse comma separated numbers.
+    @return -- a float64 array, or None unless there are exactly count.'''
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        try:
+            numbers = np.fromstring(text,dtype=np.float64,sep=',')
+        except (ValueError,DeprecationWarning):
+            return None
+    return numbers if len(numbers) == count else None
+
+def _valid(line):
+    return _numbers(line[line.index(b',') + 1:],FIELDS - 1) is not None
+
+def decode(lines,received=None,out=None):
+    '''Decode a batch of full ASCII frames.
+    @param lines -- a list of frames as bytes. Lines that are not frames
+        or have the wrong number of fields are skipped.
+    @param received -- optional host arrival times, one per line.
+    @param out -- an optional preallocated FRAME_DTYPE array to decode into.
+        It must be at least as long as lines.
+    @return -- the decoded frames, a view into out if given.
+    '''
+    keep = []
+    stamps = []
+    for i,line in enumerate(lines):
+        line = line.rstrip(b'\r\n')
+        if is_frame(line) and line.count(b',') == FIELDS - 1:
+            keep.append(line)
+            if received is not None:
+                stamps.append(received[i])
+    bodies = [line.rpartition(b',')[0] for line in keep]
+    #Everything after the header, every frame back to back, then the
+    #checksums.
+    text = b','.join(b[b.index(b',') + 1:] for b in bodies) + b',' + \
+           b','.join(line.rpartition(b',')[2] for line in keep)
+    numbers = _numbers(text,len(keep)*(FIELDS - 1)) if keep else None
+    if keep and numbers is None:
+        #A garbled field somewhere. Drop the frames that hold one.
+        good = [i for i,line in enumerate(keep) if _valid(line)]
+        return decode([keep[i] for i in good],
+                      [stamps[i] for i in good] if received is not None else None,out)
+    n = len(keep)
+    if out is None:
+        out = np.empty(n,FRAME_DTYPE)
+    frames = out[:n]
+    if n == 0:
+        return frames
+    values = numbers[:n*(FIELDS - 2)].reshape(n,FIELDS - 2)
+    checksums = numbers[n*(FIELDS - 2):]
+    frames['timestamp'] = sensor_time(values[:,0],values[:,1])
+    frames['received'] = stamps if received is not None else np.nan
+    frames['dark'] = [line[4:6] == b'DF' for line in keep]
+    column = 2
+    for name in MEASUREMENTS:
+        frames[name] = values[:,column]
+        column += 1
+    frames['spectrum'] = values[:,column:column + CHANNELS]
+    column += CHANNELS
+    for name in HOUSEKEEPING:
+        frames[name] = values[:,column]
+        column += 1
+    #The checksum is the byte sum of everything before its comma.
+    raw = np.frombuffer(b''.join(bodies),np.uint8)
+    starts = np.cumsum([0] + [len(b) for b in bodies[:-1]])
+    sums = np.add.reduceat(raw,starts,dtype=np.uint64) & 0xFF
+    frames['checksum_ok'] = sums == checksums
+    return frames
+
+class FrameArray():
+    def __init__(self,capacity=4096):
+        '''A preallocated, growable FRAME_DTYPE array.
+        @param capacity -- frames allocated up front. A day of 1 Hz frames
+            is 86400.
+        '''
+        self._data = np.empty(capacity,FRAME_DTYPE)
+        self.count = 0
+
+    @property
+    def data(self):
+        '''The frames so far, as a view.'''
+        return self._data[:self.count]
+
+    def extend(self,lines,received=None):
+        '''Decode frames straight into the array.
+        @return -- the view of the newly decoded frames.
+        '''
+        self._reserve(len(lines))
+        frames = decode(lines,received,self._data[self.count:])
+        self.count += len(frames)
+        return frames
+
+    def append(self,frames):
+        '''Copy already decoded frames in.'''
+        self._reserve(len(frames))
+        self._data[self.count:self.count + len(frames)] = frames
+        self.count += len(frames)
+
+    def _reserve(self,n):
+        if self.count + n > len(self._data):
+            grown = np.empty(max(2*len(self._data),self.count + n),FRAME_DTYPE)
+            grown[:self.count] = self._data[:self.count]
+            self._data = grown
+
+    def __len__(self):
+        return self.count
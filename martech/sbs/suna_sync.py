@@ -0,0 +1,57 @@
+'''The local manifest behind SUNA.sync_datafiles.
+
+The manifest records every SUNA data file a sync has seen, with the size and
+creation date from list_datafiles and whether the local copy is complete. A
+file is transferred again only if it is new, has grown or been replaced on
+the SUNA, failed last time, or its local copy is missing or the wrong size.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import datetime
+from martech.helpers import load_json,save_json
+import os
+
+MANIFEST = 'suna_manifest.json'
+
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+class DataManifest():
+    def __init__(self,directory):
+        self.directory = directory
+        self.path = os.path.join(directory,MANIFEST)
+        self.files = load_json(self.path,{})
+
+    def local_path(self,filename):
+        return os.path.join(self.directory,filename)
+
+    def needs_transfer(self,filename,date,size):
+        '''@return -- the reason the file needs transferring, or None.'''
+        entry = self.files.get(filename)
+        if entry is None:
+            return 'new'
+        if entry['status'] != COMPLETE:
+            return 'failed'
+        if entry['date'] != date:
+            return 'replaced'
+        if int(size) != entry['size']:
+            return 'grown'
+        try:
+            local = os.path.getsize(self.local_path(filename))
+        except OSError:
+            return 'missing'
+        if local != entry['size']:
+            return 'wrong size'
+        return None
+
+    def update(self,filename,date,size,status):
+        self.files[filename] = {
+            'date': date,
+            'size': int(size),
+            'status': status,
+            'updated': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            }
+
+    def save(self):
+        save_json(self.path,self.files,indent=1,sort_keys=True)
@@ -1,18 +1,50 @@
 ''' A module for communicated with the SBS Thetis Profiler and its peripherals
 over RS232.
 
-Author(s): Ian Black
+Author(s): Ian Black, agent
 
 2020-12-25: Initial commit.
 2021-01-24: Updated to use sercom module.
+2026-10-17: Single reply commands return as soon as the PWETA sentence ends.
+            Commands and replies go through the pwet codec, so every command
+            carries a correct checksum and replies are parsed without regex.
+            Controller settings are cached from replies, so setters that would
+            not change anything return without serial traffic.
+            File offloads stream to disk and are paced by the ACKs.
+            Added the cached filesystem view, THETIS.fs.
+            Bulk deletes are pipelined and checked, and remove_tree clears
+            and removes a directory.
+            winch_session powers the winch once for a block of WC commands
+            and waits for it to answer rather than sleeping 5 s.
+            Mode changes wait for the prompt or acknowledgement, up to the
+            deadlines, and are recorded in THETIS.transitions.
+            Added start_telemetry for continuous depth and pressure switch
+            polling.
+            Battery statuses are queried together into typed records, with
+            an optional columnar history.
 '''
 
+import collections
+import contextlib
 import datetime
-from martech.sercom import SERCOM
+from martech.sercom import SERCOM,PWETA_REPLY
+from martech.sbs import pwet,thetis_battery,thetis_fs,thetis_offload,thetis_telemetry
 import os
-import re
 import time 
 
+#Settings kept in the state cache, by command.
+CACHED = ('BD','PKD','HLD','NUM','RD','GGF','GPSP','BLV','SCS','WHS','BUF',
+          'ATMP','STA','SLSF','DO')
+
+#Seconds each mode change may take before it is reported as failed.
+DEADLINES = {'host2pico':10.0,'pico2host':15.0,'sensors_power':10.0,
+             'logging':5.0,'passthru':1.0}
+
+#One timed mode change. firmware is None until get_version or pico2host
+#has read it.
+Transition = collections.namedtuple('Transition',
+    ['name','state','firmware','elapsed','ok'])
+
 class THETIS():
     def __init__(self,port):
         self.rs232 = SERCOM()
@@ -30,7 +62,23 @@ class THETIS():
         self.winch_flag = 0
         self.insp_flag = 0
         self.pump_flag = 0
-        
+
+        #Controller settings from the latest replies, by (listener,command).
+        self.state = {}
+        self._fs = None
+        self.telemetry = None
+
+        #Seconds to wait for the winch to answer after power up.
+        self.winch_timeout = 30.0
+
+        #Mode change deadlines and timing records. on_transition, if set,
+        #is called with each Transition as it is recorded.
+        self.deadlines = dict(DEADLINES)
+        self.transitions = collections.deque(maxlen=1000)
+        self.on_transition = None
+        self.firmware = None
+        self.profiler_id = None
+
         #If file sizes are below these values, then there is no data in them.
         self.SNA_header_len = 75
         self.SND_header_len = 10
@@ -42,15 +90,45 @@ class THETIS():
         
     def open_connection(self,baudrate=115200):
         self.baudrate = baudrate        
+        self.invalidate()
+        if self._fs is not None:
+            self._fs.invalidate()
         connected = self.rs232.connect(self.port,self.baudrate,
                                        self.bytesize,self.parity,self.stopbits,
                                        self.flowcontrol,self.timeout)
         return connected      
     
     def close_connection(self):
+        self.stop_telemetry()
+        self.invalidate()
         disconnected = self.rs232.disconnect()
         return disconnected    
 
+    @property
+    def fs(self):
+        '''The cached filesystem view, see martech.sbs.thetis_fs.'''
+        if self._fs is None:
+            self._fs = thetis_fs.ProfilerFS(self)
+        return self._fs
+
+    def start_telemetry(self,rate=4.0,psw_every=4,size=10000):
+        '''Power the CTD once and poll depth and the pressure switch in the
+        background, see martech.sbs.thetis_telemetry. Until
+        stop_telemetry, get_ctd_depth and get_psw_state answer from the
+        latest sample and no other commands should be sent.
+        @param rate -- polls per second.
+        @return -- the running Telemetry.
+        '''
+        self.stop_telemetry()
+        self.telemetry = thetis_telemetry.Telemetry(self,rate,psw_every,size)
+        self.telemetry.start()
+        return self.telemetry
+
+    def stop_telemetry(self):
+        if self.telemetry is not None:
+            self.telemetry.stop()
+            self.telemetry = None
+
     def set_datetime(self,tzo=0):
         now = datetime.datetime.now(datetime.timezone.utc)
         now = now.replace(microsecond=0)
@@ -58,13 +136,9 @@ class THETIS():
         d = datetime.datetime.strftime(now,'%m/%d/%Y') 
         t = datetime.datetime.strftime(now,'%H:%M:%S')
         tzo = int(tzo)
-        self.rs232.write_command('$PWETC,PC,,,,DATE,3,{},{},{}*'.format(d,t,tzo))
-        response = self.rs232.read_response()
-        dpattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,(.*?),.*?,.*?\*'
-        d = re.findall(dpattern,response).pop()
-        tpattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,.*?,(.*?),.*?\*'
-        t = re.findall(tpattern,response).pop()
-        dt_pro = d + 'T' + t
+        self._send('DATE',d,t,tzo)
+        reply = self._reply()
+        dt_pro = reply.args[0] + 'T' + reply.args[1]
         dt_pro = datetime.datetime.strptime(dt_pro,'%m/%d/%YT%H:%M:%S')
         dt_pro_str = datetime.datetime.strftime(dt_pro,'%Y%m%d%H%M%S')
         if dt_pro_str == now_str:
@@ -76,24 +150,25 @@ class THETIS():
 
     def get_version(self):
         info = {}
-        self.rs232.write_command('$PWETC,PC,,,,VER*0F',EOL='\n')
-        response = self.rs232.read_response()
-        pattern = '\$PWETA,.*?,.*?,.*?,(.*?)\*'
-        data = re.findall(pattern,response).pop()
-        data = data.split(',')
-        info['profiler_id'] = data[0]
-        info['cf_sn'] = data[3]
-        info['pico'] = data[4]
-        info['bios'] = data[5]
-        info['firmware'] = data[6]
-        info['firmware_date'] = data[7]
+        self._send('VER',EOL='\n')
+        reply = self._reply()
+        info['profiler_id'] = reply.ident
+        info['cf_sn'] = reply.args[0]
+        info['pico'] = reply.args[1]
+        info['bios'] = reply.args[2]
+        info['firmware'] = reply.args[3]
+        info['firmware_date'] = reply.args[4]
+        self.firmware = info['firmware']
+        self.profiler_id = info['profiler_id']
         return info
 
     def change_to_root_directory(self,listener='PC'):
         while True:
-            self.rs232.write_command('$PWETC,{},,,,CD,1,..*'.format(listener))
-            response = self.rs232.read_response()            
-            if 'CD,1,*' in response:
+            self._send('CD','..',listener=listener)
+            reply = self._reply()
+            if reply.command == 'CD' and reply.args == ('',):
+                if self._fs is not None:
+                    self._fs.moved(listener,'\\')
                 return True
             else:
                 time.sleep(1)
@@ -103,13 +178,15 @@ class THETIS():
         if len(str(directory_id)) > 8:
             print('Subdirectories must be 8 alphanumeric characters or less.')
             return False
-        self.rs232.write_command('$PWETC,{},,,,MKD,1,.\{}*'.format(listener,directory_id))
-        response = self.rs232.read_response()
-        if 'MKD*' in response:
+        self._send('MKD','.\\{}'.format(directory_id),listener=listener)
+        reply = self._reply()
+        if self._fs is not None:
+            self._fs.changed(listener)
+        if reply.command == 'MKD':
             msg='New directory located at {}/{}.'.format(listener,directory_id)
             print(msg)
             return True
-        elif 'NAK,2,MKD' in response:
+        elif reply.nak and reply.args[:1] == ('MKD',):
             msg = 'Directory already exists!'
             print(msg)
             return True
@@ -117,36 +194,105 @@ class THETIS():
             return False
 
     def change_directory(self,directory_id,listener='PC'):
-        self.rs232.write_command('$PWETC,{},,,,CD,1,.\{}*'.format(listener,directory_id))
-        time.sleep(0.5)
-        response = self.rs232.read_response()
-        if 'CD,1,\{}*'.format(directory_id) in response or 'CD,1,*' in response:
+        self._send('CD','.\\{}'.format(directory_id),listener=listener)
+        reply = self._reply()
+        if reply.command == 'CD' and reply.args[:1] in (('\\{}'.format(directory_id),),('',)):
             msg = 'Working Directory: {}/{}.'.format(listener,directory_id)       
+            if self._fs is not None:
+                self._fs.moved(listener,directory_id)
             return directory_id, msg
-        elif 'NAK,2,CD,C' in response:
+        elif reply.nak and reply.args[:2] == ('CD','C'):
             print('No subdirectory found.')
             return False
         else:
             return False    
 
-    def set_winch_power(self,state):
+    def set_winch_power(self,state,timeout=None):
+        '''The WP reply only says the power is switched. Powering on then
+        polls the winch controller with PWD until it answers.
+        @param timeout -- seconds to wait for the winch to power up and
+            answer. Defaults to winch_timeout.
+        @return -- True if the winch reported the requested state.
+        '''
         if state == 'ON':
-            self.rs232.write_command('$PWETC,PC,,,,WP,1,1*',EOL = '\n')
+            self._send('WP',1,EOL='\n')
+            if timeout is None:
+                timeout = self.winch_timeout
         elif state == 'OFF':
-            self.rs232.write_command('$PWETC,PC,,,,WP,1,0,*',EOL = '\n')
-        response = self.rs232.read_response()
-        if "ON" in response:
+            self._send('WP',0,EOL='\n')
+        if timeout is None:
+            timeout = self.rs232.sercom.timeout or 1
+        deadline = time.monotonic() + timeout
+        reply = self._await('WP',deadline)
+        if state == 'OFF' and 'ON' in reply.args:
+            reply = self._await('WP',deadline) #A late answer to an earlier power up.
+        self.invalidate('WC') #The winch controller restarts.
+        if 'ON' in reply.args:
+            if state != 'ON':
+                return False
+            if not self._winch_ready(deadline):
+                print('Winch did not answer!')
+                return False
             print('Winch is now on!')
-            time.sleep(5)
-        elif "OFF" in response:
+            return True
+        elif 'OFF' in reply.args:
             print('Winch is now off!')    
+            return state == 'OFF'
+        return False
+
+    def _winch_ready(self,deadline):
+        '''Poll the winch controller until it answers or the deadline passes.'''
+        while time.monotonic() < deadline:
+            self._send('PWD',listener='WC')
+            reply = self._await('PWD',deadline)
+            if reply.command and not reply.nak:
+                return True
+            time.sleep(min(0.25,max(0,deadline - time.monotonic())))
+        return False
+
+    @contextlib.contextmanager
+    def winch_session(self,timeout=None):
+        '''Power the winch once for a block of winch controller commands.
+
+            with thetis.winch_session():
+                thetis.set_sta(0.7)
+                thetis.set_slsf(1.45)
+                thetis.set_depth_offset(0.6)
+
+        The winch is powered down when the block ends, unless it was
+        already on. Sessions can be nested.
+        @param timeout -- seconds to wait for the winch to power up.
+        '''
+        owner = self.winch_flag != 1
+        if owner and not self.set_winch_power('ON',timeout):
+            self.set_winch_power('OFF')
+            raise TimeoutError('The winch did not power up.')
+        try:
+            yield self
+        finally:
+            if owner:
+                self.set_winch_power('OFF')
+
+    def _winch_command(self,command,*args):
+        '''Send a WC command, powering the winch for it if it is off.
+        Inside a winch_session this is a single round trip.
+        '''
+        self._send(command,*args,listener='WC')
+        reply = self._reply()
+        if self._winch_off(reply):
+            self.winch_flag = 0
+            with self.winch_session():
+                self._send(command,*args,listener='WC')
+                reply = self._reply()
+        return reply
 
     def set_breakaway_depth(self,value=0.70):
         value = float(value)
-        self.rs232.write_command('$PWETC,PC,,,,BD,1,{}*'.format(value))       
-        response = self.rs232.read_response()
-        pattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,(.*?)\*'
-        returned_val = float(re.findall(pattern,response).pop())
+        if self.holds('BD',value):
+            return True,"BD Set: PASS | Value = {}".format(value)
+        self._send('BD',value)
+        reply = self._reply()
+        returned_val = float(reply.args[0])
         if returned_val == value:
             msg = "BD Set: PASS | Value = {}".format(value)
             return True,msg
@@ -155,10 +301,11 @@ class THETIS():
             return False,msg        
         
     def turn_off_wave_height_estimator(self):
-        self.rs232.write_command('$PWETC,PC,,,,WHS,1,0*03')
-        response = self.rs232.read_response()
-        pattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,(.*?),.*?,.*?,.*?\*'
-        state = int(re.findall(pattern,response).pop())
+        if self.holds('WHS',0):
+            return True,"WHE OFF: PASS"
+        self._send('WHS',0)
+        reply = self._reply()
+        state = int(reply.args[0])
         if state == 0:
             msg = "WHE OFF: PASS"
             return True,msg
@@ -167,13 +314,13 @@ class THETIS():
             return False,msg
 
     def set_hld(self,mode=1):
-        if int(mode) == 1:
-            self.rs232.write_command('$PWETC,PC,,,,HLD,1,1*0E')
-        elif int(mode) == 0:
-            self.rs232.write_command('$PWETC,PC,,,,HLD,1,0*0F')
-        response = self.rs232.read_response()
-        pattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,(.*?)\*'
-        val = int(re.findall(pattern,response).pop())
+        mode = int(mode)
+        if self.holds('HLD',mode):
+            return True,"HLD Set: PASS | Value = {}".format(mode)
+        if mode in (0,1):
+            self._send('HLD',mode)
+        reply = self._reply()
+        val = int(reply.args[0])
         if val == mode:
             msg = "HLD Set: PASS | Value = {}".format(mode)
             return True,msg
@@ -183,10 +330,11 @@ class THETIS():
     
     def set_parking_depth(self,value):
         value = float(value)
-        self.rs232.write_command('$PWETC,PC,,,,PKD,1,{}*'.format(value))
-        response = self.rs232.read_response()
-        pattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,(.*?)\*'
-        returned_val = float(re.findall(pattern,response).pop())
+        if self.holds('PKD',value):
+            return True,"PKD Set: PASS | Value = {}".format(value)
+        self._send('PKD',value)
+        reply = self._reply()
+        returned_val = float(reply.args[0])
         if returned_val == value:
             msg = "PKD Set: PASS | Value = {}".format(value)
             return True,msg
@@ -195,17 +343,10 @@ class THETIS():
             return False,msg    
     
     def set_sta(self,value=0.7):
-        self.rs232.write_command('$PWETC,WC,,,,STA,1,{}*'.format(value))
-        response = self.rs232.read_response()
-        pattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,(.*?)\*'
-        if 'WC OFF' in response:
-            self.set_winch_power("ON")
-            self.rs232.write_command('$PWETC,WC,,,,STA,1,{}*'.format(value))
-            response = self.rs232.read_response()
-            amps = float(re.findall(pattern,response).pop())
-            self.set_winch_power("OFF")
-        else:
-            amps = float(re.findall(pattern,response).pop())
+        if self.holds('STA',value,listener='WC'):
+            return True,"STA Set: PASS | Value = {}".format(value)
+        reply = self._winch_command('STA',value)
+        amps = float(reply.args[0])
         if amps < value - 0.01:
             msg = "STA Set: FAIL"
             return False,msg
@@ -215,10 +356,11 @@ class THETIS():
 
     def set_profile_number(self,value=0):
         value = int(value)
-        self.rs232.write_command('$PWETC,PC,,,,num,1,{}*'.format(int(value)))
-        response = self.rs232.read_response()
-        pattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,(.*?)\*'
-        returned_val = int(re.findall(pattern,response).pop())
+        if self.holds('num',value):
+            return True,"NUM Set: PASS | Value = {}".format(value)
+        self._send('num',value)
+        reply = self._reply()
+        returned_val = int(reply.args[0])
         if returned_val == value:
             msg = "NUM Set: PASS | Value = {}".format(value)
             return True,msg
@@ -228,13 +370,12 @@ class THETIS():
 
     def set_scooch(self,interval=250,max_delta=5000,travel=150000,
                             min_delta=2500):
-        self.rs232.write_command('$PWETC,PC,,,,SCS,4,{},{},{},{}*'.format(interval,
-                           max_delta,travel,min_delta))
-        response = self.rs232.read_response()
-        pattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,(.*?)\*'
-        settings = re.findall(pattern,response).pop()
-        pro_set = settings.split(',')
-        pro_set = list(map(float,pro_set))
+        if self.holds('SCS',interval,max_delta,travel,min_delta):
+            msg = "SCS Set: PASS | Value = {},{},{},{}".format(interval,max_delta,travel,min_delta)
+            return True,msg
+        self._send('SCS',interval,max_delta,travel,min_delta)
+        reply = self._reply()
+        pro_set = list(map(float,reply.args))
         user_set = [interval,max_delta,travel,min_delta]
         user_set = list(map(float,user_set))        
         if pro_set == user_set:
@@ -247,17 +388,10 @@ class THETIS():
     def set_slsf(self,value=1.45):
         value = float(value)
         self.slsf = value
-        self.rs232.write_command('$PWETC,WC,,,,SLSF,1,1.45*')
-        response = self.rs232.read_response()
-        pattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,(.*?)\*'
-        if 'WC OFF' in response:
-            self.set_winch_power("ON")
-            self.rs232.write_command('$PWETC,WC,,,,SLSF,1,1.45*')
-            response = self.rs232.read_response()
-            returned_val = float(re.findall(pattern,response).pop())
-            self.set_winch_power("OFF")
-        else:
-            returned_val = float(re.findall(pattern,response).pop())
+        if self.holds('SLSF',value,listener='WC'):
+            return True,"SLSF Set: PASS | Value = {}".format(value)
+        reply = self._winch_command('SLSF',value)
+        returned_val = float(reply.args[0])
         if returned_val == value:
             msg = "SLSF Set: PASS | Value = {}".format(value)
             return True,msg
@@ -270,9 +404,11 @@ class THETIS():
         secondary = float(secondary)
         self.bt1 = primary
         self.bt2 = secondary
-        self.rs232.write_command('$PWETC,PC,,,,BLV,2,{},{}*'.format(primary,secondary))
-        response = self.rs232.read_response()
-        if str(primary) in response and str(secondary) in response:
+        if self.holds('BLV',primary,secondary):
+            return True,"BLV Set: PASS | Value = {},{}".format(primary,secondary)
+        self._send('BLV',primary,secondary)
+        reply = self._reply()
+        if str(primary) in reply.args and str(secondary) in reply.args:
             msg = "BLV Set: PASS | Value = {},{}".format(primary,secondary)
             return True,msg
         else:
@@ -281,14 +417,10 @@ class THETIS():
         
     def set_depth_offset(self,value=0.6):
         value = float(value)
-        self.rs232.write_command('$PWETC,WC,,,,DO,1,{}*'.format(value))
-        response = self.rs232.read_response()
-        if "WC OFF" in response:
-            self.set_winch_power("ON")
-            self.rs232.write_command('$PWETC,WC,,,,DO,1,{}*'.format(value))
-            response = self.rs232.read_response()
-            self.set_winch_power("OFF")            
-        if 'DO,1,{}'.format(value) in response:
+        if self.holds('DO',value,listener='WC'):
+            return True,"DO Set: PASS | Value = {}".format(value)
+        reply = self._winch_command('DO',value)
+        if reply.command == 'DO' and reply.args[:1] == (str(value),):
             msg = "DO Set: PASS | Value = {}".format(value)
             return True,msg
         else:
@@ -296,15 +428,17 @@ class THETIS():
             return False,msg
         
     def set_gps_acquistion_after_profile(self,state="OFF"):
+        if state in ("ON","OFF") and self.holds('GGF',int(state == "ON")):
+            return True,"GGF Set: PASS | Value = {}".format(state)
         if state == "OFF":
-            self.rs232.write_command('$PWETC,PC,,,,GGF,1,0*')
+            self._send('GGF',0)
         elif state == "ON":
-            self.rs232.write_command('$PWETC,PC,,,,GGF,1,1*')
-        response = self.rs232.read_response()
-        if 'GGF,1,0' in response and state == "OFF":
+            self._send('GGF',1)
+        reply = self._reply()
+        if reply.args[:1] == ('0',) and state == "OFF":
             msg = "GGF Set: PASS | Value = {}".format(state)
             return True,msg
-        elif 'GGF,1,1' in response and state == "ON":
+        elif reply.args[:1] == ('1',) and state == "ON":
             msg = "GGF Set: PASS | Value = {}".format(state)
             return True,msg
         else:
@@ -313,15 +447,17 @@ class THETIS():
 
     
     def set_gps_power(self,state="OFF"):
+        if self.holds('GPSP',state):
+            return True,"GPSP Set: PASS | Value = {}".format(state)
         if state == "OFF":
-            self.rs232.write_command('$PWETC,PC,,,,GPSP,1,0*')
+            self._send('GPSP',0)
         elif state == "ON":
-            self.rs232.write_command('$PWETC,PC,,,,GPSP,1,1*')
-        response = self.rs232.read_response()
-        if 'ON' in response and state == "ON":
+            self._send('GPSP',1)
+        reply = self._reply()
+        if 'ON' in reply.args and state == "ON":
             msg = "GPSP Set: PASS | Value = {}".format(state)
             return True,msg
-        elif 'OFF' in response and state == "OFF":
+        elif 'OFF' in reply.args and state == "OFF":
             msg = "GPSP Set: PASS | Value = {}".format(state)
             return True,msg
         else:
@@ -330,42 +466,60 @@ class THETIS():
     
     
     def get_battery_status(self,address): 
-        status = {}
-        self.rs232.write_command('$PWETC,PC,,,,BFS,1,{}*'.format(int(address)))
-        time.sleep(2)
-        response = self.rs232.read_response()
-        if "LOCKED" in response:
+        status = self.get_battery_statuses([address])[int(address)]
+        if status is None:
             print('Battery at this address does not exist.')
             return False     
-        pweta_pattern = '\$PWETA,.*?,.*?,.*?,.*?,.*?,.*?,.*?,(.*?)\*'
-        info = re.findall(pweta_pattern,response).pop()
-        info = [i for i in info.split(' ') if i]        
-        status['position'] = info[0][1:3]
-        if 'f' in info[1]:
-            status['state'] = 'OFF'
-        elif 'd' in info[1]:
-            status['state'] = 'DISCHARGING'
-        elif 'c' in info[1]:
-            status['state'] = 'CHARGING'
-        elif 'b' in info[1]:
-            status['state'] = 'BALANCING'   
-        status['voltage'] = float(info[2])
-        status['current'] = float(info[3])
-        status['temperature'] = float(info[4])
-        status['min_cell'] = float(info[5])
-        status['max_cell'] = float(info[6])
-        if info[7] == '0':
-            status['leak_detect'] = 'NO_LEAK'
-        elif info[7] == '1':
-            status['leak_detect'] = 'WATER_DETECTED'
-        return status
+        return status.as_dict()
+
+    def get_battery_statuses(self,addresses=(1,2),window=1,timeout=5.0,
+                             log=None):
+        '''Query several batteries, matching the replies by address.
+        @param addresses -- battery addresses.
+        @param window -- how many BFSs may wait for a reply at once. Only
+            raise it once the controller is known to accept pipelined
+            commands.
+        @param timeout -- seconds to wait for each reply.
+        @param log -- an optional thetis_battery.BatteryLog to append to.
+        @return -- an OrderedDict of address: thetis_battery.BatteryStatus,
+            or None for locked, missing or unreadable batteries.
+        '''
+        statuses = collections.OrderedDict((int(a),None) for a in addresses)
+        queue = collections.deque(statuses)
+        pending = set()
+        while queue or pending:
+            while queue and len(pending) < window:
+                address = queue.popleft()
+                self._send('BFS',address)
+                pending.add(address)
+            reply = self._await('BFS',time.monotonic() + timeout)
+            if not reply:
+                pending.clear() #Left as None.
+                window = 1
+                continue
+            if reply.nak or len(reply.args) < 2 or not reply.args[0].isdigit():
+                if len(pending) == 1:
+                    pending.clear() #Only one query it can answer.
+                continue
+            address = int(reply.args[0])
+            if address not in pending:
+                continue #A late reply to a query already given up on.
+            pending.discard(address)
+            if 'LOCKED' not in reply.args:
+                statuses[address] = thetis_battery.BatteryStatus.parse(
+                    address,reply.args[1])
+        if log is not None:
+            log.append(statuses.values(),self.profiler_id)
+        return statuses
             
     
     def set_radio_depth(self,value=1.0):
         value = float(value)
-        self.rs232.write_command('$PWETC,PC,,,,RD,1,{}*'.format(value))
-        response = self.rs232.read_response()
-        if 'RD,1,{}'.format(value) in response:
+        if self.holds('RD',value):
+            return True,"RD Set: PASS | Value = {}".format(value)
+        self._send('RD',value)
+        reply = self._reply()
+        if reply.command == 'RD' and reply.args[:1] == (str(value),):
             msg = "RD Set: PASS | Value = {}".format(value)
             return True,msg
         else:
@@ -373,13 +527,27 @@ class THETIS():
             return False,msg
             
         
-    def host2pico(self,via='Q'):
+    def host2pico(self,via='Q',timeout=None):
+        '''Leave the application for the PicoDOS prompt.
+        @param timeout -- seconds to wait for the prompt. Defaults to
+            deadlines['host2pico'].
+        @return -- True once PicoDOS> arrives.
+        '''
+        start = time.monotonic()
+        deadline = start + self._deadline('host2pico',timeout)
         if via == 'Q':
-            self.rs232.write_command('$PWETC,PC,,,,Q*')
+            self._send('Q')
         elif via == 'E':
-            self.rs232.write_command('$PWETC,PC,,,,EXIT')
-        time.sleep(3)    
-        self.rs232.write_command('\r',EOL='')
+            self._send('EXIT')
+        self.invalidate()
+        ok = False
+        while not ok and time.monotonic() < deadline:
+            wait = min(1.0,deadline - time.monotonic())
+            self.rs232.read_until(b'PicoDOS>',wait)
+            ok = not self.rs232.timed_out
+            if not ok:
+                self.rs232.write_command('\r',EOL='') #Ask for a fresh prompt.
+        return self._transition('host2pico',via,start,ok)
         
     
     def get_pkg_settings(self):
@@ -396,8 +564,7 @@ class THETIS():
         time.sleep(1)
         response = self.rs232.read_response()
         if 'PKG.ACSB' in response:
-            pattern = 'ACSB=(.*?)\r\n'
-            num_wavelengths = int(re.findall(pattern,response).pop())
+            num_wavelengths = int(response.split('ACSB=')[1].split('\r\n')[0])
             self.rs232.write_command('\r',EOL='')
             return num_wavelengths
         
@@ -412,129 +579,151 @@ class THETIS():
         else:
             return False
         
-    def pico2host(self):
+    def pico2host(self,timeout=None):
+        '''Start the application from PicoDOS. Once APP is echoed, VER is
+        sent until the application answers, which also records the firmware
+        version.
+        @param timeout -- seconds to wait. Defaults to deadlines['pico2host'].
+        @return -- True once the application answers.
+        '''
+        start = time.monotonic()
+        deadline = start + self._deadline('pico2host',timeout)
         self.rs232.write_command('\r',EOL='')
         self.rs232.clear_buffers()
         self.rs232.write_command('APP',EOL='\r')
-        time.sleep(3)
+        self.invalidate()
+        self.rs232.read_until(b'APP\r\n',deadline - time.monotonic())
+        ok = False
+        while not ok and time.monotonic() < deadline:
+            self._send('VER',EOL='\n')
+            reply = self._reply(min(1.0,deadline - time.monotonic()))
+            if reply.command == 'VER' and len(reply.args) > 3:
+                self.firmware = reply.args[3]
+                ok = True
         self.rs232.clear_buffers()
+        return self._transition('pico2host','APP',start,ok)
         
     def set_buf(self,value=512):
         value = int(value)
-        self.rs232.write_command('$PWETC,PC,,,,BUF,1,{}*'.format(value))
-        response = self.rs232.read_response()
-        if 'BUF,1,{}'.format(value) in response:
+        if self.holds('BUF',value):
+            return True
+        self._send('BUF',value)
+        reply = self._reply()
+        if reply.command == 'BUF' and reply.args[:1] == (str(value),):
             return True
         else:
             return False
 
     def get_memory(self,listener='PC'):
-        self.rs232.write_command('$PWETC,{},,,,FREE*'.format(listener))        
-        response = self.rs232.read_response()
-        fpattern = 'FREE,1,(.*?)\*'
-        free = (int(re.findall(fpattern,response).pop()))/1000
+        self._send('FREE',listener=listener)
+        reply = self._reply()
+        free = int(reply.args[0])/1000
         time.sleep(1)
-        self.rs232.write_command('$PWETC,{},,,,TOTAL*'.format(listener))
-        response = self.rs232.read_response()
-        tpattern =  'TOTAL,1,(.*?)\*'
-        total = (int(re.findall(tpattern,response).pop()))/1000          
+        self._send('TOTAL',listener=listener)
+        reply = self._reply()
+        total = int(reply.args[0])/1000
         used = total - free 
         return total,used,free
     
     def send_break(self):
-        self.rs232.write_command('$PWETC,PC,,,,BREAK*')
+        self._send('BREAK')
+        self.invalidate()
         time.sleep(0.05) #Wait for 50 milliseconds.
         self.rs232.clear_buffers()   
     
     def turn_off_power_to_acoustic_modem(self):
-        self.rs232.write_command('$PWETC,PC,,,,ATMP,1,0*')  
-        response = self.rs232.read_response()
-        if "OFF" in response:
+        if self.holds('ATMP','OFF'):
+            return True,"ATMP Set: PASS | Value = {}".format("OFF")
+        self._send('ATMP',0)
+        reply = self._reply()
+        if 'OFF' in reply.args:
             msg = "ATMP Set: PASS | Value = {}".format("OFF")
             return True,msg
         else:
             msg = "ATMP Set: FAIL"
             return False
 
-    def logging(self,state,listener='PC'):
+    def logging(self,state,listener='PC',timeout=None):
+        '''@param timeout -- seconds to wait for the LOG reply. Defaults to
+            deadlines['logging'].'''
+        start = time.monotonic()
+        deadline = start + self._deadline('logging',timeout)
         if state == "ON":
-            self.rs232.write_command('$PWETC,{},,,,LOG,1,1*'.format(listener))
+            self._send('LOG',1,listener=listener)
         elif state == "OFF":
-            self.rs232.write_command('$PWETC,{},,,,LOG,1,0*'.format(listener))
-        time.sleep(1)
-        response = self.rs232.read_response()
-        if 'LOG,1,1' in response and state == "ON":
-            return True
-        elif 'LOG,1,0' in response and state == "OFF":
-            return True
+            self._send('LOG',0,listener=listener)
+        reply = self._await('LOG',deadline)
+        if self._fs is not None:
+            self._fs.changed(listener) #Logging creates files.
+        if reply.args[:1] == ('1',) and state == "ON":
+            ok = True
+        elif reply.args[:1] == ('0',) and state == "OFF":
+            ok = True
         else:
-            return False
+            ok = False
+        return self._transition('logging',state,start,ok)
 
     def set_ctd_power(self,state):
         if state == "ON":
-            self.rs232.write_command('$PWETC,PC,,,,CTDP,1,1*')
-            self.ctd_flag = 1
+            self._send('CTDP',1)
         elif state == "OFF":
-            self.rs232.write_command('$PWETC,PC,,,,CTDP,1,0*')     
-            self.ctd_flag = 0
-        response = self.rs232.read_response()
-        if 'ON' in response and state == "ON":
+            self._send('CTDP',0)
+        #Skips a late reply to something else, e.g. a telemetry D.
+        reply = self._await('CTDP',time.monotonic() + (self.rs232.sercom.timeout or 1))
+        if 'ON' in reply.args and state == "ON":
             return True
-        if 'OFF' in response and state == "OFF":
+        if 'OFF' in reply.args and state == "OFF":
             return True
         else:
             return False
     
     def set_insts_power(self,state):
         if state == "ON":
-            self.rs232.write_command('$PWETC,PC,,,,INSP,1,1*')
-            self.insp_flag = 1
+            self._send('INSP',1)
         elif state == "OFF":
-            self.rs232.write_command('$PWETC,PC,,,,INSP,1,0*')       
-            self.insp_flag = 0
-        response = self.rs232.read_response()
-        if 'ON' in response and state == "ON":
+            self._send('INSP',0)
+        reply = self._reply()
+        if 'ON' in reply.args and state == "ON":
             return True
-        if 'OFF' in response and state == "OFF":
+        if 'OFF' in reply.args and state == "OFF":
             return True
         else:
             return False
     
-    def set_sensors_power(self,state):
+    def set_sensors_power(self,state,timeout=None):
+        '''Power the CTD and the instruments. Each step waits for the
+        controller's acknowledgement. Powering off is retried until both
+        acknowledge or the deadline passes.
+        @param timeout -- seconds to wait. Defaults to
+            deadlines['sensors_power'].
+        '''
+        start = time.monotonic()
+        deadline = start + self._deadline('sensors_power',timeout)
+        ctd_bool = insp_bool = False
         if state == "ON":
             ctd_bool = self.set_ctd_power("ON")
-            time.sleep(1)
             insp_bool = self.set_insts_power("ON")
         elif state == "OFF":
-            while True:
-                ctd_bool = self.set_ctd_power("OFF")
-                time.sleep(1)
-                insp_bool = self.set_insts_power("OFF")
-                time.sleep(1)
+            while time.monotonic() < deadline:
+                ctd_bool = ctd_bool or self.set_ctd_power("OFF")
+                insp_bool = insp_bool or self.set_insts_power("OFF")
                 if ctd_bool is True and insp_bool is True:
                     break
-                else:
-                    time.sleep(1)
-                    continue
-        if ctd_bool is True and insp_bool is True:
-            time.sleep(3)
-            return True
-        else:
-            return False
+                time.sleep(0.25)
+        ok = ctd_bool is True and insp_bool is True
+        return self._transition('sensors_power',state,start,ok)
         
     def set_pump_power(self,state):
         if state == 'ON':
-            self.rs232.write_command('$PWETC,PC,,,,PWR,2,PMP,1*')
-            response = self.rs232.read_response()
-            if "ON" in response and state == "ON":
-                self.pump_flag = 1
+            self._send('PWR','PMP',1)
+            reply = self._reply()
+            if 'ON' in reply.args and state == "ON":
                 return True
         elif state == 'OFF':
             while True:
-                self.rs232.write_command('$PWETC,PC,,,,PWR,2,PMP,0*')
-                response = self.rs232.read_response()
-                if "OFF" in response and state == "OFF":
-                    self.pump_flag = 0
+                self._send('PWR','PMP',0)
+                reply = self._reply()
+                if 'OFF' in reply.args and state == "OFF":
                     return True
                 else:
                     time.sleep(1)
@@ -544,54 +733,67 @@ class THETIS():
             
         
     def get_ctd_depth(self):
+        if self.telemetry is not None:
+            sample = self.telemetry.latest()
+            return None if sample is None else sample.depth
         if self.ctd_flag == 0:
             self.set_ctd_power("ON")
-            self.rs232.write_command('$PWETC,PC,,,,D*')
-            response = self.rs232.read_response()
-            pattern = 'D,1,(.*?)\*'
-            depth = float(re.findall(pattern,response).pop())
+            self._send('D')
+            reply = self._reply()
+            depth = float(reply.args[0])
             time.sleep(0.25)
             self.set_ctd_power("OFF")
         elif self.ctd_flag == 1:
-            self.rs232.write_command('$PWETC,PC,,,,D*')
-            response = self.rs232.read_response()
-            pattern = 'D,1,(.*?)\*'
-            depth = float(re.findall(pattern,response).pop())         
+            self._send('D')
+            reply = self._reply()
+            depth = float(reply.args[0])
         return depth
     
     def get_psw_state(self):
-        self.rs232.write_command('$PWETC,PC,,,,PSW*')
-        response = self.rs232.read_response()
-        if 'SUBMERGED' in response:
+        if self.telemetry is not None:
+            sample = self.telemetry.latest()
+            return 'UNKNOWN' if sample is None else sample.psw
+        self._send('PSW')
+        reply = self._reply()
+        if 'SUBMERGED' in reply.args:
             state = 'SUBMERGED'
-        elif 'SURFACE' in response:
+        elif 'SURFACE' in reply.args:
             state = 'SURFACE'
         else:
             state = 'UNKNOWN'
         return state         
     
-    def passthru(self,port):
-        self.rs232.write_command('$PWETC,PC,,,,pas,1,{}*'.format(port))
-        time.sleep(1)
+    def passthru(self,port,timeout=None):
+        '''Open a passthru to a sensor port. Not every firmware acknowledges
+        pas, so a missing reply is taken as success; only a NAK fails.
+        @param timeout -- seconds to wait, as the old fixed sleep did.
+            Defaults to deadlines['passthru'].
+        @return -- False if the controller refused the port.
+        '''
+        start = time.monotonic()
+        deadline = start + self._deadline('passthru',timeout)
+        self._send('pas',port)
+        reply = self._await('PAS',deadline)
+        ok = not reply.nak
+        return self._transition('passthru',port,start,ok)
     
     def get_working_directory(self,listener):
-        self.rs232.write_command('$PWETC,{},,,,PWD*'.format(listener))
-        response = self.rs232.read_response()
-        pattern = 'PWD,1,(.*?)\*'   
-        directory = re.findall(pattern,response).pop()
+        self._send('PWD',listener=listener)
+        reply = self._reply()
+        directory = reply.args[0]
         if directory == '':
             directory = listener + '/root'
         return directory
 
     def list_subdirectories(self,listener='PC'):
-        self.rs232.write_command('$PWETC,{},,,,DIR*'.format(listener))
-        response = self.rs232.read_response()
-        pattern = 'DIR,1,\\\\(.*?)\*'
-        subs = re.findall(pattern,response)
+        self._send('DIR',listener=listener)
+        replies = pwet.decode_all(self.rs232.read_response())
         keeps = []
-        for sub in subs:
-            if '\.' not in sub:
-                keeps.append(sub)
+        for reply in replies:
+            if reply.command == 'DIR' and reply.argc == 1:
+                sub = reply.args[0].lstrip('\\')
+                if '.' not in sub:
+                    keeps.append(sub)
         if len(keeps) == 1:
             keeps = keeps.pop()
         elif len(keeps) == 0:
@@ -599,107 +801,323 @@ class THETIS():
         return keeps
     
     def list_files(self,listener):
-        self.rs232.write_command('$PWETC,{},,,,DIR,1,#.#*'.format(listener))
+        self._send('DIR','#.#',listener=listener)
         time.sleep(3)
-        response = self.rs232.read_response()
-        pattern = 'DIR,2,.*?\\\\([0-9]*\.[A-Z]*),(.*?)\*' #Search for PDDDFFFF.ext and file sizes.
-        files = re.findall(pattern,response)
+        replies = pwet.decode_all(self.rs232.read_response())
+        files = []
+        for reply in replies:
+            #PDDDFFFF.ext and file size.
+            if reply.command == 'DIR' and reply.argc == 2:
+                files.append((reply.args[0].lstrip('\\'),reply.args[1]))
         if len(files) == 0:
             return None
         return files
 
     def delete_file(self,filename,listener):
-        if not isinstance(filename,list):
-            filename = [filename]
-        for f in filename:
-            self.rs232.write_command('$PWETC,{},,,,DEL,1,{}*'.format(listener,f))
-            time.sleep(1)
+        return self.delete_files(filename,listener)
+
+    def delete_files(self,filenames,listener='PC',window=1,timeout=None):
+        '''Delete files in the working directory, matching each reply back
+        to its file. If a reply never comes, the directory is listed: files
+        in flight that are no longer listed count as deleted, and the rest
+        of the files are sent one at a time.
+        @param filenames -- a filename or a list of them.
+        @param window -- how many DELs may wait for a reply at once. Only
+            raise it once the controller is known to accept pipelined
+            commands.
+        @param timeout -- seconds to wait for each reply. Defaults to the
+            port timeout.
+        @return -- (deleted,failed), the deleted filenames and a list of
+            (filename,reason) for the rest.
+        '''
+        if not isinstance(filenames,list):
+            filenames = [filenames]
+        queue = collections.deque(filenames)
+        pending = collections.OrderedDict() #Upper case filename: filename.
+        deleted = []
+        failed = []
+        while queue or pending:
+            while queue and len(pending) < window:
+                f = queue.popleft()
+                self._send('DEL',f,listener=listener)
+                pending[f.upper()] = f
+            reply = self._reply(timeout)
+            if not reply:
+                #Late replies could not be told apart, so ask the controller.
+                present = self._file_names(listener)
+                for f in pending.values():
+                    if present is None:
+                        failed.append((f,'no reply'))
+                    elif f.upper() in present:
+                        failed.append((f,'no reply, still present'))
+                    else:
+                        deleted.append(f)
+                pending.clear()
+                window = 1
+                continue
+            if reply.nak and reply.args[:1] == ('DEL',):
+                name = reply.args[1] if len(reply.args) > 1 else ''
+            elif reply.command == 'DEL':
+                name = reply.args[0] if reply.args else ''
+            else:
+                continue #A stray reply.
+            key = name.upper()
+            if key not in pending:
+                #No filename echoed, replies come back in order.
+                key = next(iter(pending))
+            f = pending.pop(key)
+            if reply.nak:
+                failed.append((f,'NAK ' + ','.join(reply.args)))
+            else:
+                deleted.append(f)
+        if self._fs is not None:
+            self._fs.changed(listener)
+        return deleted,failed
+
+    def _file_names(self,listener,timeout=10.0):
+        '''List the working directory, reading up to DIR,DONE so any late
+        replies still on the line are consumed with it.
+        @return -- a set of upper case filenames, or None without a listing.
+        '''
+        self._send('DIR','#.#',listener=listener)
+        data = self.rs232.read_until(None,timeout,rb'DIR,DONE[^\n]*\n')
+        replies = pwet.decode_all(data)
+        if not any(r.command == 'DIR' and r.done for r in replies):
+            return None
+        return {r.args[0].lstrip('\\').upper() for r in replies
+                if r.command == 'DIR' and r.argc == 2}
+
+    def remove_tree(self,directory_id,listener='PC',window=1,timeout=None):
+        '''Delete a subdirectory of the working directory with everything
+        below it. Files go through delete_files, then each emptied directory
+        is removed, deepest first.
+        @return -- (deleted,failed) as for delete_files, with paths relative
+            to the working directory. Removed directories end in \\.
+        '''
+        fs = self.fs
+        if not fs.cd(directory_id,listener):
+            return [],[(directory_id,'no such directory')]
+        prefix = '{}\\'.format(directory_id)
+        try:
+            names = [name for name,size in fs.files(listener)]
+            deleted,failed = self.delete_files(names,listener,window,timeout)
+            deleted = [prefix + f for f in deleted]
+            failed = [(prefix + f,reason) for f,reason in failed]
+            for sub in list(fs.dirs(listener)):
+                d,f = self.remove_tree(sub,listener,window,timeout)
+                deleted.extend(prefix + p for p in d)
+                failed.extend((prefix + p,reason) for p,reason in f)
+        finally:
+            fs.cd('..',listener)
+        if failed:
+            failed.append((prefix,'not empty'))
+        elif self.remove_directory(directory_id,listener):
+            deleted.append(prefix)
+        else:
+            failed.append((prefix,'RMD failed'))
+        return deleted,failed
     
     def remove_directory(self,directory_id,listener):
-        self.rs232.write_command('$PWETC,{},,,,RMD,1,.\{}*'.format(listener,directory_id))
-        response = self.rs232.read_response()
-        if 'RMD*' in response:
+        self._send('RMD','.\\{}'.format(directory_id),listener=listener)
+        reply = self._reply()
+        if self._fs is not None:
+            self._fs.changed(listener,directory_id)
+        if reply.command == 'RMD':
             return True
-        elif 'NAK' in response:
+        elif reply.nak:
             return False
         else:
             return False
 
     def set_winch_brake(self,state):
-        if state == 'OFF':
-            self.rs232.write_command('$PWETC,WC,,,,B,1,0*0A')
-        elif state == 'ON':
-            self.rs232.write_command('$PWETC,WC,,,,B,1,1*0B')       
-        time.sleep(0.25)
-        response = self.rs232.read_response()
-        if 'B,1,1' in response and state == "ON":
+        reply = self._winch_command('B',int(state == 'ON'))
+        if reply.args[:1] == ('1',) and state == "ON":
             return True
-        elif 'B,1,0' in response and state == "OFF":
+        elif reply.args[:1] == ('0',) and state == "OFF":
             return True
         else:
             return False  
 
+    def send_command(self,command,*args,listener='PC'):
+        '''Send any controller command. Read its answer with read_reply.'''
+        self._send(command,*args,listener=listener)
+
+    def read_reply(self,timeout=None):
+        '''Read the next PWETA reply, keeping the state cache up to date.
+        @return -- a pwet.Sentence, empty if nothing valid arrived in time.
+        '''
+        return self._reply(timeout)
+
+    def _send(self,command,*args,listener='PC',EOL='\r\n'):
+        '''Send a $PWETC command with its checksum.'''
+        self.rs232.write_command(pwet.encode(command,args,listener),EOL=EOL)
+
+    def _reply(self,timeout=None):
+        '''Read a single PWETA reply, returning as soon as it is complete.
+        @return -- a pwet.Sentence, empty if nothing valid arrived in time.
+        '''
+        data = self.rs232.read_until(None,timeout,PWETA_REPLY)
+        reply = pwet.decode(data)
+        self._remember(reply)
+        return reply
+
+    def _remember(self,reply):
+        '''Update the state cache and power flags from a reply.'''
+        if reply.nak or reply.argc is None or not reply.args:
+            return
+        command = reply.command.upper()
+        if command in CACHED:
+            self.state[(reply.listener,command)] = reply.args
+        elif command == 'CTDP':
+            self.ctd_flag = int(reply.args[0] == 'ON')
+        elif command == 'INSP':
+            self.insp_flag = int(reply.args[0] == 'ON')
+        elif command == 'WP':
+            self.winch_flag = int(reply.args[0] == 'ON')
+        elif command == 'PWR' and reply.args[0] == 'PMP':
+            self.pump_flag = int(reply.args[1:2] == ('ON',))
+
+    def holds(self,command,*expected,listener='PC'):
+        '''Check whether the cached state already has these values.'''
+        args = self.cached(command,listener)
+        return args is not None and pwet.matches(expected,args)
+
+    def cached(self,command,listener='PC'):
+        '''@return -- the last reply arguments seen for a setting, or None.'''
+        return self.state.get((listener,command.upper()))
+
+    def invalidate(self,listener=None):
+        '''Forget cached controller settings, for one listener or all of them.
+        Called on power cycles and mode changes. Call it yourself if the
+        profiler is reconfigured by anything else (e.g. JProfilerHost).
+        '''
+        if listener is None:
+            self.state.clear()
+        else:
+            for key in [k for k in self.state if k[0] == listener]:
+                del self.state[key]
+
+    def _deadline(self,name,timeout):
+        return self.deadlines[name] if timeout is None else timeout
+
+    def _await(self,command,deadline):
+        '''Read replies until one for command (or a NAK of it) arrives.
+        @param deadline -- a time.monotonic() deadline.
+        @return -- the reply, empty if the deadline passes.
+        '''
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return pwet.Sentence()
+            reply = self._reply(remaining)
+            if reply.command.upper() == command or \
+                    (reply.nak and reply.args[:1] == (command,)):
+                return reply
+
+    def _transition(self,name,state,start,ok):
+        '''Record how long a mode change took.
+        @return -- ok
+        '''
+        record = Transition(name,str(state),self.firmware,
+                            time.monotonic() - start,ok)
+        self.transitions.append(record)
+        if self.on_transition is not None:
+            self.on_transition(record)
+        return ok
+
+    def _winch_off(self,reply):
+        text = ','.join((reply.command,) + tuple(str(a) for a in reply.args))
+        return 'WC OFF' in text
+
     def _send_ack(self,listener='PC'):
-        self.rs232.write_command('$PWETA,{},,,,ACK*'.format(listener))  
+        self.rs232.write_command(pwet.encode('ACK',listener=listener,talker='PWETA'))
 
-    def offload_files(self,filenames,directory,handshake=0.1):
+    def _send_nak(self,listener='PC'):
+        '''Ask the controller to send the last file frame again.'''
+        self.rs232.write_command(pwet.encode('NAK',listener=listener,talker='PWETA'))
+
+    def offload_files(self,filenames,directory,handshake=None,timeout=10.0,
+                      resume=True,sizes=None):
+        '''Offload files from the profiler controller into directory.
+        Decimated files (.PPD, .SND, .ACD) must be offloaded before their
+        full files.
+        @param handshake -- no longer used. Frames are acknowledged as soon
+            as they are complete.
+        @param timeout -- seconds of silence before a transfer is abandoned.
+        @param resume -- skip files that are already complete locally and
+            pick up interrupted transfers from their checkpoints.
+        @param sizes -- an optional dict of filename to size from list_files,
+            used to recognise complete local copies.
+        @return -- a list of thetis_offload.OffloadResult, one per file.
+        '''
         if not isinstance(filenames,list):
             filenames = [filenames]     
+        manifest = thetis_offload.Manifest(directory)
+        if sizes is None:
+            sizes = {}
+        results = []
         for filename in filenames:
-            print('\nOffloading {}.'.format(filename),end='')
-            if '.PPD' in filename:
-                full = filename.replace(filename[-1],'B')
-                handshake = 0.25
-                self.rs232.write_command('$PWETC,PC,,,,GDF,1,{}*'.format(full))
-            elif '.SND' in filename:
-                full = filename.replace(filename[-1],'A')
-                handshake = 0.25
-                self.rs232.write_command('$PWETC,PC,,,,GDF,1,{}*'.format(full))                
-            elif '.ACD' in filename:
-                full = filename.replace(filename[-1],'S')
-                handshake = 0.25
-                self.rs232.write_command('$PWETC,PC,,,,GDF,1,{}*'.format(full))  
+            filepath = os.path.join(directory,filename)        
+            if resume and manifest.is_complete(filename,sizes.get(filename)):
+                result = thetis_offload.OffloadResult(filename,filepath)
+                result.complete = True
+                result.up_to_date = True
+                result.resumed = os.path.getsize(filepath)
+                results.append(result)
+                continue
+            print('Offloading {}.'.format(filename))
+            result = thetis_offload.offload_file(self,filename,filepath,timeout,
+                                                 resume=resume)
+            results.append(result)
+            if result.ok:
+                manifest.record(result)
+                print('Offloaded: {} ({:.0f} B/s)'.format(filename,result.rate))
             else:
-                full = filename
-                self.rs232.write_command('$PWETC,PC,,,,GET,1,{}*'.format(full))
-            time.sleep(0.5)
-            raw = []
-            pattern = rb".*\$PWETB,.*?,.*?,.*?,.*?,.*?,.*?,(.*)"
-            while True:
-                print('.',end='')
-                incoming = self.rs232.sercom.in_waiting
-                time.sleep(handshake)
-                if incoming == 0:
-                    print('\n')
-                    break
+                print('Offload of {} failed: {}'.format(filename,
+                      result.error or '{} missing frames'.format(result.missing)))
+                self.rs232.clear_buffers()
+        return results
+
+    def sync(self,directory,listener='PC',timeout=10.0):
+        '''Bring a local copy of the profiler's working directory up to date.
+        Only files that are new or have grown since the last sync are
+        offloaded, decimated files before their full files. Files no larger
+        than their header length hold no data and are only indexed. The
+        index is kept in directory/sync_index.json.
+        @param directory -- the local root. Files from a profiler directory
+            such as \\DATA\\20210101 go into the matching subdirectory.
+        @return -- a list of thetis_offload.OffloadResult for the files
+            offloaded.
+        '''
+        path = self.get_working_directory(listener)
+        if path == listener + '/root':
+            path = ''
+        local = os.path.join(directory,*[p for p in path.split('\\') if p])
+        os.makedirs(local,exist_ok=True)
+        index = thetis_offload.SyncIndex(directory)
+        files = self.list_files(listener) or []
+        results = []
+        try:
+            for filename,size in sorted(files,key=lambda f: thetis_offload.sync_order(f[0])):
+                size = int(size)
+                if not index.needs_offload(listener,path,filename,size):
+                    continue
+                header_len = getattr(self,'{}_header_len'.format(filename[-3:].upper()),0)
+                if size <= header_len:
+                    index.update(listener,path,filename,size,thetis_offload.EMPTY)
+                    continue
+                result = thetis_offload.offload_file(self,filename,
+                    os.path.join(local,filename),timeout,listener=listener)
+                results.append(result)
+                if result.ok:
+                    index.update(listener,path,filename,size,thetis_offload.COMPLETE)
                 else:
-                    received = self.rs232.sercom.read(incoming)
-                try:
-                    msg = received.decode()
-                    if "DONE" in msg or "ACK" in msg:
-                        print('\n')
-                        break
-                    else:
-                        drop_lead = re.findall(pattern,received,re.DOTALL)[0]
-                        drop_checksum = drop_lead[:-5]
-                        raw.append(drop_checksum)
-                        self._send_ack()
-                        time.sleep(handshake)
-                except:
-                    drop_lead = re.findall(pattern,received,re.DOTALL)[0]
-                    drop_checksum = drop_lead[:-5]
-                    raw.append(drop_checksum)      
-                    self._send_ack()
-                    time.sleep(handshake)
-            filepath = os.path.join(directory,filename)        
-            with open(filepath,'wb') as f:
-                for item in raw:
-                    f.write(item)
-            f.close()
-            print('Offloaded: {}'.format(filename))
-            time.sleep(1)
-            self.rs232.clear_buffers()
-            time.sleep(3)
+                    index.update(listener,path,filename,size,thetis_offload.FAILED)
+                    self.rs232.clear_buffers()
+                index.save()
+        finally:
+            index.save()
+        return results
 
        
 #Still need to test.        
@@ -709,25 +1127,11 @@ class THETIS():
     def transfer_winch_file(self,filename):
         if not isinstance(filename,list):
             filename = [filename]
-        if self.winch_flag != 1:
-            self.set_winch_power("ON")
+        with self.winch_session():
             for wf in filename:
-                self.rs232.write_command('$PWETC,WC,,,,GWF,1{}*'.format(wf))
+                self._send('GWF',wf,listener='WC')
                 time.sleep(1)
                 response = self.rs232.read_until_byte_string('\n')
-                if "DONE" in response:
-                    self.set_winch_power("OFF")
-                    time.sleep(1)
-                    return True
-                else:
+                if "DONE" not in response:
                     return False
-        else:
-            for wf in filename:
-                self.rs232.write_command('$PWETC,WC,,,,GWF,1{}*'.format(wf))
-                time.sleep(1)
-                response = self.rs232.read_until_byte_string('\n')
-                if "DONE" in response:
-                    time.sleep(1)
-                    return True
-                else:
-                    return False           
+        return True           
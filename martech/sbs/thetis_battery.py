@@ -0,0 +1,151 @@
+'''Typed THETIS battery status records and a columnar battery history.
+
+THETIS.get_battery_statuses sends BFS for every address back to back and
+parses each reply into a BatteryStatus. A BatteryLog keeps statuses column
+by column (floats in typed arrays) and appends them to a CSV file, so
+trends can be compared across profilers and deployments.
+
+    log = BatteryLog('batteries.csv')
+    statuses = thetis.get_battery_statuses((1,2),log=log)
+    log.flush()
+    print(max(log.columns['temperature']))
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import array
+import csv
+import enum
+import os
+import time
+
+class BatteryState(enum.Enum):
+    '''The state character reported by the battery. See the BF manual.'''
+    OFF = 'f'
+    DISCHARGING = 'd'
+    CHARGING = 'c'
+    BALANCING = 'b'
+    UNKNOWN = '?'
+
+class BatteryStatus():
+    __slots__ = ('address','position','state','voltage','current',
+                 'temperature','min_cell','max_cell','leak')
+
+    def __init__(self,address,position,state,voltage,current,temperature,
+                 min_cell,max_cell,leak):
+        '''@param state -- a BatteryState.
+        @param leak -- True if water was detected.
+        '''
+        self.address = address
+        self.position = position
+        self.state = state
+        self.voltage = voltage
+        self.current = current
+        self.temperature = temperature
+        self.min_cell = min_cell
+        self.max_cell = max_cell
+        self.leak = leak
+
+    @classmethod
+    def parse(cls,address,text):
+        '''Parse the BFS summary, e.g. #01 d 29.10 -0.52 21.3 3.637 3.641 0
+        @return -- a BatteryStatus, or None if the summary is malformed.
+        '''
+        info = text.split()
+        if len(info) < 8:
+            return None
+        try:
+            state = BatteryState(info[1][:1])
+        except ValueError:
+            state = BatteryState.UNKNOWN
+        try:
+            values = [float(v) for v in info[2:7]]
+        except ValueError:
+            return None
+        return cls(int(address),info[0][1:3],state,*values,leak=info[7] == '1')
+
+    def as_dict(self):
+        '''@return -- the dict returned by THETIS.get_battery_status.'''
+        return {'position':self.position,
+                'state':self.state.name,
+                'voltage':self.voltage,
+                'current':self.current,
+                'temperature':self.temperature,
+                'min_cell':self.min_cell,
+                'max_cell':self.max_cell,
+                'leak_detect':'WATER_DETECTED' if self.leak else 'NO_LEAK'}
+
+    def __repr__(self):
+        return 'BatteryStatus({})'.format(','.join('{}={!r}'.format(
+            name,getattr(self,name)) for name in self.__slots__))
+
+#Column name: array typecode, or None for text columns.
+COLUMNS = (('timestamp','d'),('profiler_id',None),('address','i'),
+           ('position',None),('state',None),('voltage','d'),('current','d'),
+           ('temperature','d'),('min_cell','d'),('max_cell','d'),('leak','b'))
+
+class BatteryLog():
+    def __init__(self,path=None):
+        '''@param path -- the CSV file flush appends to, or None to keep the
+            history in memory only. Existing rows are not loaded, see load.
+        '''
+        self.path = path
+        self.columns = {name:(array.array(code) if code else [])
+                        for name,code in COLUMNS}
+        self._flushed = 0
+
+    @classmethod
+    def load(cls,path):
+        '''Read a whole history file back into columns.'''
+        log = cls(path)
+        with open(path,newline='') as file:
+            for row in csv.DictReader(file):
+                for name,code in COLUMNS:
+                    value = row[name]
+                    if code == 'd':
+                        value = float(value)
+                    elif code:
+                        value = int(value)
+                    log.columns[name].append(value)
+        log._flushed = len(log)
+        return log
+
+    def append(self,statuses,profiler_id='',timestamp=None):
+        '''@param statuses -- BatteryStatus records. None entries (locked
+            or missing batteries) are skipped.
+        @param timestamp -- seconds since the epoch. Defaults to now.
+        '''
+        if timestamp is None:
+            timestamp = time.time()
+        columns = self.columns
+        for status in statuses:
+            if status is None:
+                continue
+            columns['timestamp'].append(timestamp)
+            columns['profiler_id'].append(profiler_id or '')
+            columns['address'].append(status.address)
+            columns['position'].append(status.position)
+            columns['state'].append(status.state.name)
+            columns['voltage'].append(status.voltage)
+            columns['current'].append(status.current)
+            columns['temperature'].append(status.temperature)
+            columns['min_cell'].append(status.min_cell)
+            columns['max_cell'].append(status.max_cell)
+            columns['leak'].append(int(status.leak))
+
+    def flush(self):
+        '''Append the rows added since the last flush to the CSV file.'''
+        if self.path is None or self._flushed == len(self):
+            return
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        names = [name for name,code in COLUMNS]
+        with open(self.path,'a',newline='') as file:
+            writer = csv.writer(file)
+            if new:
+                writer.writerow(names)
+            columns = [self.columns[name][self._flushed:] for name in names]
+            writer.writerows(zip(*columns))
+        self._flushed = len(self)
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
@@ -0,0 +1,131 @@
+'''A cached view of the THETIS profiler and winch controller filesystems.
+
+Directory listings are slow (list_files waits 3 s for the controller), so
+ProfilerFS keeps them per listener and directory, and tracks each listener's
+working directory locally. Listings are dropped when THETIS makes or removes
+a directory, deletes files or starts or stops logging, so repeated
+navigation and listing cost no serial traffic.
+
+    fs = thetis.fs
+    fs.cd('DATA')
+    for name,size in fs.files():
+        ...
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+
+class ProfilerFS():
+    def __init__(self,thetis):
+        self.thetis = thetis
+        self.cwd = {} #Listener: working directory, '' for root.
+        self.listings = {} #(listener,path): {'files':[...],'dirs':[...]}
+
+    def pwd(self,listener='PC'):
+        '''@return -- the working directory, e.g. \\DATA\\20210101, or '' at
+            the root.'''
+        if listener not in self.cwd:
+            path = self.thetis.get_working_directory(listener)
+            if path == listener + '/root':
+                path = ''
+            self.cwd[listener] = path
+        return self.cwd[listener]
+
+    def cd(self,directory,listener='PC'):
+        '''Change directory. .. moves up one level and \\ goes to the root.
+        @return -- True if the controller changed directory.
+        '''
+        path = self.pwd(listener)
+        if directory == '\\':
+            if path:
+                self.thetis.change_to_root_directory(listener)
+            return True
+        if directory == '..':
+            if not path:
+                return True
+            self.thetis._send('CD','..',listener=listener)
+            reply = self.thetis._reply()
+            if reply.nak or reply.command != 'CD':
+                return False
+            self.moved(listener,'..')
+            return True
+        listing = self.listings.get((listener,path))
+        if listing is not None and listing.get('dirs') is not None \
+                and directory not in listing['dirs']:
+            return False #Known not to exist.
+        return self.thetis.change_directory(directory,listener) is not False
+
+    def files(self,listener='PC'):
+        '''@return -- a list of (filename,size) in the working directory.'''
+        listing = self._listing(listener)
+        if listing.get('files') is None:
+            files = self.thetis.list_files(listener) or []
+            listing['files'] = [(name,int(size)) for name,size in files]
+        return listing['files']
+
+    def dirs(self,listener='PC'):
+        '''@return -- a list of subdirectories of the working directory.'''
+        listing = self._listing(listener)
+        if listing.get('dirs') is None:
+            subs = self.thetis.list_subdirectories(listener)
+            if subs is None:
+                subs = []
+            elif not isinstance(subs,list):
+                subs = [subs]
+            listing['dirs'] = subs
+        return listing['dirs']
+
+    def exists(self,name,listener='PC'):
+        return name in self.dirs(listener) or \
+            any(f[0] == name for f in self.files(listener))
+
+    def mkdir(self,directory,listener='PC'):
+        return self.thetis.make_directory(directory,listener)
+
+    def rmdir(self,directory,listener='PC'):
+        return self.thetis.remove_directory(directory,listener)
+
+    def delete(self,filenames,listener='PC'):
+        return self.thetis.delete_file(filenames,listener)
+
+    def invalidate(self,listener=None,path=None):
+        '''Drop cached listings, for one directory, one listener or all.
+        Removing a directory also drops the listings below it.
+        '''
+        for key in list(self.listings):
+            if listener is not None and key[0] != listener:
+                continue
+            if path is not None and key[1] != path and \
+                    not key[1].startswith(path + '\\'):
+                continue
+            del self.listings[key]
+        if path is None:
+            if listener is None:
+                self.cwd.clear()
+            else:
+                self.cwd.pop(listener,None)
+
+#--------------------------Called by THETIS-------------------------------------#
+    def moved(self,listener,directory):
+        '''Track a successful change of directory.'''
+        if listener not in self.cwd:
+            return
+        path = self.cwd[listener]
+        if directory in ('..','\\'):
+            self.cwd[listener] = path.rsplit('\\',1)[0] if directory == '..' else ''
+        else:
+            self.cwd[listener] = path + '\\' + str(directory)
+
+    def changed(self,listener,directory=None):
+        '''Drop the working directory listing after it changed, and the
+        listings under a removed subdirectory.'''
+        path = self.cwd.get(listener)
+        if path is None:
+            self.invalidate(listener)
+            return
+        self.listings.pop((listener,path),None)
+        if directory is not None:
+            self.invalidate(listener,path + '\\' + str(directory))
+
+    def _listing(self,listener):
+        return self.listings.setdefault((listener,self.pwd(listener)),{})
@@ -0,0 +1,387 @@
+'''Stream files off the THETIS profiler as fast as the link allows.
+
+The controller sends a file as $PWETB,PC,,,,GET,INDEX,PAYLOAD*CS sentences,
+one at a time, and waits for $PWETA,PC,,,,ACK* before the next. The payload
+is binary, so a frame ends at the first *CS\\r\\n whose checksum matches
+everything before it. Frames are parsed straight out of the SERCOM receive
+buffer as bytes arrive, acknowledged the moment they are complete and
+appended to the output file through a buffered writer. A frame that fails
+its checksum is not written; it is NAKed so the controller sends it again,
+and the transfer fails if it never arrives intact. Memory use does not
+grow with the file size, and the only waits are for the controller itself.
+
+Transfers are resumable. Data goes to NAME.part next to a NAME.ckpt sidecar
+holding the last acknowledged frame and byte offset. If a transfer dies the
+next attempt keeps the bytes already on disk and ACKs the frames before the
+checkpoint without writing them. The checkpoint never moves past a missing
+frame, so the next attempt fetches the hole again. The PWET protocol has no
+way to start a file part way, so those frames are still sent by the
+controller. Only a transfer where every frame checked out replaces NAME. Finished files are
+recorded in offload_manifest.json in the output directory so they
+are not fetched again.
+
+SyncIndex is the persistent record behind THETIS.sync(): every profiler file
+seen, by listener and directory, with its size and offload status.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import datetime
+from martech.helpers import load_json,save_json
+from martech.sbs import pwet
+import os
+import time
+
+#Decimated files are requested with GDF and the full file's name.
+DECIMATED = {'.PPD':'B','.SND':'A','.ACD':'S'}
+
+WRITE_BUFFER = 1 << 16
+CHECKPOINT_FRAMES = 32 #Frames between checkpoint writes.
+FRAME_RETRIES = 3 #NAKs sent for one frame before giving up.
+MANIFEST = 'offload_manifest.json'
+SYNC_INDEX = 'sync_index.json'
+
+#Offload order. Decimated files must come off before their full files.
+SYNC_ORDER = ('.SND','.SNA','.PPD','.PPB','.ACD','.ACS','.DBG')
+
+#Offload status in the sync index.
+COMPLETE = 'complete'
+EMPTY = 'empty'
+FAILED = 'failed'
+
+def request_for(filename):
+    '''@return -- the command and file name that fetch a profiler file.'''
+    ext = filename[-4:].upper()
+    if ext in DECIMATED:
+        return 'GDF',filename[:-1] + DECIMATED[ext]
+    return 'GET',filename
+
+class OffloadResult():
+    __slots__ = ('filename','path','bytes','frames','bad_frames','duplicates',
+                 'missing','seconds','complete','error','resumed','skipped',
+                 'up_to_date')
+
+    def __init__(self,filename,path):
+        self.filename = filename
+        self.path = path
+        self.bytes = 0
+        self.frames = 0
+        self.bad_frames = 0 #Frames that failed their checksum and were NAKed.
+        self.duplicates = 0 #Frames sent again after a lost ACK.
+        self.missing = 0 #Frames skipped by the controller.
+        self.seconds = 0.0
+        self.complete = False
+        self.error = None
+        self.resumed = 0 #Byte offset the transfer resumed from.
+        self.skipped = 0 #Frames before the checkpoint, ACKed but not written.
+        self.up_to_date = False #The local copy was already complete.
+
+    @property
+    def ok(self):
+        '''Every frame arrived and checked out. Bad frames only count
+        against a transfer that never got them resent intact.'''
+        return self.complete and not self.missing and self.error is None
+
+    @property
+    def rate(self):
+        '''Payload bytes per second.'''
+        if not self.seconds:
+            return 0.0
+        return self.bytes/self.seconds
+
+    @property
+    def size(self):
+        '''Bytes in the local file.'''
+        return self.resumed + self.bytes
+
+    def __repr__(self):
+        return 'OffloadResult({!r},{} bytes,{} frames,{:.0f} B/s,ok={})'.format(
+            self.filename,self.bytes,self.frames,self.rate,self.ok)
+
+class FrameParser():
+    def __init__(self,rx):
+        '''Split PWETA and PWETB sentences out of a SERCOM RingBuffer.
+        @param rx -- the RingBuffer the port reads into.
+        '''
+        self.rx = rx
+        self._scanned = 0 #Payload bytes from the frame start already searched.
+
+    def next(self):
+        '''@return -- a pwet.Sentence for PWETA lines, a Frame for complete
+            PWETB sentences, or None until more bytes arrive.'''
+        rx = self.rx
+        buf = rx.buffer
+        start = buf.find(b'$PWET',rx.head,rx.tail)
+        if start == -1:
+            #Drop noise, keeping a possible partial $PWET.
+            if len(rx) > 4:
+                rx.take(len(rx) - 4)
+            return None
+        if start > rx.head:
+            rx.take(start - rx.head)
+            self._scanned = 0
+        head = rx.head
+        if rx.tail - head < 6:
+            return None
+        if buf[head + 5] != 0x42: #Not B
+            end = buf.find(b'\n',head,rx.tail)
+            if end == -1:
+                return None
+            self._scanned = 0
+            return pwet.decode(bytes(rx.take(end + 1 - head)))
+        payload = head
+        for i in range(7):
+            payload = buf.find(b',',payload,rx.tail) + 1
+            if not payload:
+                return None
+        star = buf.find(b'*',max(payload,head + self._scanned),rx.tail)
+        while star != -1:
+            if star + 5 > rx.tail:
+                break #Wait for the checksum to arrive.
+            if buf[star + 3:star + 5] == b'\r\n' and \
+                    _hex(buf[star + 1:star + 3]) == pwet.sentence_checksum(memoryview(buf)[head + 1:star]):
+                return self._frame(head,payload,star,True)
+            star = buf.find(b'*',star + 1,rx.tail)
+        self._scanned = (star if star != -1 else rx.tail) - head
+        return None
+
+    def flush(self):
+        '''Close out a frame whose checksum never matched, once the line has
+        gone quiet. The controller sends nothing else until it is ACKed.
+        @return -- a Frame with checksum_ok False, or None.
+        '''
+        rx = self.rx
+        buf = rx.buffer
+        head = rx.head
+        if len(rx) < 11 or buf[head:head + 6] != b'$PWETB' or \
+                buf[rx.tail - 5:rx.tail - 4] != b'*' or buf[rx.tail - 2:rx.tail] != b'\r\n':
+            return None
+        payload = head
+        for i in range(7):
+            payload = buf.find(b',',payload,rx.tail) + 1
+            if not payload:
+                return None
+        return self._frame(head,payload,rx.tail - 5,False)
+
+    def _frame(self,head,payload,star,checksum_ok):
+        buf = self.rx.buffer
+        fields = bytes(buf[head + 1:payload - 1]).decode('latin-1').split(',')
+        self._scanned = 0
+        return Frame(fields[1],fields[5],int(fields[6]) if fields[6].isdigit() else -1,
+                     memoryview(buf)[payload:star],star + 5 - head,checksum_ok)
+
+class Frame():
+    __slots__ = ('listener','command','index','payload','length','checksum_ok')
+
+    def __init__(self,listener,command,index,payload,length,checksum_ok):
+        '''A PWETB sentence still sitting in the receive buffer.
+        @param payload -- a memoryview of the data. Only valid until the
+            frame is consumed.
+        @param length -- the sentence length, to consume it with.
+        '''
+        self.listener = listener
+        self.command = command
+        self.index = index
+        self.payload = payload
+        self.length = length
+        self.checksum_ok = checksum_ok
+
+def _hex(digits):
+    try:
+        return int(digits,16)
+    except ValueError:
+        return -1
+
+class Manifest():
+    def __init__(self,directory):
+        '''The record of finished offloads in a directory.'''
+        self.path = os.path.join(directory,MANIFEST)
+        self.files = load_json(self.path,{})
+
+    def is_complete(self,filename,size=None):
+        '''Check the local copy of a file is finished.
+        @param size -- the size reported by the profiler, if known. A local
+            file of exactly this size counts as complete even if it was not
+            offloaded by this module.
+        '''
+        local = os.path.join(os.path.dirname(self.path),filename)
+        if not os.path.exists(local):
+            return False
+        local_size = os.path.getsize(local)
+        if size is not None:
+            return local_size == int(size)
+        entry = self.files.get(filename)
+        return entry is not None and entry['complete'] and entry['size'] == local_size
+
+    def record(self,result):
+        self.files[result.filename] = {
+            'size': result.size,
+            'complete': result.ok,
+            'offloaded': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            }
+        self.save()
+
+    def save(self):
+        save_json(self.path,self.files,indent=1,sort_keys=True)
+
+def sync_order(filename):
+    '''Sort key that puts files in SYNC_ORDER, then everything else.'''
+    ext = filename[-4:].upper()
+    if ext in SYNC_ORDER:
+        return (SYNC_ORDER.index(ext),filename)
+    return (len(SYNC_ORDER),filename)
+
+class SyncIndex():
+    def __init__(self,directory):
+        '''The record of every profiler file a sync has seen.'''
+        self.path = os.path.join(directory,SYNC_INDEX)
+        self.files = load_json(self.path,{})
+
+    @staticmethod
+    def key(listener,path,filename):
+        return '{}:{}\\{}'.format(listener,path,filename)
+
+    def get(self,listener,path,filename):
+        return self.files.get(self.key(listener,path,filename))
+
+    def needs_offload(self,listener,path,filename,size):
+        '''True if the file is new, has grown or did not finish last time.'''
+        entry = self.get(listener,path,filename)
+        if entry is None:
+            return True
+        return entry['status'] == FAILED or int(size) > entry['size']
+
+    def update(self,listener,path,filename,size,status):
+        self.files[self.key(listener,path,filename)] = {
+            'listener': listener,
+            'path': path,
+            'name': filename,
+            'size': int(size),
+            'status': status,
+            'updated': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            }
+
+    def save(self):
+        save_json(self.path,self.files,indent=1,sort_keys=True)
+
+def load_checkpoint(path):
+    '''@return -- (frame,offset) from a checkpoint file, or None.'''
+    state = load_json(path)
+    try:
+        return state['frame'],state['offset']
+    except (TypeError,KeyError):
+        return None
+
+def save_checkpoint(path,frame,offset):
+    save_json(path,{'frame':frame,'offset':offset})
+
+def offload_file(thetis,filename,path,timeout=10.0,quiet=0.5,progress=None,
+                 listener='PC',resume=True):
+    '''Fetch one file from the profiler and write it to path.
+    @param thetis -- a connected THETIS.
+    @param filename -- the profiler file name. Decimated files (.PPD, .SND,
+        .ACD) are requested with GDF.
+    @param timeout -- seconds of silence before giving up on the transfer.
+    @param quiet -- seconds of silence before a frame with a bad checksum is
+        taken as complete, and NAKed.
+    @param progress -- an optional callable given the OffloadResult after
+        every frame.
+    @param resume -- pick up from a checkpoint left by a failed attempt.
+    @return -- an OffloadResult.
+    '''
+    rs232 = thetis.rs232
+    result = OffloadResult(filename,path)
+    parser = FrameParser(rs232.rx)
+    command,name = request_for(filename)
+    if listener == 'WC':
+        command = 'GWF'
+    part = path + '.part'
+    ckpt = path + '.ckpt'
+    skip = 0
+    state = load_checkpoint(ckpt) if resume and os.path.exists(part) else None
+    if state is not None:
+        skip,result.resumed = state
+    expected = 0
+    unsaved = 0
+    naks = 0 #For the frame the controller is sending now.
+    poll = min(quiet,0.05)
+    start = time.monotonic()
+    try:
+        with open(part,'r+b' if skip else 'wb',buffering=WRITE_BUFFER) as f:
+            f.truncate(result.resumed)
+            f.seek(result.resumed)
+            thetis._send(command,name,listener=listener)
+            last = time.monotonic()
+            while True:
+                item = parser.next()
+                if item is None:
+                    if rs232._fill(poll):
+                        last = time.monotonic()
+                        continue
+                    idle = time.monotonic() - last
+                    if idle >= quiet:
+                        item = parser.flush()
+                    if item is None:
+                        if idle >= timeout:
+                            result.error = 'timed out'
+                            break
+                        continue
+                if isinstance(item,pwet.Sentence):
+                    if item.nak:
+                        result.error = 'NAK ' + ','.join(item.args)
+                        break
+                    if item.done:
+                        result.complete = True
+                        break
+                    continue
+                rs232.metrics.reply_received()
+                if not item.checksum_ok:
+                    #Nothing of it is kept: NAK it so the controller resends.
+                    result.bad_frames += 1
+                    naks += 1
+                    item.payload.release()
+                    rs232.rx.take(item.length)
+                    if naks > FRAME_RETRIES:
+                        result.error = 'frame {} failed its checksum {} times'.format(
+                            expected,naks)
+                        break
+                    thetis._send_nak(item.listener)
+                    continue
+                naks = 0
+                if 0 <= item.index < skip:
+                    result.skipped += 1
+                elif item.index == expected or item.index == -1:
+                    f.write(item.payload)
+                    result.bytes += len(item.payload)
+                    result.frames += 1
+                elif item.index < expected:
+                    result.duplicates += 1
+                else:
+                    result.missing += item.index - expected
+                    f.write(item.payload)
+                    result.bytes += len(item.payload)
+                    result.frames += 1
+                if item.index >= expected:
+                    expected = item.index + 1
+                item.payload.release()
+                rs232.rx.take(item.length)
+                thetis._send_ack(item.listener)
+                unsaved += 1
+                #Past a hole the checkpoint stays at the last good frame.
+                if unsaved >= CHECKPOINT_FRAMES and expected > skip and \
+                        not result.missing:
+                    f.flush()
+                    save_checkpoint(ckpt,expected,f.tell())
+                    unsaved = 0
+                if progress is not None:
+                    progress(result)
+            if not result.complete and expected > skip and not result.missing:
+                f.flush()
+                save_checkpoint(ckpt,expected,f.tell())
+    finally:
+        result.seconds = time.monotonic() - start
+    if result.ok:
+        os.replace(part,path)
+        if os.path.exists(ckpt):
+            os.remove(ckpt)
+    return result
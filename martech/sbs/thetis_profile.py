@@ -0,0 +1,191 @@
+'''Declarative THETIS configuration, applied in one batch and verified.
+
+A ThetisProfile holds every setting a deployment needs. apply() sends the
+profiler controller (PC) settings one at a time, or pipelined up to a window
+when the controller accepts it, and powers the winch a single time for all
+of the winch controller (WC) settings. Each PWETA reply is matched back to
+its command and checked against the requested value. Settings the THETIS
+state cache already holds are passed without being sent. If the winch does
+not power up, its settings are reported as failed.
+
+    profile = ThetisProfile(parking_depth=65,radio_depth=1.0,gps_power='OFF',
+                            gps_acquisition='OFF',depth_offset=0.6,
+                            battery_thresholds=(28.5,28.5),slsf=1.45,
+                            scooch=(250,5000,150000,2500),sta=0.7,
+                            profile_number=0,hld=1,wave_height_estimator='OFF',
+                            breakaway_depth=0.7)
+    report = profile.apply(thetis)
+    for line in report.lines():
+        log.write(line + '\\n')
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import collections
+from martech.sbs import pwet
+import time
+
+def _number(value):
+    value = float(value)
+    return (value,),(value,)
+
+def _integer(value):
+    value = int(value)
+    return (value,),(value,)
+
+def _numbers(values):
+    values = tuple(float(v) for v in values)
+    return values,values
+
+def _power(state):
+    '''ON/OFF settings that the controller echoes as ON/OFF.'''
+    return (1 if state == 'ON' else 0,),(state,)
+
+def _switch(state):
+    '''ON/OFF settings that the controller echoes as 1/0.'''
+    value = 1 if state == 'ON' else 0
+    return (value,),(value,)
+
+#Setting name: (listener, command, value converter, tolerance).
+SETTINGS = collections.OrderedDict([
+    ('buf',('PC','BUF',_integer,0)),
+    ('parking_depth',('PC','PKD',_number,1e-6)),
+    ('breakaway_depth',('PC','BD',_number,1e-6)),
+    ('radio_depth',('PC','RD',_number,1e-6)),
+    ('wave_height_estimator',('PC','WHS',_switch,0)),
+    ('hld',('PC','HLD',_integer,0)),
+    ('profile_number',('PC','num',_integer,0)),
+    ('scooch',('PC','SCS',_numbers,1e-6)),
+    ('battery_thresholds',('PC','BLV',_numbers,1e-6)),
+    ('gps_power',('PC','GPSP',_power,0)),
+    ('gps_acquisition',('PC','GGF',_switch,0)),
+    ('acoustic_modem_power',('PC','ATMP',_power,0)),
+    ('sta',('WC','STA',_number,0.01)),
+    ('slsf',('WC','SLSF',_number,1e-6)),
+    ('depth_offset',('WC','DO',_number,1e-6)),
+    ])
+
+SettingResult = collections.namedtuple('SettingResult',
+    ['name','listener','command','expected','returned','passed','reason'])
+
+class ProfileReport():
+    def __init__(self):
+        self.results = []
+        self.elapsed = 0.0
+
+    @property
+    def passed(self):
+        return all(r.passed for r in self.results)
+
+    def failures(self):
+        return [r for r in self.results if not r.passed]
+
+    def lines(self):
+        '''@return -- one "CMD Set: PASS | Value = ..." line per setting, in
+            the same format as the THETIS set_* messages.'''
+        out = []
+        for r in self.results:
+            if r.passed:
+                value = ','.join(str(v) for v in r.expected)
+                out.append('{} Set: PASS | Value = {}'.format(r.command.upper(),value))
+            else:
+                out.append('{} Set: FAIL ({})'.format(r.command.upper(),r.reason))
+        return out
+
+    def __str__(self):
+        return '\n'.join(self.lines())
+
+class ThetisProfile():
+    def __init__(self,**settings):
+        '''@param settings -- any of the names in SETTINGS with the desired
+            value. ON/OFF settings take 'ON' or 'OFF', multi-value settings
+            (scooch, battery_thresholds) take a tuple.
+        '''
+        unknown = [name for name in settings if name not in SETTINGS]
+        if unknown:
+            raise ValueError('Unknown THETIS settings: {}'.format(', '.join(unknown)))
+        self.settings = settings
+
+    def commands(self,listener):
+        '''@return -- (name,command,args,expected,tolerance) for every
+            setting on one listener, in SETTINGS order.'''
+        out = []
+        for name,(target,command,convert,tolerance) in SETTINGS.items():
+            if target == listener and name in self.settings:
+                args,expected = convert(self.settings[name])
+                out.append((name,command,args,expected,tolerance))
+        return out
+
+    def apply(self,thetis,window=1,timeout=None):
+        '''Send every setting to the profiler and verify the replies.
+        @param thetis -- a connected THETIS.
+        @param window -- how many commands may wait for a reply at once.
+            1 sends them strictly one at a time. Only raise it once the
+            controller is known to accept pipelined commands.
+        @param timeout -- seconds to wait for each reply. Defaults to the
+            port timeout.
+        @return -- a ProfileReport.
+        '''
+        report = ProfileReport()
+        start = time.monotonic()
+        self._batch(thetis,'PC',self._changes(thetis,'PC',report),window,
+                    timeout,report)
+        wc = self._changes(thetis,'WC',report)
+        if wc:
+            try:
+                with thetis.winch_session():
+                    self._batch(thetis,'WC',wc,window,timeout,report)
+            except TimeoutError:
+                done = {r.name for r in report.results}
+                for name,command,args,expected,tolerance in wc:
+                    if name not in done:
+                        report.results.append(SettingResult(name,'WC',command,
+                            expected,None,False,'winch did not power up'))
+        report.elapsed = time.monotonic() - start
+        return report
+
+    def _changes(self,thetis,listener,report):
+        '''Pass the settings the THETIS state cache already holds and return
+        the ones that still need sending.'''
+        changes = []
+        for setting in self.commands(listener):
+            name,command,args,expected,tolerance = setting
+            if thetis.holds(command,*expected,listener=listener):
+                report.results.append(SettingResult(name,listener,command,
+                    expected,thetis.cached(command,listener),True,None))
+            else:
+                changes.append(setting)
+        return changes
+
+    def _batch(self,thetis,listener,commands,window,timeout,report):
+        queue = collections.deque(commands)
+        pending = collections.OrderedDict() #Command name: setting.
+        while queue or pending:
+            while queue and len(pending) < window:
+                name,command,args,expected,tolerance = queue.popleft()
+                thetis.send_command(command,*args,listener=listener)
+                pending[command.upper()] = (name,command,expected,tolerance)
+            reply = thetis.read_reply(timeout)
+            if not reply:
+                #Nothing more is coming for anything still in flight.
+                for name,command,expected,tolerance in pending.values():
+                    report.results.append(SettingResult(name,listener,command,
+                        expected,None,False,'no reply'))
+                pending.clear()
+                continue
+            if reply.nak:
+                key = reply.args[0].upper() if reply.args else ''
+            else:
+                key = reply.command.upper()
+            if key not in pending:
+                continue #A stray or duplicate reply.
+            name,command,expected,tolerance = pending.pop(key)
+            if reply.nak:
+                reason = 'NAK ' + ','.join(reply.args[1:])
+                report.results.append(SettingResult(name,listener,command,
+                    expected,reply.args,False,reason))
+                continue
+            passed = pwet.matches(expected,reply.args,tolerance)
+            report.results.append(SettingResult(name,listener,command,expected,
+                reply.args,passed,None if passed else 'returned {}'.format(
+                ','.join(reply.args))))
@@ -0,0 +1,172 @@
+'''Continuous CTD depth and pressure switch telemetry from the THETIS profiler.
+
+The CTD is powered once, then a background thread polls D (and PSW every few
+polls) at a fixed rate. Commands go one at a time, as everywhere else in
+THETIS, and anything left on the line by a late reply is cleared before the
+next poll. Samples are stamped when the reply arrives and kept in a
+fixed-size SampleHistory. Subscribers get their own bounded
+queues, with the same overflow policies as martech.reader.
+
+    telemetry = thetis.start_telemetry(rate=5)
+    samples = telemetry.subscribe()
+    for sample in samples:
+        print(sample.timestamp,sample.depth,sample.psw)
+    thetis.stop_telemetry()
+
+While telemetry runs it owns the port, so other THETIS commands must wait
+until it stops. get_ctd_depth and get_psw_state answer from the latest
+sample instead.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import collections
+from martech.reader import DROP_OLDEST,Subscription
+import threading
+import time
+
+#One poll. depth is None if the CTD did not answer, psw is the latest
+#pressure switch state, SUBMERGED, SURFACE or UNKNOWN.
+Sample = collections.namedtuple('Sample',['timestamp','monotonic','depth','psw'])
+
+class SampleHistory():
+    def __init__(self,size=10000):
+        '''The most recent samples, oldest first.
+        @param size -- the most samples kept.
+        '''
+        self.samples = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def append(self,sample):
+        with self._lock:
+            self.samples.append(sample)
+
+    def latest(self,n=None):
+        '''@return -- the newest sample (None if empty), or a list of the
+            newest n samples.'''
+        with self._lock:
+            if n is None:
+                return self.samples[-1] if self.samples else None
+            return list(self.samples)[-n:]
+
+    def since(self,monotonic):
+        '''@return -- a list of samples taken after a time.monotonic() time.'''
+        with self._lock:
+            return [s for s in self.samples if s.monotonic > monotonic]
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+
+    def __len__(self):
+        return len(self.samples)
+
+class Telemetry():
+    def __init__(self,thetis,rate=4.0,psw_every=4,size=10000,timeout=1.0):
+        '''@param thetis -- a connected THETIS.
+        @param rate -- polls per second.
+        @param psw_every -- poll PSW on every nth poll. The switch changes
+            far less often than depth.
+        @param size -- samples kept in the history.
+        @param timeout -- seconds to wait for each reply.
+        '''
+        self.thetis = thetis
+        self.rate = float(rate)
+        self.psw_every = max(1,int(psw_every))
+        self.timeout = timeout
+        self.buffer = SampleHistory(size)
+        self.subscribers = []
+        self.polls = 0
+        self.missed = 0 #Polls the CTD did not answer.
+        self.overruns = 0 #Polls that took longer than 1/rate.
+        self._powered = False
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._thread = None
+
+    def subscribe(self,maxsize=1000,policy=DROP_OLDEST):
+        '''Receive every new sample. See martech.reader.Subscription for
+        the arguments.'''
+        subscription = Subscription(self,maxsize,policy)
+        with self._lock:
+            self.subscribers = self.subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self,subscription):
+        with self._lock:
+            self.subscribers = [s for s in self.subscribers if s is not subscription]
+        subscription._close()
+
+    def latest(self):
+        return self.buffer.latest()
+
+    def start(self):
+        '''Power the CTD, if it is off, and start polling.'''
+        if self.is_running():
+            return
+        if self.thetis.ctd_flag != 1:
+            self._powered = self.thetis.set_ctd_power('ON')
+        self._running.set()
+        self._thread = threading.Thread(target=self._run,daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        '''Stop polling and power the CTD off again if start powered it.'''
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._powered:
+            self.thetis.rs232.clear_buffers() #A late D or PSW reply.
+            self.thetis.set_ctd_power('OFF')
+            self._powered = False
+        for subscription in self.subscribers:
+            subscription._close()
+
+    def is_running(self):
+        return self._running.is_set()
+
+    def _run(self):
+        interval = 1.0/self.rate
+        tick = time.monotonic()
+        psw = 'UNKNOWN'
+        while self._running.is_set():
+            depth,psw = self._poll(psw)
+            self._publish(Sample(time.time(),time.monotonic(),depth,psw))
+            tick += interval
+            wait = tick - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                self.overruns += 1
+                tick = time.monotonic() #Don't try to catch up.
+
+    def _poll(self,psw):
+        '''Ask for D (and PSW), one command at a time.
+        @return -- (depth,psw)
+        '''
+        self.thetis.rs232.clear_buffers() #Replies that came after a deadline.
+        depth = None
+        reply = self._ask('D')
+        if reply and not reply.nak and reply.args:
+            try:
+                depth = float(reply.args[0])
+            except ValueError:
+                pass
+        if self.polls % self.psw_every == 0:
+            reply = self._ask('PSW')
+            if reply and not reply.nak and reply.args[:1] in (('SUBMERGED',),('SURFACE',)):
+                psw = reply.args[0]
+        self.polls += 1
+        if depth is None:
+            self.missed += 1
+        return depth,psw
+
+    def _ask(self,command):
+        self.thetis._send(command)
+        return self.thetis._await(command,time.monotonic() + self.timeout)
+
+    def _publish(self,sample):
+        self.buffer.append(sample)
+        for subscription in self.subscribers:
+            subscription._put(sample,self._running.is_set)
@@ -1,20 +1,155 @@
 '''A base class for communicating with oceanographic sensors over serial.
 
-Author(s): Ian Black
+Author(s): Ian Black, agent
 2020-12-13: Initial commit.
 2021-01-13: Changed class name from RS232 to SERCOM to prevent confusion when
             using RS485. Implemented user defined check time for read_response.
 2021-01-24: Removed connect/disconnect messages because they were annoying.
 2021-01-26: Added check to read_response.
+2026-10-17: Added framed reads that return on a terminator, prompt or regex
+            match instead of waiting for the line to go quiet.
+            Received bytes are read straight into a preallocated ring buffer.
+            Added transcript recording and replay.
+            Added per command latency histograms and traffic counters.
+            Added read_exact and an XMODEM/YMODEM receiver.
+            Framed reads wait on the port's descriptor with select instead
+            of changing the port timeout on every call.
 '''
+import io
+import re
+import select
 import serial
 import time
+from martech.metrics import SerialMetrics
+
+#Common terminators and prompts for framed reads.
+CRLF = b'\r\n'
+SBE_PROMPT = b'S>'
+OPTODE_PROMPT = b'#'
+PWETA_REPLY = re.compile(rb'\$PWETA[^\r\n]*\*[0-9A-Fa-f]{0,2}\r?\n')
+
+def as_terminators(terminator):
+    '''Normalize a terminator argument to a list of byte strings.'''
+    if terminator is None:
+        return []
+    if isinstance(terminator,str):
+        return [terminator.encode()]
+    if isinstance(terminator,(bytes,bytearray)):
+        return [bytes(terminator)]
+    return [t.encode() if isinstance(t,str) else bytes(t) for t in terminator]
+
+def as_pattern(pattern):
+    '''Normalize a pattern argument to a compiled bytes regex, or None.'''
+    if pattern is None:
+        return None
+    if hasattr(pattern,'search'):
+        if isinstance(pattern.pattern,str):
+            return re.compile(pattern.pattern.encode(),pattern.flags & ~re.UNICODE)
+        return pattern
+    if isinstance(pattern,str):
+        pattern = pattern.encode()
+    return re.compile(pattern)
+
+def frame_end(data,scanned,terminators,pattern,start=0,stop=None):
+    '''Find the end of the first complete frame in data[start:stop].
+    @param scanned -- how many bytes of the region were already searched.
+    @return -- the frame length from start, or None if no frame is complete.
+    '''
+    if stop is None:
+        stop = len(data)
+    ends = []
+    for t in terminators:
+        #Only search the newly arrived bytes plus a terminator overlap.
+        i = data.find(t,start + max(0,scanned - len(t) + 1),stop)
+        if i != -1:
+            ends.append(i + len(t) - start)
+    if pattern is not None:
+        match = pattern.search(data,start,stop)
+        if match is not None:
+            ends.append(match.end() - start)
+    if ends:
+        return min(ends)
+    return None
+
+class RingBuffer():
+    def __init__(self,size=65536):
+        '''A preallocated receive buffer that the port reads straight into.
+        Unread bytes live in buffer[head:tail]. When the free space at the
+        end runs out, the unread bytes (normally part of one frame) are moved
+        back to the start, and the buffer only grows if a single frame is
+        larger than it.
+        '''
+        self.buffer = bytearray(size)
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def clear(self):
+        self.head = 0
+        self.tail = 0
+
+    def writable(self,n):
+        '''Get a memoryview of at least n free bytes after the unread data.'''
+        if len(self.buffer) - self.tail < n:
+            count = self.tail - self.head
+            if len(self.buffer) - count < n:
+                grown = bytearray(max(2*len(self.buffer),count + n))
+                grown[:count] = memoryview(self.buffer)[self.head:self.tail]
+                self.buffer = grown
+            else:
+                view = memoryview(self.buffer)
+                view[:count] = view[self.head:self.tail]
+                view.release()
+            self.head = 0
+            self.tail = count
+        return memoryview(self.buffer)[self.tail:self.tail + n]
+
+    def commit(self,n):
+        '''Mark n bytes written into the last writable() view as received.'''
+        self.tail += n
+
+    def write(self,data):
+        self.writable(len(data))[:] = data
+        self.commit(len(data))
+
+    def fill(self,readinto,n):
+        '''Read up to n bytes directly into the buffer.
+        @param readinto -- a callable like io.RawIOBase.readinto.
+        @return -- the number of bytes received.
+        '''
+        received = readinto(self.writable(n)) or 0
+        self.commit(received)
+        return received
+
+    def find(self,terminators,pattern=None,scanned=0):
+        '''Length of the first complete frame in the unread data, or None.'''
+        return frame_end(self.buffer,scanned,terminators,pattern,
+                         self.head,self.tail)
+
+    def take(self,n):
+        '''Consume n bytes and return them as a memoryview into the buffer.
+        The view is only valid until the next read into the buffer.
+        '''
+        view = memoryview(self.buffer)[self.head:self.head + n]
+        self.head += n
+        if self.head == self.tail:
+            self.head = 0
+            self.tail = 0
+        return view
 
 class SERCOM():
     def __init__(self):
         '''Set up a blank canvas at instantiation.'''
         self.sercom = serial.Serial()
-                
+        self.rx = RingBuffer() #Bytes received but not yet returned.
+        self.timed_out = False
+        self.reader = None
+        self.metrics = SerialMetrics() #Latency and traffic, see martech.metrics.
+        self._readinto = self.sercom.readinto
+        self._fd = None #Waited on with select when the port has one.
+
     def connect(self,port,baudrate,
                 bytesize,parity,stopbits,
                 flowcontrol,timeout=1):
@@ -25,13 +160,17 @@ class SERCOM():
         self.sercom.stopbits = stopbits
         self.sercom.parity = parity
         self.sercom.xonxoff = flowcontrol
+        self.metrics.port = port
         try:
             self.sercom.open()
-            return True
         except:
             return False
+        self._use_port()
+        return True
 
     def disconnect(self):
+        self.stop_reader()
+        self.stop_recording()
         try:
             self.sercom.close()
             return True
@@ -40,25 +179,215 @@ class SERCOM():
 
     def clear_buffers(self):
         self.sercom.reset_input_buffer()
-        self.sercom.reset_output_buffer()              
+        self.sercom.reset_output_buffer()
+        self.rx.clear()
+        self.metrics.discard()
+
+    def readinto(self,buffer):
+        '''Read whatever is waiting into a writable buffer without copying.
+        @return -- the number of bytes read. None, or 0, if nothing was
+            waiting on a non-blocking port.
+        '''
+        return self._readinto(buffer)
 
     def write_command(self,command,EOL='\r\n'):
         cmd = str.encode(command + EOL)
         self.sercom.write(cmd)
-    
+        self.metrics.command_sent(command,len(cmd))
+
     def read_bytes(self,check=0.1):
         self._buffer_check(check)
-        data = self.sercom.read(self._buffer_length)
+        if self._buffer_length:
+            self.metrics.bytes_received(self.rx.fill(self._readinto,self._buffer_length))
+        self.metrics.reply_received(self.timed_out)
+        data = bytes(self.rx.take(len(self.rx)))
         return data
-    
-    def read_response(self,check=0.1):
-        data = self.read_bytes(check)
+
+    def read_response(self,check=0.1,until=None,pattern=None,timeout=None):
+        '''Read a response from the sensor.
+        @param check -- the quiet time used when no terminator is given.
+        @param until -- a terminator or prompt (or list of them) that ends
+            the response. When given, the read returns as soon as it arrives.
+        @param pattern -- a regex that ends the response when matched.
+        @param timeout -- the hard deadline for a framed read in seconds.
+        @return -- the response as a string.
+        '''
+        if until is None and pattern is None:
+            data = self.read_bytes(check)
+        else:
+            data = self.read_until(until,timeout,pattern)
         response = data.decode()
         return response
-    
+
+    def read_until(self,terminator=CRLF,timeout=None,pattern=None):
+        '''Read until a terminator, prompt or regex match arrives.
+        @param terminator -- a byte string, or a list of byte strings where
+            the first one found ends the frame. None if only using pattern.
+        @param timeout -- the hard deadline in seconds. Defaults to the port
+            timeout.
+        @param pattern -- an optional regex (bytes) that ends the frame at
+            the end of its first match.
+        @return -- the bytes up to and including the terminator. If the
+            deadline passes first, everything received is returned and
+            timed_out is set to True.
+        '''
+        return bytes(self.read_view(terminator,timeout,pattern))
+
+    def read_view(self,terminator=CRLF,timeout=None,pattern=None):
+        '''Same as read_until, but returns a memoryview of the frame inside
+        the receive buffer instead of a copy. The view is only valid until
+        the next read on this port.
+        '''
+        terminators = as_terminators(terminator)
+        pattern = as_pattern(pattern)
+        if timeout is None:
+            timeout = self.sercom.timeout or 1
+        deadline = time.monotonic() + timeout
+        self.timed_out = False
+        scanned = 0
+        while True:
+            end = self.rx.find(terminators,pattern,scanned)
+            if end is not None:
+                self.metrics.reply_received()
+                return self.rx.take(end)
+            scanned = len(self.rx)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timed_out = True
+                self.metrics.reply_received(True)
+                return self.rx.take(len(self.rx))
+            self._fill(remaining)
+
+    def read_exact(self,n,timeout=None):
+        '''Read exactly n bytes, for binary protocols such as XMODEM.
+        @param timeout -- the hard deadline in seconds. Defaults to the port
+            timeout.
+        @return -- the bytes. Fewer than n are returned, and timed_out is
+            set, if the deadline passes first.
+        '''
+        if timeout is None:
+            timeout = self.sercom.timeout or 1
+        deadline = time.monotonic() + timeout
+        self.timed_out = False
+        while len(self.rx) < n:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timed_out = True
+                return bytes(self.rx.take(len(self.rx)))
+            self._fill(remaining)
+        return bytes(self.rx.take(n))
+
+    def receive_xmodem(self,path,size=None,cancel=None,progress=None,
+                       timeout=10.0,retries=10):
+        '''Receive a file with XMODEM, XMODEM-1K or YMODEM, see
+        martech.modem.
+        @return -- a martech.modem.TransferResult.
+        '''
+        from martech.modem import Receiver
+        receiver = Receiver(self,timeout,retries)
+        return receiver.receive(path,size,cancel,progress)
+
+    def read_frame(self,terminator=CRLF,timeout=None,pattern=None):
+        '''Same as read_until, but decodes the frame to a string.'''
+        return str(self.read_view(terminator,timeout,pattern),'utf-8')
+
+    def start_recording(self,path):
+        '''Record every byte written and received to a transcript file.
+        See martech.transcript for the format.
+        '''
+        from martech.transcript import RecordingSerial,TranscriptWriter
+        self.stop_recording()
+        self.sercom = RecordingSerial(self.sercom,TranscriptWriter(path))
+        self._use_port()
+
+    def stop_recording(self):
+        from martech.transcript import RecordingSerial
+        if isinstance(self.sercom,RecordingSerial):
+            self.sercom,unread = self.sercom.detach()
+            self.rx.write(unread)
+            self._use_port()
+
+    def replay(self,path,speed=1.0):
+        '''Play back a recorded transcript in place of the serial port.
+        Call before connecting. The port settings passed to connect are
+        ignored.
+        @param speed -- scale for the instrument's reply delays. 0 replies
+            instantly.
+        @return -- the ReplaySerial, which counts writes that differ from
+            the recording in its mismatches attribute.
+        '''
+        from martech.transcript import ReplaySerial
+        self.sercom = ReplaySerial(path,speed)
+        self._use_port()
+        return self.sercom
+
+    def start_reader(self,terminator=CRLF,pattern=None):
+        '''Start a background thread that splits incoming data into frames
+        for subscribers. While it runs, it owns the receive side of the port.
+        @return -- the SerialReader. Call subscribe() on it to get frames.
+        '''
+        from martech.reader import SerialReader
+        if self.reader is None:
+            self.reader = SerialReader(self,terminator,pattern)
+        self.reader.start()
+        return self.reader
+
+    def stop_reader(self):
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+
+    def _use_port(self):
+        '''Pick how to read and wait on the current port. A real pyserial
+        port is read straight from its descriptor and waited on with
+        select, so the port timeout is never touched.'''
+        if isinstance(self.sercom,serial.Serial) and self.sercom.is_open and \
+                hasattr(self.sercom,'fd'):
+            self._fd = self.sercom.fd
+            self._readinto = io.FileIO(self._fd,'rb',closefd=False).readinto
+        else:
+            self._fd = None
+            self._readinto = self.sercom.readinto
+
+    def _fill(self,wait=None):
+        '''Block for up to wait seconds (the port timeout by default) until
+        at least one byte arrives, then read everything else already
+        waiting into the receive buffer.'''
+        if wait is None:
+            wait = self.sercom.timeout
+        received = 0
+        waiting = self.sercom.in_waiting
+        if not waiting:
+            first = self._wait_read(wait)
+            if not first:
+                return 0
+            self.rx.write(first)
+            received = 1
+            waiting = self.sercom.in_waiting
+        if waiting:
+            received += self.rx.fill(self._readinto,waiting)
+        self.metrics.bytes_received(received)
+        return received
+
+    def _wait_read(self,wait):
+        '''Read one byte, waiting up to wait seconds for it.'''
+        if self._fd is not None:
+            if not select.select([self._fd],[],[],wait)[0]:
+                return b''
+            #Readable: pyserial raises SerialException if the port is gone.
+            return self.sercom.read(1)
+        #Stand-in ports (recording, replay) have cheap timeouts.
+        port_timeout = self.sercom.timeout
+        self.sercom.timeout = wait
+        try:
+            return self.sercom.read(1)
+        finally:
+            self.sercom.timeout = port_timeout
+
     def _buffer_check(self,check):
         buffer = self.sercom.in_waiting
         start = time.monotonic()
+        self.timed_out = False
         time.sleep(check)
         while True:
             end = time.monotonic()
@@ -69,10 +398,13 @@ class SERCOM():
             else:
                 if (end-start) > 30:
                     print('Forced serial read timeout.')
+                    self._buffer_length = incoming
+                    self.timed_out = True
                     break
                 buffer = incoming
-                time.sleep(check)    
+                time.sleep(check)
+        self.metrics.slept(time.monotonic() - start)
 
     def read_until_byte_string(self,byte_string):
-        incoming = self.sercom.read_until(byte_string).decode()
-        return incoming
\ No newline at end of file
+        incoming = self.read_until(byte_string).decode()
+        return incoming
@@ -0,0 +1,15 @@
+'''Pseudo-terminal instrument simulators for testing and benchmarking the
+drivers without hardware. Each simulator opens a Linux pty and answers the
+commands its driver sends. Point the driver at simulator.port.
+
+    with ThetisSimulator(latency=0.05) as sim:
+        thetis = THETIS(sim.port)
+        thetis.open_connection()
+'''
+from martech.sim.base import Simulator
+from martech.sim.eco import EcoSimulator
+from martech.sim.optode import OptodeSimulator
+from martech.sim.sbe49 import SBE49Simulator
+from martech.sim.sbm import SBMSimulator
+from martech.sim.suna import SunaSimulator
+from martech.sim.thetis import ThetisSimulator
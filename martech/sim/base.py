@@ -0,0 +1,125 @@
+'''The pseudo-terminal plumbing shared by every simulator.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import os
+import pty
+import select
+import threading
+import time
+import tty
+
+class Simulator():
+    def __init__(self,latency=0.0,baudrate=None,terminators=(b'\r\n',b'\r',b'\n')):
+        '''Open a pseudo-terminal and get ready to answer commands.
+        @param latency -- seconds to wait before answering each command.
+        @param baudrate -- pace replies as if sent at this rate. None sends
+            replies as fast as the pty accepts them.
+        @param terminators -- byte strings that end a command.
+        '''
+        self.latency = latency
+        self.baudrate = baudrate
+        self.terminators = terminators
+        self.master,self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self.commands = [] #Every command received, in order.
+        self.rx = bytearray()
+        self._running = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(target=self._serve,daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        os.close(self.master)
+        os.close(self._slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def send(self,data):
+        '''Write a reply to the driver, paced to the simulated baud rate.'''
+        if isinstance(data,str):
+            data = data.encode()
+        if not self.baudrate:
+            self._write(data)
+            return
+        chunk = max(1,self.baudrate//1000) #About one millisecond of data.
+        for i in range(0,len(data),chunk):
+            block = data[i:i + chunk]
+            self._write(block)
+            time.sleep(len(block)*10/self.baudrate)
+
+    def reply(self,data):
+        '''Send a reply after the simulated command latency.'''
+        if self.latency:
+            time.sleep(self.latency)
+        self.send(data)
+
+    def read_raw(self,n=1,timeout=1):
+        '''Read up to n bytes straight from the driver, for binary protocols.
+        @return -- the bytes read, empty on timeout.
+        '''
+        if not self.rx:
+            self._receive(timeout)
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+    def feed(self):
+        '''Handle the bytes from the driver waiting in self.rx. Splits them
+        into commands by default. Override for protocols that need raw
+        bytes.'''
+        while True:
+            end = None
+            for t in self.terminators:
+                i = self.rx.find(t)
+                if i != -1 and (end is None or i < end[0]):
+                    end = (i,len(t))
+            if end is None:
+                break
+            line = bytes(self.rx[:end[0]])
+            del self.rx[:end[0] + end[1]]
+            self.commands.append(line)
+            self.command(line.decode(errors='replace'))
+
+    def command(self,line):
+        '''Answer one command. Subclasses implement the protocol here.'''
+        raise NotImplementedError
+
+    def _write(self,data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self.master,view)
+            view = view[written:]
+
+    def _receive(self,timeout):
+        ready,_,_ = select.select([self.master],[],[],timeout)
+        if not ready:
+            return False
+        try:
+            data = os.read(self.master,4096)
+        except OSError:
+            return False
+        self.rx += data
+        return bool(data)
+
+    def _serve(self):
+        while self._running.is_set():
+            if self._receive(0.05):
+                self.feed()
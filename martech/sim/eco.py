@@ -0,0 +1,105 @@
+'''A simulated Sea-Bird ECO sensor (PAR or Triplet-w).
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import datetime
+import threading
+import time
+from martech.sim.base import Simulator
+
+class EcoSimulator(Simulator):
+    def __init__(self,triplet=False,rate=1.0,memory=1234,**kwargs):
+        '''@param triplet -- answer as a Triplet-w instead of a PAR.
+        @param rate -- samples per second while running.
+        @param memory -- the number of samples in memory.
+        See Simulator for latency and baudrate.
+        '''
+        Simulator.__init__(self,**kwargs)
+        self.triplet = triplet
+        self.rate = rate
+        self.memory = memory
+        self.now = datetime.datetime.now(datetime.timezone.utc)
+        self.settings = {'Ave':'1','Pkt':'0','Set':'0','Rec':'1','Man':'0',
+                         'Int':'00:00:00','Asv':'1'}
+        self.sampling = threading.Event()
+
+    def feed(self):
+        #The stop command is sent without a line ending.
+        i = self.rx.find(b'!!!!')
+        if i != -1:
+            end = i
+            while end < len(self.rx) and self.rx[end:end + 1] == b'!':
+                end += 1
+            del self.rx[i:end]
+            self.commands.append(b'!!!!!')
+            self.sampling.clear()
+            self.reply(self._menu())
+        Simulator.feed(self)
+
+    def command(self,line):
+        line = line.strip()
+        if not line.startswith('$'):
+            return
+        parts = line[1:].split(' ',1)
+        cmd = parts[0]
+        arg = parts[1] if len(parts) > 1 else None
+        if cmd == 'mnu':
+            self.reply(self._menu())
+        elif cmd == 'run':
+            self.sampling.set()
+            threading.Thread(target=self._stream,daemon=True).start()
+        elif cmd == 'sto':
+            self.reply('Settings stored: done\r\n')
+        elif cmd == 'clk':
+            t = datetime.datetime.strptime(arg,'%H%M%S').time()
+            self.now = datetime.datetime.combine(self.now.date(),t)
+            self.reply('Dat {}\r\nClk {}\r\n'.format(self.now.strftime('%m/%d/%y'),
+                                                  self.now.strftime('%H:%M:%S')))
+        elif cmd == 'date':
+            d = datetime.datetime.strptime(arg,'%m%d%y').date()
+            self.now = datetime.datetime.combine(d,self.now.time())
+            self.reply('Dat {}\r\n'.format(self.now.strftime('%m/%d/%y')))
+        elif cmd == 'mvs':
+            self.reply('mvs {}\r\n'.format(arg or 1))
+        elif cmd == 'emc':
+            self.memory = 0
+            self.reply(self._menu())
+        elif cmd in ('rec','Pkt','Set'):
+            key = cmd.capitalize() if cmd == 'rec' else cmd
+            if arg is not None:
+                self.settings[key] = arg
+            self.reply('{} {}\r\n'.format(key,self.settings[key]))
+        elif cmd == 'rls':
+            self.reply(''.join('{} {}\r\n'.format(k,v) for k,v in self.settings.items()))
+        elif cmd == 'get':
+            self.reply(''.join(self._sample() for i in range(3)) + 'etx\r\n')
+
+    def _menu(self):
+        lines = ['Ser {}'.format('BBFL2W-1234' if self.triplet else 'PARS-123'),
+                 'Ver Par 4.01' if not self.triplet else 'Ver Triplet 4.00']
+        for key in ('Ave','Pkt','Set','Rec','Man','Int'):
+            lines.append('{} {}'.format(key,self.settings[key]))
+        lines.append('Dat {}'.format(self.now.strftime('%m/%d/%y')))
+        lines.append('Clk {}'.format(self.now.strftime('%H:%M:%S')))
+        if self.triplet:
+            lines += ['M1d 50','M1s 1.000e-02','M2d 48','M2s 7.200e-06',
+                      'M3d 49','M3s 4.100e-02']
+        else:
+            lines.append('Asv {}'.format(self.settings['Asv']))
+        lines.append('Mem {}'.format(self.memory))
+        return '\r\n'.join(lines) + '\r\n'
+
+    def _sample(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        stamp = now.strftime('%m/%d/%y\t%H:%M:%S')
+        if self.triplet:
+            return '{}\t700\t1234\t695\t250\t460\t88\t512\r\n'.format(stamp)
+        return '{}\t{}\r\n'.format(stamp,4125)
+
+    def _stream(self):
+        self.send('mvs 1\r\n')
+        while self.sampling.is_set():
+            self.send(self._sample())
+            self.memory += 1
+            time.sleep(1/self.rate)
@@ -0,0 +1,52 @@
+'''A simulated Aanderaa 4831 oxygen optode.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import threading
+import time
+from martech.sim.base import Simulator
+
+SETTINGS = [
+    ('Product Name','4831'),('Product Number','4831'),('Serial Number','123'),
+    ('SW Version','4.4.8'),('Interval','2.000000E+00'),('Salinity','0.000000E+00'),
+    ('Enable Sleep','Yes'),('Enable Polled Mode','No'),('Enable Text','Yes'),
+    ('Enable Decimalformat','Yes'),('Enable Rawdata','No'),('Mode','Smart Sensor Terminal'),
+    ]
+
+class OptodeSimulator(Simulator):
+    def __init__(self,rate=0.5,**kwargs):
+        '''@param rate -- samples per second while sampling.
+        See Simulator for latency and baudrate.
+        '''
+        Simulator.__init__(self,**kwargs)
+        self.rate = rate
+        self.sampling = threading.Event()
+
+    def command(self,line):
+        #The driver sends \s for spaces, as in get\sall.
+        cmd = line.strip().replace('\\s',' ').lower()
+        if cmd.startswith('$pwetq'):
+            self.reply('$PWETA,PC,,,,Q*00\r\n')
+        elif cmd == 'stop':
+            self.sampling.clear()
+            self.reply('#')
+        elif cmd == 'start':
+            self.sampling.set()
+            threading.Thread(target=self._stream,daemon=True).start()
+        elif cmd == 'get all':
+            out = ''.join('{}\t4831\t123\t{}\r\n'.format(k,v) for k,v in SETTINGS)
+            self.reply(out + '#')
+        elif cmd == 'get last calibration':
+            self.reply('Calibration Date\t4831\t123\t01/01/21\r\n#')
+        elif cmd == '':
+            if not self.sampling.is_set():
+                self.reply('\r\n#')
+        else:
+            self.reply('*ERROR* Unknown command\r\n#')
+
+    def _stream(self):
+        while self.sampling.is_set():
+            self.send('MEASUREMENT\t4831\t123\tO2Concentration(uM)\t2.7E+02\t'
+                      'AirSaturation(%)\t9.8E+01\tTemperature(Deg.C)\t2.1E+01\r\n')
+            time.sleep(1/self.rate)
@@ -0,0 +1,71 @@
+'''A simulated Sea-Bird SBE 49 FastCAT CTD.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import threading
+import time
+from martech.sim.base import Simulator
+
+STATUS = '''SBE 49 FastCAT V 1.3b  SERIAL NO. 0123
+number of scans to average = 1
+pressure sensor = strain gauge, range = 1000.0
+minimum cond freq = 3000, pump delay = 30 sec
+start sampling on power up = no
+output format = converted decimal
+temperature advance = 0.0625 seconds
+celltm alpha = 0.03
+celltm tau = 7.0
+real-time temperature and conductivity correction disabled
+'''
+
+CALIBRATION = '''SBE 49 FastCAT V 1.3b  SERIAL NO. 0123
+temperature:  01-jan-21
+    TA0 = 7.082178e-05
+    TA1 = 2.715834e-04
+    TA2 = -2.446802e-06
+    TA3 = 1.443924e-07
+conductivity:  01-jan-21
+    G = -1.003516e+00
+    H = 1.424897e-01
+    I = -2.964367e-04
+    J = 4.237165e-05
+pressure S/N = 1234567, range = 1000 psia:  01-jan-21
+    PA0 = 6.119370e-01
+    PA1 = 1.549003e-02
+    PA2 = 7.046208e-10
+'''
+
+class SBE49Simulator(Simulator):
+    def __init__(self,rate=16,**kwargs):
+        '''@param rate -- scans per second while sampling.
+        See Simulator for latency and baudrate.
+        '''
+        Simulator.__init__(self,**kwargs)
+        self.rate = rate
+        self.sampling = threading.Event()
+
+    def command(self,line):
+        cmd = line.strip().upper()
+        if cmd.startswith('$PWETQ'):
+            self.reply('$PWETA,PC,,,,Q*00\r\n')
+        elif cmd == 'STOP':
+            self.sampling.clear()
+            self.reply('S>')
+        elif cmd == 'START':
+            self.sampling.set()
+            threading.Thread(target=self._stream,daemon=True).start()
+        elif cmd == 'DS':
+            self.reply(STATUS.replace('\n','\r\n') + 'S>')
+        elif cmd == 'DCAL':
+            self.reply(CALIBRATION.replace('\n','\r\n') + 'S>')
+        elif cmd == '':
+            if not self.sampling.is_set():
+                self.reply('\r\nS>')
+        else:
+            self.reply('?cmd S>')
+
+    def _stream(self):
+        while self.sampling.is_set():
+            self.send('  12.3456,  3.45678,   10.123,  33.4567\r\n')
+            time.sleep(1/self.rate)
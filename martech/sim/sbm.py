@@ -0,0 +1,70 @@
+'''A simulated RS485 bus of Bluefin 1.5 kWh SmallBattMod batteries.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+from martech.sim.base import Simulator
+
+class SBMSimulator(Simulator):
+    def __init__(self,addresses=(0,),**kwargs):
+        '''@param addresses -- the decimal addresses of batteries on the bus.
+        See Simulator for latency and baudrate.
+        '''
+        Simulator.__init__(self,**kwargs)
+        self.batteries = {}
+        for i,address in enumerate(addresses):
+            self.batteries['{:02x}'.format(address)] = {
+                'state':'f','error':'-','voltage':29.10,'current':0.0,
+                'temperature':21.5,'water':0,'sleep':0,'sn':5678 + i,
+                'cells':[3.630,3.641,3.652,3.638,3.644,3.649,3.635,3.660],
+                }
+
+    def command(self,line):
+        line = line.strip()
+        if not line.startswith('#') or len(line) < 4:
+            return
+        address = line[1:3]
+        op = line[3:]
+        if address == '00' and op.startswith('?'):
+            self._config(op)
+            return
+        battery = self.batteries.get(address)
+        if battery is None:
+            return #Nobody on the bus answers.
+        cells = battery['cells']
+        if op == 'q0':
+            self.reply('${}q0 {}{} {:.2f} {:.2f} {:.1f} {:.3f} {:.3f} {} {:.1f} '
+                       '00:10:05 0 0 0 {}\r\n'.format(
+                           address,battery['state'],battery['error'],
+                           battery['voltage'],battery['current'],
+                           battery['temperature'],min(cells),max(cells),
+                           battery['water'],battery['voltage']*battery['current'],
+                           battery['sleep']))
+        elif op == 'q1':
+            self.reply('${}q1 {}\r\n'.format(address,' '.join('{:.3f}'.format(c) for c in cells)))
+        elif op == 'z0':
+            self.reply('${}z0 0 m 1234 {} 33 20 SBM1.5 1.2.3 \r\n'.format(address,battery['sn']))
+        elif op == 'bf':
+            battery['state'] = 'f'
+            battery['error'] = '-'
+        elif op.startswith('bs'):
+            battery['sleep'] = int(op[2:].strip() or 0)
+        elif op.startswith('b') and op[1:].isdigit():
+            cell = int(op[1:])
+            ok = 0 <= cell < len(cells)
+            if ok:
+                battery['state'] = 'b'
+                cells[cell] = round(cells[cell] - 0.005,3)
+            self.reply('${}b{} {}\r\n'.format(address,cell,1 if ok else 0))
+
+    def _config(self,op):
+        '''Commands to the broadcast address, which only make sense with one
+        battery on the bus.'''
+        if len(self.batteries) != 1:
+            return
+        address = list(self.batteries)[0]
+        if op == '?0':
+            self.reply('$00?0 {} \r\n'.format(address))
+        elif op.startswith('?8'):
+            new = op[2:].strip()
+            self.batteries = {new:self.batteries[address]}
@@ -0,0 +1,192 @@
+'''A simulated Sea-Bird SUNA V2 nitrate sensor.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import datetime
+import os
+import threading
+import time
+from martech.sim.base import Simulator
+
+SOH = b'\x01'
+STX = b'\x02'
+EOT = b'\x04'
+ACK = b'\x06'
+NAK = b'\x15'
+CAN = b'\x18'
+
+PIXELS = 256
+
+#Data files on the sensor, as name: size in bytes.
+DEFAULT_FILES = {
+    'D2021001.CSV': 40000,
+    'D2021002.CSV': 65000,
+    }
+
+def crc16(data,crc=0):
+    '''CRC-16/XMODEM (polynomial 0x1021, initial value 0).'''
+    for b in data:
+        crc ^= b << 8
+        for i in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+class SunaSimulator(Simulator):
+    def __init__(self,files=None,serial_number='1234',block_size=128,
+                 rate=1.0,**kwargs):
+        '''@param files -- a dict of data filename to size (random contents)
+            or bytes.
+        @param serial_number -- the serial number reported by get serialno.
+        @param block_size -- XMODEM block size the sensor sends, 128 or 1024.
+        @param rate -- frames per second while sampling.
+        See Simulator for latency and baudrate.
+        '''
+        Simulator.__init__(self,**kwargs)
+        self.serial_number = serial_number
+        self.block_size = block_size
+        self.rate = rate
+        self.files = {}
+        if files is None:
+            files = DEFAULT_FILES
+        for name,content in files.items():
+            if isinstance(content,int):
+                content = os.urandom(content)
+            self.files[name] = content
+        self.calfiles = {'SNA{}A.CAL'.format(serial_number):b'H,File creation time\r\n' * 60}
+        self.logs = {'SYSLOG.LOG':b'2021-01-01 00:00:00 Boot\r\n' * 40,
+                     'LAMPUSE.LOG':b'2021-01-01 00:00:00 1.0\r\n' * 40}
+        self.values = {'serialno':serial_number,'senstype':'SUNA','sensvers':'V2',
+                       '--diskfree':'1900000000','--disktotal':'2000000000',
+                       'activecalfile':'SNA{}A.CAL'.format(serial_number),
+                       '--extpower':'On','lamptime':'360000','cfg':'OperMode=Continuous'}
+        self.sampling = threading.Event()
+        self.transfers = [] #(filename,blocks,retries) for each XMODEM send.
+
+    def feed(self):
+        #Five dollar signs wake the sensor up from sampling.
+        if b'$$$' in self.rx:
+            self.sampling.clear()
+        Simulator.feed(self)
+
+    def command(self,line):
+        line = line.strip()
+        lower = line.lower()
+        if lower.startswith('$$$'):
+            self.reply('\r\nSUNA> ')
+        elif lower.startswith('get '):
+            key = line[4:].strip()
+            if key == 'clock':
+                now = datetime.datetime.now(datetime.timezone.utc)
+                value = now.strftime('%Y/%m/%d %H:%M:%S')
+            else:
+                value = self.values.get(key)
+            if value is None:
+                self.reply('Error unknown parameter\r\nSUNA> ')
+            else:
+                self.reply('Ok {}\r\nSUNA> '.format(value))
+        elif lower.startswith('set '):
+            self.reply('Ok\r\nSUNA> ')
+        elif lower == '$info firmwareversion':
+            self.reply('Ok 2.6.1\r\nSUNA> ')
+        elif lower == 'list data':
+            self.reply(self._listing(self.files))
+        elif lower == 'list cal':
+            self.reply(self._listing(self.calfiles))
+        elif lower.startswith('send '):
+            parts = line.split()
+            kind = parts[1].upper()
+            name = parts[2].upper() if len(parts) > 2 else ''
+            store = {'DATA':self.files,'CAL':self.calfiles,'LOG':self.logs}.get(kind,{})
+            if name not in store:
+                self.reply('Error file not found\r\nSUNA> ')
+                return
+            self.reply('Ok\r\n')
+            self._xmodem_send(name,store[name])
+        elif lower == 'exit':
+            self.sampling.set()
+            threading.Thread(target=self._stream,daemon=True).start()
+        elif lower == 'selftest':
+            self.reply('Selftest OK\r\nSUNA> ')
+        elif lower == '':
+            self.reply('\r\nSUNA> ')
+        else:
+            self.reply('Error unknown command\r\nSUNA> ')
+
+    def _listing(self,files):
+        out = ''
+        for name,content in sorted(files.items()):
+            out += 'File\t{}\t2021-01-01 00:00:00\t{}\r\n'.format(len(content),name)
+        return out + 'SUNA> '
+
+    def _xmodem_send(self,name,data,timeout=10):
+        '''Send data to the driver with XMODEM. CRC mode is used when the
+        receiver asks for it with C, otherwise the arithmetic checksum.'''
+        crc = None
+        end = time.monotonic() + timeout
+        while crc is None:
+            c = self.read_raw(1,timeout=1)
+            if c == b'C':
+                crc = True
+            elif c == NAK:
+                crc = False
+            elif time.monotonic() > end:
+                return
+        size = self.block_size
+        sequence = 1
+        retries = 0
+        blocks = 0
+        for offset in range(0,len(data),size):
+            block = data[offset:offset + size].ljust(size,b'\x1a')
+            header = (STX if size == 1024 else SOH) + bytes([sequence & 0xFF,0xFF - (sequence & 0xFF)])
+            if crc:
+                trailer = crc16(block).to_bytes(2,'big')
+            else:
+                trailer = bytes([sum(block) & 0xFF])
+            for attempt in range(10):
+                self.send(header + block + trailer)
+                answer = self.read_raw(1,timeout=timeout)
+                if answer == ACK:
+                    break
+                if answer == CAN:
+                    return
+                retries += 1
+            else:
+                return
+            blocks += 1
+            sequence += 1
+        for attempt in range(10):
+            self.send(EOT)
+            if self.read_raw(1,timeout=timeout) == ACK:
+                break
+        self.transfers.append((name,blocks,retries))
+        self.rx.clear()
+        self.reply('\r\nSUNA> ')
+
+    def frame(self,dark=False,nitrate=12.5):
+        '''One full ASCII frame: header, date, time, nitrate, nitrogen,
+        absorbances, bromide trace, spectrum statistics, 256 channels,
+        housekeeping, fit results, CTD fields and checksum.'''
+        now = datetime.datetime.now(datetime.timezone.utc)
+        hours = now.hour + now.minute/60 + (now.second + now.microsecond/1e6)/3600
+        header = '{}{}'.format('SATSDF' if dark else 'SATSLF',self.serial_number)
+        spectrum = [800 if dark else 15000 + 40*i % 9000 for i in range(PIXELS)]
+        fields = [header,now.strftime('%Y%j'),'{:.6f}'.format(hours),
+                  '{:.2f}'.format(0 if dark else nitrate),
+                  '{:.4f}'.format(0 if dark else nitrate*0.014007),
+                  '0.1234','0.0456','0.00','{}'.format(sum(spectrum)//PIXELS),'800','1']
+        fields += [str(v) for v in spectrum]
+        fields += ['21.3','21.1','22.0','3600','8.5','12.0','11.9','5.0','350',
+                   '0.00','0.00','0.01','0.00','0.0005','0','0','0','0']
+        body = ','.join(fields)
+        return body + ',{}\r\n'.format(sum(body.encode()) & 0xFF)
+
+    def _stream(self):
+        count = 0
+        while self.sampling.is_set():
+            self.send(self.frame(dark=(count % 10 == 0)))
+            count += 1
+            time.sleep(1/self.rate)
@@ -0,0 +1,340 @@
+'''A simulated SBS Thetis profiler controller (PC) and winch controller (WC).
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import datetime
+import os
+import time
+from martech.sim.base import Simulator
+
+#Files in a fresh profiler working directory, as name: size in bytes.
+DEFAULT_FILES = {
+    '60268097.ACD': 3000,
+    '60268097.ACS': 120000,
+    '60268097.DBG': 200,
+    '60268097.PPB': 24000,
+    '60268097.PPD': 900,
+    '60268097.SNA': 1500,
+    '60268097.SND': 400,
+    }
+
+def checksum(body):
+    '''XOR of the $ and every byte up to the *, as the firmware does.'''
+    value = 0x24
+    for b in body:
+        value ^= b
+    return value
+
+def sentence(body):
+    '''Wrap a sentence body in $...*CS\\r\\n.'''
+    if isinstance(body,str):
+        body = body.encode()
+    return b'$' + body + '*{:02X}\r\n'.format(checksum(body)).encode()
+
+class ThetisSimulator(Simulator):
+    def __init__(self,files=None,profiler_id='WLP-011',winch_ready=0.5,
+                 chunk=512,**kwargs):
+        '''@param files -- a dict of filename to size (random contents) or
+            bytes for the PC working directory.
+        @param profiler_id -- the id reported by VER.
+        @param winch_ready -- seconds the winch takes to power up.
+        @param chunk -- default PWETB payload size for file transfers.
+        See Simulator for latency and baudrate.
+        '''
+        Simulator.__init__(self,**kwargs)
+        self.profiler_id = profiler_id
+        self.winch_ready = winch_ready
+        self._winch_boot = 0.0
+        self.settings = {'BUF':str(chunk),'BD':'0.7','PKD':'0.0','HLD':'1',
+                         'num':'0','RD':'1.0','GGF':'0','BLV':'28.5,28.5',
+                         'SCS':'250,5000,150000,2500','WHS':'1','LOG':'0'}
+        self.winch = {'STA':'0.7','SLSF':'1.45','DO':'0.6','B':'1'}
+        self.power = {'WP':False,'CTDP':False,'INSP':False,'GPSP':False,
+                      'PMP':False,'ATMP':True}
+        self.depth = 0.25
+        self.submerged = False
+        self.batteries = {1:'#01 d 29.10 -0.52 21.3 3.637 3.641 0',
+                          2:'#02 d 29.08 -0.49 21.1 3.634 3.640 0'}
+        self.pico = False
+        self.bad_checksums = 0 #Commands dropped for a wrong checksum.
+        self.garble = 0 #File frames still to send with a corrupted byte.
+        self.lose = set() #File frame indexes to leave out once, as if lost.
+        self.acsb = 83
+        #Each listener has a tree of directories, each a dict of files.
+        root = {}
+        if files is None:
+            files = DEFAULT_FILES
+        for name,content in files.items():
+            if isinstance(content,int):
+                content = os.urandom(content).replace(b'$',b'#').replace(b'*',b'+')
+            root[name] = content
+        self.fs = {'PC':{'':root},'WC':{'':{}}}
+        self.cwd = {'PC':'','WC':''}
+
+    def command(self,line):
+        line = line.strip()
+        if self.pico:
+            self._pico_command(line)
+            return
+        if line.startswith('$PWETQ'):
+            self.reply(sentence('PWETA,PC,,,,Q'))
+            return
+        if not line.startswith('$PWETC'):
+            return
+        body,star,digits = line[1:].partition('*')
+        if star and digits[:2].upper() != '{:02X}'.format(checksum(body.encode())):
+            self.bad_checksums += 1
+            return #Dropped, like any other garbled sentence.
+        fields = body.split(',')
+        listener = fields[1]
+        cmd = fields[5] if len(fields) > 5 else ''
+        args = fields[7:]
+        if listener == 'WC' and not self._winch_on():
+            self.reply(sentence('PWETA,WC,,,,NAK,2,{},WC OFF'.format(cmd)))
+            return
+        handler = getattr(self,'_cmd_' + cmd.upper(),None)
+        if handler is None:
+            self.reply(sentence('PWETA,{},,,,NAK,1,{}'.format(listener,cmd)))
+            return
+        handler(listener,cmd,args)
+
+    def _ack(self,listener,cmd,args):
+        text = 'PWETA,{},,,,{},{}'.format(listener,cmd,len(args))
+        if args:
+            text += ',' + ','.join(args)
+        self.reply(sentence(text))
+
+    def _winch_on(self):
+        return self.power['WP'] and time.monotonic() >= self._winch_boot
+
+#-----------------------------Controller---------------------------------------#
+    def _cmd_VER(self,listener,cmd,args):
+        self.reply(sentence('PWETA,PC,,,{},VER,5,CF0123456,PICO2,BIOS1.10,'
+                            'FW3.21,2019-06-14'.format(self.profiler_id)))
+
+    def _cmd_DATE(self,listener,cmd,args):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        tzo = args[2] if len(args) > 2 else '0'
+        self._ack(listener,cmd,[now.strftime('%m/%d/%Y'),now.strftime('%H:%M:%S'),tzo])
+
+    def _setting(self,listener,cmd,args):
+        store = self.winch if listener == 'WC' else self.settings
+        if args:
+            store[cmd] = ','.join(args)
+        self._ack(listener,cmd,store.get(cmd,'').split(','))
+
+    _cmd_BD = _cmd_PKD = _cmd_HLD = _cmd_NUM = _cmd_RD = _cmd_GGF = _setting
+    _cmd_BLV = _cmd_SCS = _cmd_BUF = _cmd_LOG = _setting
+    _cmd_STA = _cmd_SLSF = _cmd_DO = _cmd_B = _setting
+
+    def _cmd_WHS(self,listener,cmd,args):
+        if args:
+            self.settings['WHS'] = args[0]
+        self._ack(listener,cmd,[self.settings['WHS'],'0','0','0'])
+
+    def _power(self,name,state,listener,cmd):
+        self.power[name] = state
+        self._ack(listener,cmd,['ON' if state else 'OFF'])
+
+    def _cmd_WP(self,listener,cmd,args):
+        state = args[0] == '1'
+        if state and not self.power['WP']:
+            #WC commands are refused until the winch has booted.
+            self._winch_boot = time.monotonic() + self.winch_ready
+        self.power['WP'] = state
+        self._ack(listener,cmd,['ON' if state else 'OFF'])
+
+    def _cmd_CTDP(self,listener,cmd,args):
+        self._power('CTDP',args[0] == '1',listener,cmd)
+
+    def _cmd_INSP(self,listener,cmd,args):
+        self._power('INSP',args[0] == '1',listener,cmd)
+
+    def _cmd_GPSP(self,listener,cmd,args):
+        self._power('GPSP',args[0] == '1',listener,cmd)
+
+    def _cmd_ATMP(self,listener,cmd,args):
+        self._power('ATMP',args[0] == '1',listener,cmd)
+
+    def _cmd_PWR(self,listener,cmd,args):
+        self.power[args[0]] = args[1] == '1'
+        self._ack(listener,cmd,[args[0],'ON' if args[1] == '1' else 'OFF'])
+
+    def _cmd_D(self,listener,cmd,args):
+        if not self.power['CTDP']:
+            self.reply(sentence('PWETA,PC,,,,NAK,2,D,CTD OFF'))
+            return
+        self._ack(listener,cmd,['{:.3f}'.format(self.depth)])
+
+    def _cmd_PSW(self,listener,cmd,args):
+        self._ack(listener,cmd,['SUBMERGED' if self.submerged else 'SURFACE'])
+
+    def _cmd_BFS(self,listener,cmd,args):
+        address = int(args[0])
+        if address not in self.batteries:
+            self._ack(listener,cmd,[args[0],'LOCKED'])
+            return
+        self._ack(listener,cmd,[args[0],self.batteries[address]])
+
+    def _cmd_FREE(self,listener,cmd,args):
+        used = sum(len(f) for d in self.fs[listener].values() for f in d.values())
+        self._ack(listener,cmd,[str(4000000000 - used)])
+
+    def _cmd_TOTAL(self,listener,cmd,args):
+        self._ack(listener,cmd,['4000000000'])
+
+    def _cmd_BREAK(self,listener,cmd,args):
+        self.rx.clear()
+
+    def _cmd_PAS(self,listener,cmd,args):
+        self._ack(listener,cmd,args)
+
+    def _cmd_Q(self,listener,cmd,args):
+        self.pico = True
+        self.reply('\r\nPicoDOS>')
+
+    _cmd_EXIT = _cmd_Q
+
+    def _pico_command(self,line):
+        if line == 'APP':
+            self.pico = False
+            self.reply('APP\r\n')
+        elif line == 'SET':
+            self.reply('SET\r\nPKG.ACSB={}\r\nPKG.BUF=512\r\nPicoDOS>'.format(self.acsb))
+        elif line.startswith('SET PKG.ACSB='):
+            self.acsb = int(line.split('=')[1])
+            self.reply('{}\r\nPKG.ACSB={}\r\nPicoDOS>'.format(line,self.acsb))
+        elif line == 'SET PKG.ACSB':
+            self.reply('{}\r\nPKG.ACSB={}\r\nPicoDOS>'.format(line,self.acsb))
+        else:
+            self.reply('\r\nPicoDOS>')
+
+#-----------------------------File system--------------------------------------#
+    def _dir(self,listener):
+        return self.fs[listener][self.cwd[listener]]
+
+    def _path(self,listener,name):
+        name = name.lstrip('.').lstrip('\\')
+        if self.cwd[listener]:
+            return self.cwd[listener] + '\\' + name
+        return name
+
+    def _cmd_PWD(self,listener,cmd,args):
+        cwd = self.cwd[listener]
+        self._ack(listener,cmd,['\\' + cwd if cwd else ''])
+
+    def _cmd_CD(self,listener,cmd,args):
+        target = args[0] if args else ''
+        if target == '..':
+            cwd = self.cwd[listener]
+            self.cwd[listener] = cwd.rsplit('\\',1)[0] if '\\' in cwd else ''
+        else:
+            path = self._path(listener,target)
+            if path not in self.fs[listener]:
+                self.reply(sentence('PWETA,{},,,,NAK,2,CD,C'.format(listener)))
+                return
+            self.cwd[listener] = path
+        cwd = self.cwd[listener]
+        self._ack(listener,cmd,['\\' + cwd.split('\\')[-1] if cwd else ''])
+
+    def _cmd_MKD(self,listener,cmd,args):
+        path = self._path(listener,args[0])
+        if path in self.fs[listener]:
+            self.reply(sentence('PWETA,{},,,,NAK,2,MKD,E'.format(listener)))
+            return
+        self.fs[listener][path] = {}
+        self.reply(sentence('PWETA,{},,,,MKD'.format(listener)))
+
+    def _cmd_RMD(self,listener,cmd,args):
+        path = self._path(listener,args[0])
+        if self.fs[listener].get(path) != {}:
+            self.reply(sentence('PWETA,{},,,,NAK,2,RMD,E'.format(listener)))
+            return
+        del self.fs[listener][path]
+        self.reply(sentence('PWETA,{},,,,RMD'.format(listener)))
+
+    def _cmd_DEL(self,listener,cmd,args):
+        files = self._dir(listener)
+        if args[0] not in files:
+            self.reply(sentence('PWETA,{},,,,NAK,2,DEL,{}'.format(listener,args[0])))
+            return
+        del files[args[0]]
+        self._ack(listener,cmd,args)
+
+    def _cmd_DIR(self,listener,cmd,args):
+        out = b''
+        if args and args[0] == '#.#':
+            for name,content in sorted(self._dir(listener).items()):
+                out += sentence('PWETA,{},,,,DIR,2,\\{},{}'.format(
+                    listener,name,len(content)))
+        else:
+            prefix = self.cwd[listener] + '\\' if self.cwd[listener] else ''
+            for path in sorted(self.fs[listener]):
+                if path.startswith(prefix) and path != self.cwd[listener] \
+                        and '\\' not in path[len(prefix):]:
+                    out += sentence('PWETA,{},,,,DIR,1,\\{}'.format(listener,path[len(prefix):]))
+        out += sentence('PWETA,{},,,,DIR,DONE'.format(listener))
+        self.reply(out)
+
+    def _cmd_GET(self,listener,cmd,args):
+        self._transfer(listener,cmd,args[0])
+
+    def _cmd_GDF(self,listener,cmd,args):
+        #Decimated files are served from their full file name's partner.
+        name = args[0]
+        decimated = {'B':'D','A':'D','S':'D'}
+        self._transfer(listener,cmd,name[:-1] + decimated.get(name[-1],name[-1]))
+
+    def _cmd_GWF(self,listener,cmd,args):
+        self._transfer('WC',cmd,args[0])
+
+    def _transfer(self,listener,cmd,name):
+        files = self._dir(listener)
+        if name not in files:
+            self.reply(sentence('PWETA,{},,,,NAK,2,{},{}'.format(listener,cmd,name)))
+            return
+        content = files[name]
+        chunk = int(self.settings['BUF'])
+        offset = 0
+        index = 0
+        while offset < len(content):
+            payload = content[offset:offset + chunk]
+            head = 'PWETB,{},,,,{},{},'.format(listener,cmd,index).encode()
+            if index in self.lose:
+                self.lose.discard(index)
+                offset += len(payload)
+                index += 1
+                continue
+            frame = sentence(head + payload)
+            if self.garble:
+                self.garble -= 1
+                frame = frame[:len(head) + 1] + bytes([frame[len(head) + 1] ^ 0x01]) + \
+                        frame[len(head) + 2:]
+            self.reply(frame)
+            reply = self._wait_for_ack()
+            if reply is None:
+                return
+            if reply == 'NAK':
+                continue #Send the same frame again.
+            offset += len(payload)
+            index += 1
+        self.reply(sentence('PWETA,{},,,,{},DONE'.format(listener,cmd)))
+
+    def _wait_for_ack(self,timeout=5):
+        '''Block the transfer until the host acknowledges the last chunk.
+        @return -- 'ACK', 'NAK' to resend it, or None on timeout.
+        '''
+        while True:
+            i = self.rx.find(b'\n')
+            if i != -1:
+                line = bytes(self.rx[:i + 1])
+                del self.rx[:i + 1]
+                self.commands.append(line.strip())
+                if b',NAK' in line:
+                    return 'NAK'
+                if b'ACK' in line:
+                    return 'ACK'
+                continue
+            if not self._receive(timeout):
+                return None
@@ -0,0 +1,284 @@
+'''Record serial sessions to a compact binary transcript and replay them.
+
+Recording wraps the pyserial port of a SERCOM instance so every write and
+every received byte is stored with its monotonic time. Replay swaps in a
+ReplaySerial that plays the instrument's side of the session back. Each
+reply is released after the same delay from the command that preceded it,
+optionally scaled, so new driver code can be benchmarked deterministically
+against a real field session.
+
+    thetis.rs232.start_recording('qct.mtr')
+    ...run the QCT...
+    thetis.rs232.stop_recording()
+
+    thetis = THETIS('replay')
+    thetis.rs232.replay('qct.mtr',speed=0)
+    thetis.open_connection()
+
+Transcript layout: the 4 byte magic MTRC, a version byte and the wall clock
+start time as a little endian double, then one record per event made of a
+kind byte (T for written, R for received), the seconds since the start as a
+double, the payload length as an unsigned int and the payload.
+
+Author(s): agent
+2026-10-17: Initial commit.
+'''
+import struct
+import threading
+import time
+
+MAGIC = b'MTRC'
+VERSION = 1
+TX = b'T'
+RX = b'R'
+
+_HEADER = struct.Struct('<4sBd')
+_RECORD = struct.Struct('<cdI')
+
+class TranscriptWriter():
+    def __init__(self,path):
+        self.file = open(path,'wb')
+        self.start = time.monotonic()
+        self.file.write(_HEADER.pack(MAGIC,VERSION,time.time()))
+
+    def record(self,kind,data):
+        if not data:
+            return
+        t = time.monotonic() - self.start
+        self.file.write(_RECORD.pack(kind,t,len(data)))
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+def read_transcript(path):
+    '''Read a transcript.
+    @return -- the wall clock start time and a list of (kind,t,data).
+    '''
+    records = []
+    with open(path,'rb') as f:
+        magic,version,wall_start = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError('{} is not a serial transcript.'.format(path))
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                break
+            kind,t,length = _RECORD.unpack(head)
+            records.append((kind,t,f.read(length)))
+    return wall_start,records
+
+def summarize(path):
+    '''Break a recorded session down into where the time went.
+    @return -- a dict with the session duration, bytes each way, the number
+        of writes, the time spent waiting for the instrument to start
+        replying after a write, and the time between the end of a reply
+        and the next write (driver sleeps and processing).
+    '''
+    wall_start,records = read_transcript(path)
+    summary = {'duration':0.0,'bytes_tx':0,'bytes_rx':0,'writes':0,
+               'instrument_wait':0.0,'host_wait':0.0}
+    last_tx = None
+    last_rx = None
+    replied = True
+    for kind,t,data in records:
+        if kind == TX:
+            summary['bytes_tx'] += len(data)
+            summary['writes'] += 1
+            if last_rx is not None and replied and last_tx is not None:
+                summary['host_wait'] += max(0.0,t - last_rx)
+            last_tx = t
+            replied = False
+        else:
+            summary['bytes_rx'] += len(data)
+            if not replied and last_tx is not None:
+                summary['instrument_wait'] += t - last_tx
+                replied = True
+            last_rx = t
+        summary['duration'] = t
+    return summary
+
+class RecordingSerial():
+    def __init__(self,port,writer):
+        '''Pass everything through to a pyserial port, recording the data.
+        A thread takes bytes off the port as they arrive so the transcript
+        has true arrival times, not the times the driver got around to
+        reading them.
+        '''
+        object.__setattr__(self,'_port',port)
+        object.__setattr__(self,'_writer',writer)
+        object.__setattr__(self,'timeout',port.timeout)
+        object.__setattr__(self,'_buffer',bytearray())
+        object.__setattr__(self,'_arrived',threading.Condition())
+        object.__setattr__(self,'_running',threading.Event())
+        object.__setattr__(self,'_thread',threading.Thread(target=self._pump,daemon=True))
+        port.timeout = 0.05
+        self._running.set()
+        self._thread.start()
+
+    def __getattr__(self,name):
+        return getattr(self._port,name)
+
+    def __setattr__(self,name,value):
+        if name == 'timeout':
+            object.__setattr__(self,name,value)
+        else:
+            setattr(self._port,name,value)
+
+    def detach(self):
+        '''Stop recording and give back the port with anything unread.'''
+        self._running.clear()
+        self._thread.join()
+        self._writer.close()
+        self._port.timeout = self.timeout
+        return self._port,bytes(self._buffer)
+
+    def _pump(self):
+        while self._running.is_set():
+            try:
+                data = self._port.read(max(1,self._port.in_waiting))
+            except Exception:
+                break
+            if data:
+                with self._arrived:
+                    self._writer.record(RX,data)
+                    self._buffer += data
+                    self._arrived.notify_all()
+
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+
+    def read(self,size=1):
+        end = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._arrived:
+            while len(self._buffer) < size:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._arrived.wait(remaining)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def readinto(self,buffer):
+        #Whatever has arrived, as a real port would, not a full buffer.
+        data = self.read(min(len(buffer),max(1,self.in_waiting)))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def write(self,data):
+        with self._arrived:
+            self._writer.record(TX,bytes(data))
+        return self._port.write(data)
+
+    def reset_input_buffer(self):
+        with self._arrived:
+            self._buffer.clear()
+        self._port.reset_input_buffer()
+
+class ReplaySerial():
+    def __init__(self,path,speed=1.0):
+        '''Stand in for a pyserial port, playing back a transcript.
+        @param speed -- scale for the instrument's reply delays. 1 keeps the
+            recorded timing, 0 releases each reply as soon as its command is
+            written.
+        '''
+        self.wall_start,records = read_transcript(path)
+        self.speed = speed
+        self.port = path
+        self.baudrate = None
+        self.bytesize = None
+        self.parity = None
+        self.stopbits = None
+        self.xonxoff = None
+        self.timeout = None
+        self.is_open = False
+        self.mismatches = 0 #Writes that differ from the recording.
+        #Group the received data under the write that preceded it.
+        self._groups = [[]]
+        self._expected = [None]
+        last_tx = 0.0
+        for kind,t,data in records:
+            if kind == TX:
+                self._groups.append([])
+                self._expected.append(data)
+                last_tx = t
+            else:
+                self._groups[-1].append((t - last_tx,data))
+        self._group = 0
+        self._queue = []
+        self._buffer = bytearray()
+
+    def open(self):
+        self.is_open = True
+        self._start_group(0)
+
+    def close(self):
+        self.is_open = False
+
+    def _start_group(self,index):
+        '''Schedule the replies to the write at index. Anything still due
+        from the previous write keeps its place.'''
+        self._group = index
+        now = time.monotonic()
+        if index < len(self._groups):
+            for delay,data in self._groups[index]:
+                self._queue.append((now + delay*self.speed,data))
+            self._queue.sort(key=lambda item: item[0])
+
+    def _release(self):
+        now = time.monotonic()
+        while self._queue and self._queue[0][0] <= now:
+            self._buffer += self._queue.pop(0)[1]
+
+    def _next_due(self):
+        if not self._queue:
+            return None
+        return self._queue[0][0]
+
+    @property
+    def in_waiting(self):
+        self._release()
+        return len(self._buffer)
+
+    def read(self,size=1):
+        end = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            self._release()
+            if len(self._buffer) >= size:
+                break
+            due = self._next_due()
+            if due is None:
+                break #Nothing more will arrive before the next write.
+            if end is not None and due > end:
+                time.sleep(max(0.0,end - time.monotonic()))
+                self._release()
+                break
+            time.sleep(max(0.0,due - time.monotonic()))
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readinto(self,buffer):
+        data = self.read(min(len(buffer),max(1,self.in_waiting)))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def write(self,data):
+        data = bytes(data)
+        index = self._group + 1
+        if index < len(self._expected) and self._expected[index] != data:
+            self.mismatches += 1
+        self._start_group(index)
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._release()
+        self._buffer = bytearray()
+
+    def reset_output_buffer(self):
+        pass
+
+    def flush(self):
+        pass
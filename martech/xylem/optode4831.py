@@ -1,4 +1,4 @@
-from martech.sercom import SERCOM
+from martech.sercom import SERCOM,OPTODE_PROMPT
 import time
 
 class OPTODE4831():
@@ -27,7 +27,7 @@ class OPTODE4831():
         while True:
             self.rs232.write_command("STOP",EOL='\r\n')
             self.rs232.write_command("",EOL='\r\n')
-            response = self.rs232.read_response()
+            response = self.rs232.read_response(until=OPTODE_PROMPT)
             if "#" in response:
                 self._force_new_command_prompt()
                 self.rs232.read_response()
@@ -39,7 +39,7 @@ class OPTODE4831():
     def get_settings(self):
         while True:
             self.rs232.write_command('get\sall',EOL='\n')
-            response = self.rs232.read_response()
+            response = self.rs232.read_response(until=OPTODE_PROMPT)
             if 'ERROR' in response:
                 continue
             else:
@@ -18,7 +18,7 @@ setuptools.setup(
         "License :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.4',
+    python_requires='>=3.7',
     install_requires=[
         'pyserial'  #https://pypi.org/project/pyserial/
         ],